@@ -0,0 +1,80 @@
+#
+# Copyright (c) 2013 Daniel Truemper <truemped at googlemail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+#
+"""Microbenchmark for :func:`supercell.acceptparsing.parse_accept_header`.
+
+Run it with::
+
+    $ python benchmarks/bench_acceptparsing.py
+
+For every header in the corpus the cost per call is reported once with the
+interning cache enabled and once with a cold cache.
+"""
+
+import timeit
+
+from supercell import acceptparsing
+from supercell.acceptparsing import parse_accept_header
+
+
+CORPUS = [
+    # browsers
+    ('firefox', 'text/html,application/xhtml+xml,application/xml;q=0.9,'
+                'image/avif,image/webp,*/*;q=0.8'),
+    ('chrome', 'text/html,application/xhtml+xml,application/xml;q=0.9,'
+               'image/avif,image/webp,image/apng,*/*;q=0.8,'
+               'application/signed-exchange;v=b3;q=0.7'),
+    ('safari', 'text/html,application/xhtml+xml,application/xml;q=0.9,'
+               '*/*;q=0.8'),
+    ('ie6', 'text/*,image/*;application/*;*/*;'),
+    ('xhr', 'application/json, text/javascript, */*; q=0.01'),
+    # command line clients
+    ('curl', '*/*'),
+    ('empty', ''),
+    ('json', 'application/json'),
+    ('json-charset', 'application/json; charset=UTF-8'),
+    # vendor types
+    ('vendor', 'application/vnd.supercell+json'),
+    ('vendor-version', 'application/vnd.supercell-v1.1+json'),
+    ('vendor-fallback', 'application/vnd.supercell-v2.0+json,'
+                        'application/vnd.supercell-v1.0+json;q=0.5,'
+                        'application/json;q=0.1'),
+    # hostile
+    ('many-ranges', ','.join(['application/json;q=0.%d' % (i % 10)
+                              for i in range(1000)])),
+    ('many-params', 'application/json;' +
+                    ';'.join(['p%d=v' % i for i in range(1000)])),
+]
+
+
+def bench(number=20000):
+    print('%-16s %12s %12s' % ('header', 'interned', 'cold'))
+    for name, header in CORPUS:
+        interned = timeit.timeit(lambda: parse_accept_header(header),
+                                 number=number)
+
+        def cold():
+            acceptparsing.INTERNED.clear()
+            parse_accept_header(header)
+        cold = timeit.timeit(cold, number=number)
+
+        print('%-16s %9.2f us %9.2f us' % (name,
+                                           interned / number * 1e6,
+                                           cold / number * 1e6))
+
+
+if __name__ == '__main__':
+    bench()
@@ -0,0 +1,60 @@
+#
+# Copyright (c) 2013 Daniel Truemper <truemped at googlemail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+#
+"""Compare size and speed of the documents written by the
+:class:`supercell.provider.JsonProvider` and the
+:class:`supercell.provider.MsgpackProvider` with their default codecs.
+
+Run it with::
+
+    $ python benchmarks/bench_msgpack.py
+"""
+
+import timeit
+
+from supercell.codec import JsonCodec, MsgpackCodec
+
+
+def document(size):
+    return {
+        'name': 'page',
+        'total': size,
+        'ratio': 0.75,
+        'items': [{'item_id': i, 'title': 'Item %d' % i,
+                   'created': '2013-09-05T12:00:00Z', 'active': i % 2 == 0,
+                   'tags': ['a', 'b']} for i in range(size)],
+        'counts': {'a': size, 'b': size}}
+
+
+def bench():
+    codecs = (('json', JsonCodec()), ('msgpack', MsgpackCodec()))
+    print('%-10s %-8s %10s %14s %14s' % ('items', 'codec', 'bytes', 'encode',
+                                         'decode'))
+    for size in (1, 10, 100, 1000):
+        doc = document(size)
+        number = max(10, 10000 // size)
+        for (name, codec) in codecs:
+            data = codec.encode(doc)
+            assert codec.decode(data) == doc
+            encode = timeit.timeit(lambda: codec.encode(doc), number=number)
+            decode = timeit.timeit(lambda: codec.decode(data), number=number)
+            print('%-10d %-8s %10d %11.1f us %11.1f us' % (
+                size, name, len(data), encode / number * 1e6,
+                decode / number * 1e6))
+
+
+if __name__ == '__main__':
+    bench()
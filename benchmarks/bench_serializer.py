@@ -0,0 +1,77 @@
+#
+# Copyright (c) 2013 Daniel Truemper <truemped at googlemail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+#
+"""Compare :func:`supercell.serializer.to_primitive` with schematics'
+:func:`Model.to_primitive`.
+
+Run it with::
+
+    $ python benchmarks/bench_serializer.py
+"""
+
+from datetime import datetime
+import timeit
+
+from schematics.models import Model
+from schematics.types import DateTimeType, IntType, StringType
+from schematics.types.compound import DictType, ListType, ModelType
+
+from supercell.serializer import to_primitive
+
+
+class Item(Model):
+    item_id = IntType()
+    title = StringType()
+    created = DateTimeType()
+    tags = ListType(StringType())
+
+    class Options:
+        serialize_when_none = False
+
+
+class Page(Model):
+    name = StringType()
+    total = IntType()
+    items = ListType(ModelType(Item))
+    counts = DictType(IntType())
+
+
+def page(size):
+    now = datetime.now()
+    return Page({
+        'name': 'page',
+        'total': size,
+        'items': [{'item_id': i, 'title': 'Item %d' % i, 'created': now,
+                   'tags': ['a', 'b']} for i in range(size)],
+        'counts': {'a': size, 'b': size}})
+
+
+def bench():
+    print('%-10s %14s %14s %8s' % ('items', 'schematics', 'compiled',
+                                   'speedup'))
+    for size in (1, 10, 100, 1000):
+        model = page(size)
+        assert to_primitive(model) == model.to_primitive()
+        number = max(10, 10000 // size)
+        schematics = timeit.timeit(model.to_primitive, number=number)
+        compiled = timeit.timeit(lambda: to_primitive(model), number=number)
+        print('%-10d %11.1f us %11.1f us %7.1fx' % (
+            size, schematics / number * 1e6, compiled / number * 1e6,
+            schematics / compiled))
+
+
+if __name__ == '__main__':
+    bench()
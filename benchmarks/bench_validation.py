@@ -0,0 +1,74 @@
+#
+# Copyright (c) 2013 Daniel Truemper <truemped at googlemail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+#
+"""Compare the consumption of a request body, i.e. creating and validating
+the model, with :func:`supercell.validation.validate` and schematics'
+:func:`Model.validate`.
+
+Run it with::
+
+    $ python benchmarks/bench_validation.py
+"""
+
+import timeit
+
+from schematics.models import Model
+from schematics.types import DateTimeType, IntType, StringType
+from schematics.types.compound import DictType, ListType, ModelType
+
+from supercell.validation import validate
+
+
+class Item(Model):
+    item_id = IntType(required=True, min_value=0)
+    title = StringType(max_length=100)
+    created = DateTimeType()
+    tags = ListType(StringType(choices=['a', 'b', 'c']))
+
+
+class Page(Model):
+    name = StringType(required=True)
+    total = IntType()
+    items = ListType(ModelType(Item), min_size=1)
+    counts = DictType(IntType())
+
+
+def body(size):
+    return {
+        'name': 'page',
+        'total': size,
+        'items': [{'item_id': i, 'title': 'Item %d' % i,
+                   'created': '2013-09-05T12:00:00Z',
+                   'tags': ['a', 'b']} for i in range(size)],
+        'counts': {'a': size, 'b': size}}
+
+
+def bench():
+    print('%-10s %14s %14s %8s' % ('items', 'schematics', 'compiled',
+                                   'speedup'))
+    for size in (1, 10, 100, 1000):
+        raw = body(size)
+        number = max(10, 2000 // size)
+        schematics = timeit.timeit(lambda: Page(raw).validate(),
+                                   number=number)
+        compiled = timeit.timeit(lambda: validate(Page(raw)), number=number)
+        print('%-10d %11.1f us %11.1f us %7.1fx' % (
+            size, schematics / number * 1e6, compiled / number * 1e6,
+            schematics / compiled))
+
+
+if __name__ == '__main__':
+    bench()
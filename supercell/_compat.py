@@ -24,6 +24,13 @@ http://lucumr.pocoo.org/2013/5/21/porting-to-python-3-redux/
 Also provides a schematics 1.1.1 compatibility helper.
 """
 
+import copyreg
+
+try:
+    from schematics.models import ModelDict
+except ImportError:  # schematics 1.x
+    ModelDict = None
+
 
 def with_metaclass(meta, *bases):
     # This requires a bit of explanation: the basic idea is to make a
@@ -52,3 +59,13 @@ def error_messages(schematics_error):
         return schematics_error.to_primitive()
     else:
         return schematics_error.messages
+
+
+def _reduce_model_dict(data):
+    return (ModelDict, (data.unsafe, data.converted, dict(data.valid)))
+
+
+if ModelDict is not None:
+    # the data of schematics 2.x models cannot be pickled by default, which
+    # is necessary for consuming request bodies in a process pool
+    copyreg.pickle(ModelDict, _reduce_model_dict)
@@ -11,6 +11,85 @@
 # It is based on a snipped found in this project:
 #   https://github.com/martinblech/mimerender
 
+from supercell.utils import LRUCache
+
+
+MAX_MEDIA_RANGES = 32
+"""Media ranges after the first `MAX_MEDIA_RANGES` are ignored."""
+
+MAX_MEDIA_PARAMS = 8
+"""Media ranges with more parameters than this are skipped."""
+
+MAX_INTERNED_LENGTH = 512
+"""Only headers up to this length are stored in the :data:`INTERNED` cache."""
+
+INTERNED = LRUCache(maxsize=256)
+"""Cache of already parsed headers."""
+
+_IE6_ACCEPT = 'text/*,image/*;application/*;*/*;'
+
+
+def _parse_media_range(media_range):
+    """Parse a single media range into a `(media_type, params, q)` tuple.
+
+    Returns `None` if the media range is malformed.
+    """
+    media_type, sep, rest = media_range.partition(';')
+    media_type = media_type.strip()
+    media_params = []
+
+    if '/' not in media_type:
+        return ('*/*', {}, 1.0)
+    typ, _, subtyp = media_type.partition('/')
+    if '/' in subtyp:
+        return None
+
+    # convert vendor-specific content types into something useful (see
+    # docstring)
+    if '+' in subtyp:
+        # if it exists, determine if the subtype is a vendor-specific type
+        vnd, _, extra = subtyp.partition('+')
+        if vnd.startswith('vnd'):
+            # and then... if it ends in something like "-v1.1" parse the
+            # version out
+            if '-v' in vnd:
+                vnd, _, rest_version = vnd.rpartition('-v')
+                if rest_version:
+                    # add the version as a media param
+                    try:
+                        media_params.append(('version', float(rest_version)))
+                    except ValueError:
+                        pass  # could not be parsed
+            # add the vendor code as a media param
+            media_params.append(('vendor', vnd.replace('vnd.', '')))
+            # and re-write media_type to something like application/json so
+            # it can be used usefully when looking up emitters
+            media_type = typ + '/' + extra
+
+    q = 1.0
+    if sep:
+        parts = rest.split(';', MAX_MEDIA_PARAMS)
+        if len(parts) > MAX_MEDIA_PARAMS:
+            return None
+        for part in parts:
+            if not part.strip():
+                # e.g. a trailing semicolon
+                continue
+            key, eq, value = part.partition('=')
+            if not eq:
+                return None
+            key = key.strip()
+            value = value.strip()
+            if key == 'q':
+                try:
+                    q = float(value)
+                except ValueError:
+                    return None
+            else:
+                media_params.append((key, value))
+
+    return (media_type, dict(media_params), q)
+
 
 def parse_accept_header(accept):
     """
@@ -26,54 +105,32 @@ def parse_accept_header(accept):
     negotiation decisions can be made.
 
     Default `q` for values that are not specified is 1.0
-    """
-    result = []
 
-    if accept == 'text/*,image/*;application/*;*/*;':
+    The amount of work per header is bounded: only the first
+    :data:`MAX_MEDIA_RANGES` media ranges are parsed, and media ranges with
+    more than :data:`MAX_MEDIA_PARAMS` parameters, parameters without a value
+    or invalid `q` values are skipped. Empty parameters, e.g. of a trailing
+    `;`, are ignored. The results for short headers are
+    cached in :data:`INTERNED`, so the parameter dicts of the result must not
+    be modified.
+    """
+    if accept == _IE6_ACCEPT:
         # strange IE6 Accept header that we ignore
         return [('*/*', {}, 1.0)]
 
-    for media_range in accept.split(","):
-
-        parts = media_range.split(";")
-        media_type = parts.pop(0).strip()
-        media_params = []
-        # convert vendor-specific content types into something useful (see
-        # docstring)
-        if media_type.find('/') == -1:
-            result.append(('*/*', {}, 1.0))
-            continue
-        typ, subtyp = media_type.split('/')
-        # check for a + in the sub-type
-        if '+' in subtyp:
-            # if it exists, determine if the subtype is a vendor-specific type
-            vnd, sep, extra = subtyp.partition('+')
-            if vnd.startswith('vnd'):
-                # and then... if it ends in something like "-v1.1" parse the
-                # version out
-                if '-v' in vnd:
-                    vnd, sep, rest = vnd.rpartition('-v')
-                    if len(rest):
-                        # add the version as a media param
-                        try:
-                            version = media_params.append(('version',
-                                                           float(rest)))
-                        except ValueError:
-                            version = 1.0  # could not be parsed
-                # add the vendor code as a media param
-                media_params.append(('vendor', vnd.replace('vnd.', '')))
-                # and re-write media_type to something like application/json so
-                # it can be used usefully when looking up emitters
-                media_type = '/'.join([typ, extra])
-        q = 1.0
-        for part in parts:
-            (key, value) = part.lstrip().split("=", 1)
-            key = key.strip()
-            value = value.strip()
-            if key == "q":
-                q = float(value)
-            else:
-                media_params.append((key, value))
-        result.append((media_type, dict(media_params), q))
+    internable = len(accept) <= MAX_INTERNED_LENGTH
+    if internable:
+        result = INTERNED.get(accept)
+        if result is not None:
+            return list(result)
+
+    result = []
+    for media_range in accept.split(',', MAX_MEDIA_RANGES)[:MAX_MEDIA_RANGES]:
+        parsed = _parse_media_range(media_range)
+        if parsed is not None:
+            result.append(parsed)
     result.sort(key=lambda r: -r[2])
+
+    if internable:
+        INTERNED.put(accept, tuple(result))
     return result
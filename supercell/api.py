@@ -17,15 +17,20 @@
 
 from tornado.gen import coroutine
 
+from supercell.batch import BatchConfig
 from supercell.cache import CacheConfig
+from supercell.compression import CompressionConfig
+from supercell.codec import JsonCodec, MsgpackCodec
 from supercell.mediatypes import (ContentType, MediaType, Return, Ok, Error,
                                   OkCreated, NoContent)
-from supercell.decorators import provides, consumes
+from supercell.decorators import provides, consumes, streams_request_body
 from supercell.health import (HealthCheckOk, HealthCheckWarning,
                               HealthCheckError)
 from supercell.environment import Environment
-from supercell.consumer import ConsumerBase, JsonConsumer
-from supercell.provider import ProviderBase, JsonProvider
+from supercell.consumer import (ConsumerBase, JsonConsumer, MsgpackConsumer,
+                                NdjsonConsumer)
+from supercell.provider import (ProviderBase, JsonProvider, MsgpackProvider,
+                                NdjsonProvider, JsonSeqProvider)
 from supercell.requesthandler import RequestHandler
 from supercell.service import Service
 from supercell.middleware import Middleware
@@ -35,21 +40,31 @@ __all__ = [
     'coroutine',
     'consumes',
     'provides',
+    'streams_request_body',
+    'BatchConfig',
     'CacheConfig',
+    'CompressionConfig',
     'ContentType',
     'ConsumerBase',
     'Environment',
     'Error',
+    'JsonCodec',
     'HealthCheckOk',
     'HealthCheckError',
     'HealthCheckWarning',
     'MediaType',
+    'MsgpackCodec',
+    'MsgpackConsumer',
+    'MsgpackProvider',
+    'NdjsonConsumer',
+    'NdjsonProvider',
     'NoContent',
     'Ok',
     'OkCreated',
     'ProviderBase',
     'JsonConsumer',
     'JsonProvider',
+    'JsonSeqProvider',
     'RequestHandler',
     'Return',
     'Service',
@@ -0,0 +1,251 @@
+#
+# Copyright (c) 2013 Daniel Truemper <truemped at googlemail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+#
+
+"""Executing many requests with a single HTTP request.
+
+The batch endpoint is enabled in the environment::
+
+    class MyService(Service):
+
+        def run(self):
+            self.environment.set_batch(BatchConfig(max_requests=50,
+                                                   concurrency=10))
+
+A POST to */_batch* contains the requests to execute::
+
+    {"requests": [
+        {"path": "/users/1"},
+        {"method": "PUT", "path": "/users/2",
+         "headers": {"Content-Type": "application/json"},
+         "body": {"name": "Peter"}}
+    ]}
+
+The requests are routed by the application just like external requests, but
+without a network connection, at most `concurrency` at a time. The response
+contains the responses of all requests in the same order::
+
+    {"responses": [
+        {"status": 200, "headers": {...}, "body": {"name": "Paul"}},
+        {"status": 204, "headers": {...}, "body": null}
+    ]}
+
+JSON bodies are embedded as JSON, all other bodies as text. A body that is
+not a string is encoded as JSON. The requests have the `Host` of the batch
+request and inherit its headers listed in `forward_headers`, e.g. for
+authentication.
+
+Requests that do not finish within the `timeout` get a response with the
+status **504**. Their handlers are not interrupted and keep running in the
+background.
+"""
+
+from collections import namedtuple
+from datetime import timedelta
+
+from schematics.models import Model
+from schematics.types import IntType, StringType
+from schematics.types.base import BaseType
+from schematics.types.compound import DictType, ListType, ModelType
+from tornado import gen
+from tornado.httputil import (HTTPHeaders, HTTPServerRequest,
+                              RequestStartLine)
+from tornado.locks import Semaphore
+from tornado.web import HTTPError
+
+from supercell.decorators import consumes, provides
+from supercell.mediatypes import MediaType
+from supercell.requesthandler import RequestHandler
+from supercell.warmup import _WarmupConnection
+
+
+__all__ = ['BatchConfig', 'BatchHandler']
+
+
+METHODS = ('GET', 'HEAD', 'POST', 'PUT', 'PATCH', 'DELETE', 'OPTIONS')
+"""The methods allowed in a batch."""
+
+
+BatchConfigT = namedtuple('BatchConfigT', ['path', 'max_requests',
+                                           'concurrency', 'forward_headers',
+                                           'timeout'])
+
+
+def BatchConfig(path='/_batch', max_requests=100, concurrency=10,
+                forward_headers=('Authorization', 'Cookie'),
+                timeout=timedelta(seconds=30)):
+    """Create a :class:`BatchConfigT` with default values.
+
+    :param path: The path of the batch endpoint
+    :type path: str
+
+    :param max_requests: The maximum number of requests in a batch
+    :type max_requests: int
+
+    :param concurrency: The maximum number of requests of a batch that are
+                        executed concurrently
+    :type concurrency: int
+
+    :param forward_headers: The headers of the batch request that are added
+                            to all requests unless they set them
+    :type forward_headers: tuple
+
+    :param timeout: The maximum time to wait for the response of a request
+    :type timeout: datetime.timedelta
+    """
+    assert path.startswith('/'), 'path must start with a slash'
+    assert max_requests > 0, 'max_requests must be positive'
+    assert concurrency > 0, 'concurrency must be positive'
+    assert timeout > timedelta(0), 'timeout must be positive'
+    return BatchConfigT(path, max_requests=max_requests,
+                        concurrency=concurrency,
+                        forward_headers=tuple(forward_headers),
+                        timeout=timeout)
+
+
+class BatchRequest(Model):
+    method = StringType(default='GET', choices=METHODS)
+    path = StringType(required=True, regex='/.*')
+    headers = DictType(StringType, default=dict)
+    body = BaseType()
+
+
+class Batch(Model):
+    requests = ListType(ModelType(BatchRequest), required=True)
+
+
+class BatchResponse(Model):
+    status = IntType()
+    headers = DictType(StringType)
+    body = BaseType()
+
+
+class BatchResult(Model):
+    responses = ListType(ModelType(BatchResponse))
+
+
+class _BatchConnection(_WarmupConnection):
+    """Connection that records the response."""
+
+    def __init__(self):
+        super().__init__()
+        self.headers = None
+        self.chunks = []
+
+    def write_headers(self, start_line, headers, chunk=None):
+        self.headers = headers
+        if chunk:
+            self.chunks.append(chunk)
+        return super().write_headers(start_line, headers)
+
+    def write(self, chunk):
+        self.chunks.append(chunk)
+        return super().write(chunk)
+
+
+@provides(MediaType.ApplicationJson, default=True)
+@consumes(MediaType.ApplicationJson, model=Batch)
+class BatchHandler(RequestHandler):
+    """Execute the requests of a batch, see :mod:`supercell.batch`."""
+
+    @gen.coroutine
+    def post(self, *args, **kwargs):
+        config = self.environment.batch
+        requests = kwargs['model'].requests
+        if len(requests) > config.max_requests:
+            raise HTTPError(400, reason='Too many requests, at most %d '
+                            'allowed' % config.max_requests)
+        for request in requests:
+            if request.path.split('?', 1)[0] == config.path:
+                raise HTTPError(400, reason='Nested batches are not allowed')
+
+        semaphore = Semaphore(config.concurrency)
+        responses = yield [self._execute_limited(semaphore, config, request)
+                           for request in requests]
+        raise gen.Return(BatchResult({'responses': responses}))
+
+    @gen.coroutine
+    def _execute_limited(self, semaphore, config, batch_request):
+        with (yield semaphore.acquire()):
+            try:
+                response = yield gen.with_timeout(
+                    config.timeout,
+                    self._execute_request(config, batch_request))
+            except gen.TimeoutError:
+                self.logger.warning('Batch request %s %s timed out',
+                                    batch_request.method, batch_request.path)
+                response = BatchResponse({'status': 504, 'headers': {},
+                                          'body': None})
+        raise gen.Return(response)
+
+    @gen.coroutine
+    def _execute_request(self, config, batch_request):
+        """Execute a request of the batch with the application and return
+        the :class:`BatchResponse`."""
+        headers = HTTPHeaders(batch_request.headers)
+        headers.setdefault('Host', self.request.host)
+        # the bodies are embedded into the response uncompressed
+        headers.pop('Accept-Encoding', None)
+        for name in config.forward_headers:
+            if name not in headers and name in self.request.headers:
+                headers[name] = self.request.headers[name]
+
+        body = batch_request.body
+        if body is None:
+            body = b''
+        elif isinstance(body, str):
+            body = body.encode('utf8')
+        else:
+            body = self.environment.json_codec.encode(body)
+            headers.setdefault('Content-Type', MediaType.ApplicationJson)
+        if body or batch_request.method in ('POST', 'PUT', 'PATCH'):
+            headers['Content-Length'] = str(len(body))
+
+        connection = _BatchConnection()
+        start_line = RequestStartLine(batch_request.method,
+                                      batch_request.path, 'HTTP/1.1')
+        request = HTTPServerRequest(connection=connection,
+                                    start_line=start_line, headers=headers)
+        request.remote_ip = self.request.remote_ip
+        request.protocol = self.request.protocol
+
+        delegate = self.application.find_handler(request)
+        prepared = delegate.headers_received(start_line, headers)
+        if prepared is not None:
+            yield prepared
+        if body:
+            received = delegate.data_received(body)
+            if received is not None:
+                yield received
+        delegate.finish()
+        status = yield connection.finished
+        raise gen.Return(BatchResponse({
+            'status': status,
+            'headers': {name: ', '.join(connection.headers.get_list(name))
+                        for name in connection.headers},
+            'body': self._decode_body(connection)}))
+
+    def _decode_body(self, connection):
+        body = b''.join(connection.chunks)
+        if not body:
+            return None
+        content_type = connection.headers.get('Content-Type', '')
+        if content_type.split(';', 1)[0].strip() == MediaType.ApplicationJson:
+            try:
+                return self.environment.json_codec.decode(body)
+            except ValueError:
+                pass
+        return body.decode('utf8', 'replace')
@@ -32,23 +32,70 @@ The details of setting the `CacheControl` header are documented in the
 :func:`CacheConfig`. The `expires` argument simply takes a
 :func:`datetime.timedelta` as input and will then generate the `Expires` header
 based on the current time and the :func:`datetime.timedelta`.
+
+Like all tornado handlers, successful GET and HEAD responses get an `ETag`
+computed from the response body and a matching `If-None-Match` header is
+answered with `304 Not Modified`. With `CacheConfig(..., etag=True)` the
+handler can supply a cheap version key of the resource instead by
+implementing :func:`supercell.requesthandler.RequestHandler.etag_key`::
+
+    class MyHandler(RequestHandler):
+
+        def etag_key(self, doc_id):
+            return self.environment.documents.version(doc_id)
+
+If the client already has the current version, the handler method is not
+called at all and neither the model nor its serialization is computed.
+
+With `CacheConfig(..., coalesce=True)` identical concurrent GET requests are
+coalesced: only the first request calls the handler, the others wait for it
+and receive the same serialized response, including error responses. If the
+handler of the first request raises an exception, the waiting requests fail
+with the same exception (:data:`SHARE_ERRORS`) or one of them calls the
+handler again (:data:`RETRY_ERRORS`). Requests with an `Authorization` or
+`Cookie` header are only coalesced with requests with the same value if the
+header is one of the `key_headers`, otherwise they always call the handler.
+
+`stale_while_revalidate` and `stale_if_error` allow caches to use an outdated
+response while it is refreshed in the background or if the service fails (see
+:rfc:`5861`). Together with `server_side=True` the process itself keeps the
+last good response of the handler for this time: it is returned immediately
+while a single background execution of the handler refreshes it, and instead
+of the error if the handler raises an exception. Note that other caches ignore
+both if `must_revalidate` is set.
 """
 
 from collections import namedtuple
 
 
-__all__ = ['CacheConfig']
+__all__ = ['CacheConfig', 'SHARE_ERRORS', 'RETRY_ERRORS']
+
+
+SHARE_ERRORS = 'share'
+"""Coalesced requests fail with the error of the request they waited for."""
+
+RETRY_ERRORS = 'retry'
+"""Coalesced requests call the handler again if the request they waited for
+failed."""
 
 
 CacheConfigT = namedtuple('CacheConfigT', ['max_age', 's_max_age', 'public',
                                            'private', 'no_cache', 'no_store',
                                            'must_revalidate',
-                                           'proxy_revalidate'])
+                                           'proxy_revalidate', 'etag',
+                                           'server_side', 'key_headers',
+                                           'coalesce', 'coalesce_errors',
+                                           'stale_while_revalidate',
+                                           'stale_if_error',
+                                           'response_cache'])
 
 
 def CacheConfig(max_age, s_max_age=None, public=False, private=False,
                 no_cache=False, no_store=False, must_revalidate=True,
-                proxy_revalidate=False):
+                proxy_revalidate=False, etag=False, server_side=False,
+                key_headers=(), coalesce=False, coalesce_errors=SHARE_ERRORS,
+                stale_while_revalidate=None, stale_if_error=None,
+                response_cache=None):
     """Create a :class:`CacheConfigT` with default values.
     :param max_age: Number of seconds the response can be cached
     :type max_age: datetime.timedelta
@@ -78,11 +125,60 @@ def CacheConfig(max_age, s_max_age=None, public=False, private=False,
     :param proxy_revalidate: Like `must_revalidate` except it only applies to
                              public caches
     :type proxy_revalidate: bool
+
+    :param etag: If *True* the `ETag` is computed from the version key returned
+                 by the handler's `etag_key()` method
+    :type etag: bool
+
+    :param server_side: If *True* successful GET responses are also cached in
+                        the process for `max_age`, see
+                        :mod:`supercell.responsecache`
+    :type server_side: bool
+
+    :param key_headers: Names of the request headers whose values are part of
+                        the key of the server side cache. Requests with an
+                        `Authorization` or `Cookie` header that is not one of
+                        them are neither cached nor coalesced, as their
+                        responses could be returned to other users
+    :type key_headers: tuple
+
+    :param coalesce: If *True* identical concurrent GET requests are coalesced
+                     into a single call of the handler; like the server side
+                     cache it uses the `key_headers`
+    :type coalesce: bool
+
+    :param coalesce_errors: What coalesced requests do if the request they
+                            waited for failed, either :data:`SHARE_ERRORS` or
+                            :data:`RETRY_ERRORS`
+    :type coalesce_errors: str
+
+    :param stale_while_revalidate: Time after `max_age` during which an
+                                   outdated response may be returned while it
+                                   is refreshed in the background
+    :type stale_while_revalidate: datetime.timedelta
+
+    :param stale_if_error: Time after `max_age` during which an outdated
+                           response may be returned if the handler fails
+    :type stale_if_error: datetime.timedelta
+
+    :param response_cache: The name of a managed object that is used as
+                           server side cache instead of the environment's
+                           `response_cache`, e.g. a
+                           :class:`supercell.sharedcache.SharedResponseCache`
+    :type response_cache: str
     """
+    assert coalesce_errors in (SHARE_ERRORS, RETRY_ERRORS), \
+        'Unknown coalesce_errors policy'
     return CacheConfigT(max_age, s_max_age=s_max_age, public=public,
                         private=private, no_cache=no_cache, no_store=no_store,
                         must_revalidate=must_revalidate,
-                        proxy_revalidate=proxy_revalidate)
+                        proxy_revalidate=proxy_revalidate, etag=etag,
+                        server_side=server_side,
+                        key_headers=tuple(key_headers), coalesce=coalesce,
+                        coalesce_errors=coalesce_errors,
+                        stale_while_revalidate=stale_while_revalidate,
+                        stale_if_error=stale_if_error,
+                        response_cache=response_cache)
 
 
 def compute_cache_header(cache_config):
@@ -94,9 +190,10 @@ def compute_cache_header(cache_config):
     :rtype: str
     """
     params = []
-    params.append('max-age=%s' % cache_config.max_age.seconds)
+    params.append('max-age=%s' % int(cache_config.max_age.total_seconds()))
     if cache_config.s_max_age:
-        params.append('s-max-age=%s' % cache_config.s_max_age.seconds)
+        params.append('s-max-age=%s' %
+                      int(cache_config.s_max_age.total_seconds()))
     if cache_config.public:
         params.append('public')
     if cache_config.private:
@@ -109,5 +206,11 @@ def compute_cache_header(cache_config):
         params.append('must-revalidate')
     if cache_config.proxy_revalidate:
         params.append('proxy-revalidate')
+    if cache_config.stale_while_revalidate:
+        params.append('stale-while-revalidate=%s' %
+                      int(cache_config.stale_while_revalidate.total_seconds()))
+    if cache_config.stale_if_error:
+        params.append('stale-if-error=%s' %
+                      int(cache_config.stale_if_error.total_seconds()))
 
     return ', '.join(params)
@@ -0,0 +1,112 @@
+#
+# Copyright (c) 2013 Daniel Truemper <truemped at googlemail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+#
+
+"""The JSON codec is used by the :class:`supercell.provider.JsonProvider`,
+the :class:`supercell.consumer.JsonConsumer` and for the responses of
+:class:`supercell.mediatypes.Ok` and :class:`supercell.mediatypes.Error`.
+The MessagePack codec is used by the
+:class:`supercell.provider.MsgpackProvider` and the
+:class:`supercell.consumer.MsgpackConsumer`.
+
+By default the :mod:`json` module from the standard library is used. A faster
+implementation can be registered on the environment in the
+:func:`Service.run()` method::
+
+    import orjson
+
+    class MyService(s.Service):
+
+        def run(self):
+            self.environment.set_json_codec(
+                s.JsonCodec(dumps=orjson.dumps, loads=orjson.loads))
+
+The MessagePack codec uses the pure-Python implementation in
+:mod:`supercell.msgpack` by default. It can be replaced in the same way, e.g.
+with the C extension of the `msgpack` package::
+
+    import msgpack
+
+    self.environment.set_msgpack_codec(
+        s.MsgpackCodec(packb=msgpack.packb, unpackb=msgpack.unpackb))
+"""
+
+import json
+
+from supercell import msgpack
+
+
+__all__ = ['JsonCodec', 'MsgpackCodec']
+
+
+class JsonCodec:
+    """Encode and decode JSON documents.
+
+    :param dumps: Function serializing an object to a `str` or `bytes`,
+                  defaults to :func:`json.dumps`
+    :param loads: Function parsing a `str` or `bytes` document, defaults to
+                  :func:`json.loads`
+    """
+
+    def __init__(self, dumps=None, loads=None):
+        self.dumps = dumps or json.dumps
+        self.loads = loads or json.loads
+
+    def encode(self, obj):
+        """Serialize `obj` into an utf-8 encoded JSON document.
+
+        Like :func:`tornado.escape.json_encode` the sequence `</` is escaped
+        so that the result can safely be embedded into HTML.
+
+        :rtype: bytes
+        """
+        data = self.dumps(obj)
+        if isinstance(data, str):
+            data = data.encode('utf8')
+        return data.replace(b'</', b'<\\/')
+
+    def decode(self, data):
+        """Parse the JSON document `data`.
+
+        The document may be passed as `bytes`, e.g. the request body, which
+        saves decoding it into a `str` first.
+        """
+        return self.loads(data)
+
+
+class MsgpackCodec:
+    """Encode and decode MessagePack documents.
+
+    :param packb: Function serializing an object to `bytes`, defaults to
+                  :func:`supercell.msgpack.packb`
+    :param unpackb: Function parsing a `bytes` document, defaults to
+                    :func:`supercell.msgpack.unpackb`
+    """
+
+    def __init__(self, packb=None, unpackb=None):
+        self.packb = packb or msgpack.packb
+        self.unpackb = unpackb or msgpack.unpackb
+
+    def encode(self, obj):
+        """Serialize `obj` into a MessagePack document.
+
+        :rtype: bytes
+        """
+        return self.packb(obj)
+
+    def decode(self, data):
+        """Parse the MessagePack document `data`."""
+        return self.unpackb(data)
@@ -0,0 +1,132 @@
+#
+# Copyright (c) 2013 Daniel Truemper <truemped at googlemail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+#
+
+"""Helpers for compressing responses.
+
+Compression is enabled per handler while adding it to the environment::
+
+    class MyService(Service):
+
+        def run(self):
+            self.environment.add_handler(...,
+                                         compression=CompressionConfig(
+                                            min_size=1024, level=6))
+
+The encoding is negotiated with the client's `Accept-Encoding` header. Small
+bodies are compressed on the IOLoop, bodies larger than `offload_size` in the
+environment's :attr:`supercell.environment.Environment.executor` so that the
+IOLoop is not blocked.
+
+Responses that are streamed or finished by the handler itself are not
+compressed. Unlike the global `compress_response` setting of tornado this
+does not affect handlers without a :func:`CompressionConfig`.
+"""
+
+from collections import namedtuple
+import zlib
+
+
+__all__ = ['CompressionConfig', 'GZIP', 'DEFLATE']
+
+
+GZIP = 'gzip'
+"""The `gzip` content encoding."""
+
+DEFLATE = 'deflate'
+"""The `deflate` content encoding, i.e. the zlib format."""
+
+_WBITS = {GZIP: 16 + zlib.MAX_WBITS, DEFLATE: zlib.MAX_WBITS}
+
+
+CompressionConfigT = namedtuple('CompressionConfigT', ['min_size', 'level',
+                                                       'encodings',
+                                                       'offload_size'])
+
+
+def CompressionConfig(min_size=1024, level=6, encodings=(GZIP, DEFLATE),
+                      offload_size=256 * 1024):
+    """Create a :class:`CompressionConfigT` with default values.
+
+    :param min_size: Responses smaller than this number of bytes are not
+                     compressed
+    :type min_size: int
+
+    :param level: The compression level from 1 (fastest) to 9 (smallest)
+    :type level: int
+
+    :param encodings: The supported encodings in the order of preference if
+                      the client accepts more than one with the same quality
+    :type encodings: tuple
+
+    :param offload_size: Responses with at least this number of bytes are
+                         compressed in the environment's executor
+    :type offload_size: int
+    """
+    assert min_size >= 0, 'min_size must not be negative'
+    assert 1 <= level <= 9, 'level must be between 1 and 9'
+    assert encodings, 'no encodings given'
+    for encoding in encodings:
+        assert encoding in _WBITS, 'Unknown encoding %r' % encoding
+    return CompressionConfigT(min_size, level=level,
+                              encodings=tuple(encodings),
+                              offload_size=offload_size)
+
+
+def negotiate_encoding(accept_encoding, encodings):
+    """Select the content encoding for the `Accept-Encoding` header.
+
+    :param accept_encoding: The `Accept-Encoding` header of the request
+    :type accept_encoding: str
+    :param encodings: The supported encodings in the order of preference
+    :type encodings: tuple
+    :return: The encoding with the highest quality value or `None` if the
+             client does not accept any of the `encodings`
+    """
+    qualities = {}
+    for coding in accept_encoding.split(','):
+        name, _, params = coding.partition(';')
+        name = name.strip().lower()
+        if not name:
+            continue
+        q = 1.0
+        key, _, value = params.partition('=')
+        if key.strip() == 'q':
+            try:
+                q = float(value)
+            except ValueError:
+                continue
+        qualities[name] = q
+
+    default = qualities.get('*', 0.0)
+    best, best_q = None, 0.0
+    for encoding in encodings:
+        q = qualities.get(encoding, default)
+        if q > best_q:
+            best, best_q = encoding, q
+    return best
+
+
+def compress(data, encoding, level):
+    """Compress `data` with the content `encoding`.
+
+    The `gzip` header does not contain a modification time, so the result
+    only depends on the input.
+
+    :rtype: bytes
+    """
+    compressor = zlib.compressobj(level, zlib.DEFLATED, _WBITS[encoding])
+    return compressor.compress(data) + compressor.flush()
@@ -16,14 +16,18 @@
 #
 
 from collections import defaultdict
-import json
+from types import MappingProxyType
 
 from supercell._compat import with_metaclass
+from supercell.jsonstream import IncrementalJsonParser
+from supercell.ndjson import ModelStream
+from supercell.validation import compile_validator
 from supercell.mediatypes import ContentType, MediaType
 from supercell.acceptparsing import parse_accept_header
 
 
-__all__ = ['NoConsumerFound', 'ConsumerBase', 'JsonConsumer']
+__all__ = ['NoConsumerFound', 'ConsumerBase', 'JsonConsumer',
+           'MsgpackConsumer']
 
 
 class NoConsumerFound(Exception):
@@ -99,6 +103,13 @@ class ConsumerBase(with_metaclass(ConsumerMeta, object)):
 
         c = ContentType(ctype, vendor=params.get('vendor', None),
                         version=params.get('version', None))
+
+        dispatch = getattr(handler, '_CONS_DISPATCH', None)
+        if dispatch is not None:
+            if c in dispatch:
+                return dispatch[c]
+            raise NoConsumerFound()
+
         if c not in handler._CONS_CONTENT_TYPES[ctype]:
             raise NoConsumerFound()
 
@@ -110,6 +121,37 @@ class ConsumerBase(with_metaclass(ConsumerMeta, object)):
 
         raise NoConsumerFound()
 
+    @staticmethod
+    def compile_dispatch_table(handler_class):
+        """Resolve the consumer for every content type registered with the
+        :func:`supercell.decorators.consumes` decorator.
+
+        The result is stored as a read-only mapping from the
+        :class:`supercell.mediatypes.ContentTypeT` to the model configuration
+        and the consumer class in `handler_class._CONS_DISPATCH`. The
+        validators of the models are compiled as well, see
+        :mod:`supercell.validation`.
+
+        :param handler_class: supercell request handler class
+        :raises: :exc:`NoConsumerFound` if no or more than one consumer is
+                 registered for a content type
+        """
+        dispatch = {}
+        for content_type, ctypes in handler_class._CONS_CONTENT_TYPES.items():
+            for c in ctypes:
+                known_types = [t[1] for t in
+                               ConsumerMeta.KNOWN_CONTENT_TYPES[content_type]
+                               if t[0] == c]
+                if len(known_types) != 1:
+                    raise NoConsumerFound('%s: found %d consumers for %r' % (
+                        handler_class.__name__, len(known_types), c))
+                (model, validate) = handler_class._CONS_MODEL[c]
+                if validate:
+                    compile_validator(model)
+                dispatch[c] = ((model, validate), known_types[0])
+
+        handler_class._CONS_DISPATCH = MappingProxyType(dispatch)
+
     def consume(self, handler, model):
         """This method should return the correct representation as a parsed
         model.
@@ -119,6 +161,44 @@ class ConsumerBase(with_metaclass(ConsumerMeta, object)):
         """
         raise NotImplementedError
 
+    STREAMS_MODELS = False
+    """If `True` the handler receives an async iterator of models instead of
+    a single model, see :func:`models`."""
+
+    def start(self, handler, model):
+        """Called before the first chunk of a streamed request body is
+        received, see :func:`supercell.decorators.streams_request_body`.
+
+        By default the chunks are collected and passed to :func:`consume`
+        once the body is complete. Consumers that are able to parse the body
+        incrementally override :func:`start`, :func:`feed` and
+        :func:`finish`.
+        """
+        self._chunks = []
+
+    def feed(self, handler, chunk):
+        """Consume the next `chunk` of a streamed request body."""
+        self._chunks.append(chunk)
+
+    def finish(self, handler, model):
+        """Return the model of a completely received streamed request
+        body."""
+        handler.request.body = b''.join(self._chunks)
+        self._chunks = None
+        return self.consume(handler, model)
+
+    def models(self, handler, validate):
+        """Return the async iterator of the models if :attr:`STREAMS_MODELS`
+        is set.
+
+        It is called after :func:`start` for streamed request bodies, which
+        allows the handler to iterate over the models while the body is
+        received, and after :func:`consume` otherwise.
+
+        :param bool validate: Validate the models
+        """
+        raise NotImplementedError
+
 
 class JsonConsumer(ConsumerBase):
     """Default **application/json** consumer."""
@@ -127,13 +207,28 @@ class JsonConsumer(ConsumerBase):
     """The **application/json** :class:`ContentType`."""
 
     def consume(self, handler, model):
-        """Parse the body json via :func:`json.loads` and initialize the
-        `model`.
+        """Parse the body json via the environment's
+        :class:`supercell.codec.JsonCodec` and initialize the `model`.
 
         .. seealso:: :py:mod:`supercell.api.provider.ProviderBase.provide`
         """
         # TODO error if no request body is set
-        return model(json.loads(handler.request.body.decode('utf8')))
+        return model(handler.environment.json_codec.decode(
+            handler.request.body))
+
+    def start(self, handler, model):
+        """Start parsing a streamed request body with an
+        :class:`supercell.jsonstream.IncrementalJsonParser`."""
+        self._parser = IncrementalJsonParser(
+            loads=handler.environment.json_codec.decode)
+
+    def feed(self, handler, chunk):
+        """Parse the next `chunk` of a streamed request body."""
+        self._parser.feed(chunk)
+
+    def finish(self, handler, model):
+        """Initialize the `model` from the parsed document."""
+        return model(self._parser.close())
 
 
 class JsonPatchConsumer(JsonConsumer):
@@ -141,3 +236,97 @@ class JsonPatchConsumer(JsonConsumer):
 
     CONTENT_TYPE = ContentType(MediaType.ApplicationJsonPatch)
     """The **application/json-patch+json** :class:`ContentType`."""
+
+
+class MsgpackConsumer(ConsumerBase):
+    """Default **application/x-msgpack** consumer."""
+
+    CONTENT_TYPE = ContentType(MediaType.ApplicationMsgpack)
+    """The **application/x-msgpack** :class:`ContentType`."""
+
+    def consume(self, handler, model):
+        """Parse the body via the environment's
+        :class:`supercell.codec.MsgpackCodec` and initialize the `model`.
+
+        .. seealso:: :py:mod:`supercell.api.provider.ProviderBase.provide`
+        """
+        return model(handler.environment.msgpack_codec.decode(
+            handler.request.body))
+
+
+class NdjsonConsumer(ConsumerBase):
+    """Default **application/x-ndjson** consumer.
+
+    Every line of the body is parsed via the environment's
+    :class:`supercell.codec.JsonCodec` and the handler receives a
+    :class:`supercell.ndjson.ModelStream` of the models. Empty lines are
+    skipped.
+    """
+
+    CONTENT_TYPE = ContentType(MediaType.ApplicationNdjson)
+    """The **application/x-ndjson** :class:`ContentType`."""
+
+    STREAMS_MODELS = True
+
+    MAX_LINE_SIZE = 1024 * 1024
+    """Lines longer than this number of bytes are reported as errors."""
+
+    MAX_BUFFERED_LINES = 1000
+    """The number of parsed lines that are buffered for the handler."""
+
+    def consume(self, handler, model):
+        """Parse all lines of the body."""
+        self.start(handler, model)
+        self.feed(handler, handler.request.body)
+        return self.finish(handler, model)
+
+    def start(self, handler, model):
+        self._decode = handler.environment.json_codec.decode
+        self._buffer = b''
+        self._line = 0
+        self._skipping = False
+        self._stream = ModelStream(model, maxsize=self.MAX_BUFFERED_LINES)
+
+    def feed(self, handler, chunk):
+        """Parse the complete lines of the body received so far.
+
+        Returns a `Future` if the handler has to catch up first.
+        """
+        lines = (self._buffer + chunk).split(b'\n')
+        self._buffer = lines.pop()
+        waiting = None
+        for line in lines:
+            waiting = self._put(line) or waiting
+            self._skipping = False
+        if len(self._buffer) > self.MAX_LINE_SIZE:
+            waiting = self._put(self._buffer) or waiting
+            self._buffer = b''
+            self._skipping = True
+        return waiting
+
+    def finish(self, handler, model):
+        """Parse the last line and end the stream."""
+        if self._buffer:
+            self._put(self._buffer)
+            self._buffer = b''
+        self._stream.close()
+        return self._stream
+
+    def models(self, handler, validate):
+        self._stream.validate = validate
+        return self._stream
+
+    def _put(self, line):
+        if self._skipping:
+            # remainder of a line that has already been reported as too long
+            return None
+        self._line += 1
+        if len(line) > self.MAX_LINE_SIZE:
+            return self._stream.put(self._line, ValueError('Line too long'))
+        if not line.strip():
+            return None
+        try:
+            value = self._decode(line)
+        except Exception as e:
+            value = e
+        return self._stream.put(self._line, value)
@@ -20,11 +20,16 @@ implementations.
 
 from collections import defaultdict
 
+from tornado.web import stream_request_body
+
 from supercell.mediatypes import ContentType
+from supercell.provider import (ProviderMeta, VALIDATE_ALWAYS,
+                                VALIDATE_NEVER, VALIDATE_SAMPLED)
 
 
 def provides(content_type, vendor=None, version=None, default=False,
-             partial=False):
+             partial=False, streaming=False, flush_every=1000,
+             validate=VALIDATE_ALWAYS, validate_every=100, offload_items=None):
     """Class decorator for mapping HTTP GET responses to content types and
     their representation.
 
@@ -52,6 +57,24 @@ def provides(content_type, vendor=None, version=None, default=False,
     :param bool partial: If **True**, the provider can return partial
                          representations, i.e. the underlying model validates
                          even though required fields are missing.
+    :param bool streaming: If **True**, providers supporting it serialize the
+                           list fields of the model incrementally and send
+                           them with chunked transfer encoding. Streamed
+                           responses are not compressed and not stored in
+                           the server side cache.
+    :param int flush_every: When streaming, flush the response every
+                            `flush_every` list items.
+    :param str validate: Validation policy for outgoing models: **always**
+                         validate them, **never** validate them or only
+                         validate a **sampled** subset and log the errors
+                         instead of returning a 500.
+    :param int validate_every: When sampling, validate one in
+                               `validate_every` models.
+    :param int offload_items: Models whose list and dict fields contain at
+                              least this number of items are validated,
+                              serialized and encoded in the environment's
+                              executor by the JSON and MessagePack
+                              providers.
     """
 
     def wrapper(cls):
@@ -67,19 +90,38 @@ def provides(content_type, vendor=None, version=None, default=False,
         ctype = ContentType(content_type,
                             vendor,
                             version)
+        assert validate in (VALIDATE_ALWAYS, VALIDATE_NEVER,
+                            VALIDATE_SAMPLED), 'Unknown validation policy'
+        configuration = {'partial': partial}
+        if validate != VALIDATE_ALWAYS:
+            assert validate_every > 0, 'validate_every must be positive'
+            configuration.update(validate=validate,
+                                 validate_every=validate_every)
+        if streaming:
+            assert flush_every > 0, 'flush_every must be positive'
+            configuration.update(streaming=True, flush_every=flush_every)
+        if offload_items is not None:
+            assert offload_items >= 0, 'offload_items must not be negative'
+            configuration.update(offload_items=offload_items)
+
         cls._PROD_CONTENT_TYPES[content_type].append(ctype)
-        cls._PROD_CONFIGURATION[content_type]['partial'] = partial
+        cls._PROD_CONFIGURATION[content_type].update(configuration)
         if default:
             assert 'default' not in cls._PROD_CONTENT_TYPES, 'TODO: nice msg'
             cls._PROD_CONTENT_TYPES['*/*'] = [ctype]
-            cls._PROD_CONFIGURATION['*/*']['partial'] = partial
+            cls._PROD_CONFIGURATION['*/*'].update(configuration)
 
+        # negotiations for this handler may have changed, the dispatch table
+        # is compiled by `Environment._finalize()`
+        cls._PROD_DISPATCH = None
+        ProviderMeta.NEGOTIATION_CACHE.clear()
         return cls
 
     return wrapper
 
 
-def consumes(content_type, model, vendor=None, version=None, validate=True):
+def consumes(content_type, model, vendor=None, version=None, validate=True,
+             offload_size=None):
     """Class decorator for mapping HTTP POST and PUT bodies to
 
     Example::
@@ -97,6 +139,14 @@ def consumes(content_type, model, vendor=None, version=None, validate=True):
     :param str vendor: Any vendor information for the base content type
     :param float version: The vendor version
     :param bool validate: Whether to validate the consumed model
+    :param int offload_size: Bodies with at least this number of bytes are
+                             consumed and validated in the environment's
+                             :attr:`supercell.environment.Environment.executor`
+                             instead of the IOLoop. The consumer receives a
+                             stand-in for the handler that only provides the
+                             `request.body`, the `request.headers` and the
+                             codecs of the `environment`, so that a process
+                             pool may be used.
     """
 
     def wrapper(cls):
@@ -110,10 +160,48 @@ def consumes(content_type, model, vendor=None, version=None, validate=True):
             cls._CONS_CONTENT_TYPES = defaultdict(list)
         if not hasattr(cls, '_CONS_MODEL'):
             cls._CONS_MODEL = dict()
+        if not hasattr(cls, '_CONS_OFFLOAD'):
+            cls._CONS_OFFLOAD = dict()
+        assert offload_size is None or offload_size >= 0, \
+            'offload_size must not be negative'
 
         ct = ContentType(content_type, vendor, version)
         cls._CONS_CONTENT_TYPES[content_type].append(ct)
         cls._CONS_MODEL[ct] = (model, validate)
+        cls._CONS_OFFLOAD[ct] = offload_size
+        cls._CONS_DISPATCH = None
+        return cls
+
+    return wrapper
+
+
+def streams_request_body(max_size=None):
+    """Class decorator for consuming request bodies while they are received.
+
+    The handler is marked with :func:`tornado.web.stream_request_body` and the
+    chunks of PATCH, POST and PUT bodies are passed to the consumer selected
+    by :func:`consumes`. The :class:`supercell.consumer.JsonConsumer` parses
+    them incrementally, so that the whole body is never kept in memory::
+
+        @s.streams_request_body(max_size=64 * 1024 * 1024)
+        @s.consumes(s.MediaType.ApplicationJson, model=Upload)
+        class MyHandler(s.RequestHandler):
+
+            @s.coroutine
+            def post(self, *args, **kwargs):
+                upload = kwargs['model']
+
+    :param int max_size: Bodies larger than this number of bytes are rejected
+                         with **413**
+    """
+
+    def wrapper(cls):
+        """The real decorator."""
+        assert isinstance(cls, type), 'This decorator may only be used as ' + \
+            'class decorator'
+        assert max_size is None or max_size > 0, 'max_size must be positive'
+        cls = stream_request_body(cls)
+        cls._STREAM_MAX_SIZE = max_size
         return cls
 
     return wrapper
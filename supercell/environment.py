@@ -28,18 +28,28 @@ connection pooling, e.g.
 """
 
 from collections import namedtuple
+from concurrent.futures import Executor, ThreadPoolExecutor
 from datetime import timedelta
 
 from tornado.web import Application as _TAPP
 
 from supercell.cache import CacheConfigT
-from supercell.health import SystemHealthCheck
+from supercell.codec import JsonCodec, MsgpackCodec
+from supercell.compression import CompressionConfigT
+from supercell.consumer import ConsumerBase
+from supercell.batch import BatchConfigT, BatchHandler
+from supercell.health import SystemHealthCheck, SystemReadyCheck
+from supercell.provider import ProviderBase
+from supercell.purge import PurgeChannel
+from supercell.responsecache import ResponseCache
+from supercell.templates import FragmentCache, precompile_templates
 
 __all__ = ['Environment']
 
 
 Handler = namedtuple('Handler', ['host_pattern', 'path', 'handler_class',
-                                 'init_dict', 'name', 'cache', 'expires'])
+                                 'init_dict', 'name', 'cache', 'expires',
+                                 'compression'])
 
 
 class Application(_TAPP):
@@ -76,12 +86,18 @@ class Environment:
         self._handlers = []
         self._cache_infos = {}
         self._expires_infos = {}
+        self._compression_infos = {}
         self._managed_objects = {}
         self._health_checks = {}
+        self._warmup_requests = []
+        self._warmup_callbacks = []
+        self._persistent_caches = {}
+        self._ready = False
         self._finalized = False
 
     def add_handler(self, path, handler_class, init_dict=None, name=None,
-                    host_pattern='.*$', cache=None, expires=None):
+                    host_pattern='.*$', cache=None, expires=None,
+                    compression=None):
         """Add a handler to the :class:`tornado.web.Application`.
 
         The environment will manage the available request handlers and managed
@@ -120,11 +136,16 @@ class Environment:
         :param expires: Set the `Expires` header according to the provided
                         timedelta
         :type expires: datetime.timedelta
+
+        :param compression: Compress responses of this handler as defined by
+                            :class:`supercell.compression.CompressionConfig`.
+        :type compression: supercell.compression.CompressionConfig
         """
         assert not self._finalized, 'Do not change the environment at runtime'
         handler = Handler(host_pattern=host_pattern, path=path,
                           handler_class=handler_class, init_dict=init_dict,
-                          name=name, cache=cache, expires=expires)
+                          name=name, cache=cache, expires=expires,
+                          compression=compression)
         self._handlers.append(handler)
         if cache:
             assert isinstance(cache, CacheConfigT), 'cache not a CacheConfig'
@@ -132,6 +153,10 @@ class Environment:
         if expires:
             assert isinstance(expires, timedelta), 'expires not a timedelta'
             self._expires_infos[handler_class] = expires
+        if compression:
+            assert isinstance(compression, CompressionConfigT), \
+                'compression not a CompressionConfig'
+            self._compression_infos[handler_class] = compression
 
     def add_managed_object(self, name, instance):
         """Add a managed instance to the environment.
@@ -166,7 +191,28 @@ class Environment:
 
         When the `Service.main()` method starts, it will call `_finalize()`
         in order to not be able to change the environment with respect to
-        managed objects and request handlers."""
+        managed objects and request handlers.
+
+        In addition the provider and consumer dispatch tables of all request
+        handlers are compiled, so that missing or ambiguous providers and
+        consumers are detected at startup.
+
+        :raises: :exc:`supercell.provider.NoProviderFound`,
+                 :exc:`supercell.consumer.NoConsumerFound`
+        """
+        for cache in self._cache_infos.values():
+            assert not cache.response_cache or \
+                cache.response_cache in self._managed_objects, \
+                '%s not a managed object' % cache.response_cache
+
+        handler_classes = [SystemHealthCheck, SystemReadyCheck, BatchHandler]
+        handler_classes.extend(self._health_checks.values())
+        handler_classes.extend(h.handler_class for h in self._handlers)
+        for handler_class in handler_classes:
+            if ProviderBase.has_provider(handler_class):
+                ProviderBase.compile_dispatch_table(handler_class)
+            if hasattr(handler_class, '_CONS_CONTENT_TYPES'):
+                ConsumerBase.compile_dispatch_table(handler_class)
         self._finalized = True
 
     def __getattr__(self, name):
@@ -188,6 +234,233 @@ class Environment:
         assert name not in self._health_checks
         self._health_checks[name] = check
 
+    def add_warmup_request(self, uri, headers=None):
+        """Add a GET request that is executed before the service accepts
+        requests, see :mod:`supercell.warmup`.
+
+        :param uri: The path and query of the request
+        :type uri: str
+
+        :param headers: Additional request headers, e.g. `Accept`
+        :type headers: dict
+        """
+        assert not self._finalized, 'Do not change the environment at runtime'
+        self._warmup_requests.append((uri, headers))
+
+    def add_warmup(self, callback):
+        """Add a callback, e.g. a coroutine of a managed object, that is
+        called without arguments before the service accepts requests, see
+        :mod:`supercell.warmup`.
+
+        :param callback: The callback
+        :type callback: callable
+        """
+        assert not self._finalized, 'Do not change the environment at runtime'
+        self._warmup_callbacks.append(callback)
+
+    def add_persistent_cache(self, name, cache):
+        """Add a cache that is persisted across restarts, see
+        :mod:`supercell.snapshot`.
+
+        :param name: The unique name of the cache in the snapshot
+        :type name: str
+
+        :param cache: The cache implementing `dump()` and `load()`, e.g. the
+                      :attr:`response_cache`
+        """
+        assert not self._finalized, 'Do not change the environment at runtime'
+        assert name not in self._persistent_caches
+        assert hasattr(cache, 'dump') and hasattr(cache, 'load'), \
+            'cache does not implement dump() and load()'
+        self._persistent_caches[name] = cache
+
+    @property
+    def persistent_caches(self):
+        """The caches that are persisted across restarts by their names."""
+        return self._persistent_caches
+
+    @property
+    def warmup_requests(self):
+        """The list of `(uri, headers)` tuples of the warmup requests."""
+        return self._warmup_requests
+
+    @property
+    def warmup_callbacks(self):
+        """The list of warmup callbacks."""
+        return self._warmup_callbacks
+
+    @property
+    def ready(self):
+        """*True* if the warmup has finished and the service is ready to
+        serve requests."""
+        return self._ready
+
+    def set_ready(self):
+        """Mark the service as ready to serve requests."""
+        self._ready = True
+
+    def set_json_codec(self, codec):
+        """Replace the default :class:`supercell.codec.JsonCodec` used for
+        encoding and decoding JSON documents.
+
+        :param codec: The codec to use
+        :type codec: supercell.codec.JsonCodec
+        """
+        assert not self._finalized, 'Do not change the environment at runtime'
+        assert isinstance(codec, JsonCodec), 'codec not a JsonCodec'
+        self._json_codec = codec
+
+    @property
+    def json_codec(self):
+        """The :class:`supercell.codec.JsonCodec` used by the JSON providers
+        and consumers."""
+        if not hasattr(self, '_json_codec'):
+            self._json_codec = JsonCodec()
+        return self._json_codec
+
+    def set_msgpack_codec(self, codec):
+        """Replace the default :class:`supercell.codec.MsgpackCodec` used for
+        encoding and decoding MessagePack documents.
+
+        :param codec: The codec to use
+        :type codec: supercell.codec.MsgpackCodec
+        """
+        assert not self._finalized, 'Do not change the environment at runtime'
+        assert isinstance(codec, MsgpackCodec), 'codec not a MsgpackCodec'
+        self._msgpack_codec = codec
+
+    @property
+    def msgpack_codec(self):
+        """The :class:`supercell.codec.MsgpackCodec` used by the MessagePack
+        providers and consumers."""
+        if not hasattr(self, '_msgpack_codec'):
+            self._msgpack_codec = MsgpackCodec()
+        return self._msgpack_codec
+
+    def set_executor(self, executor):
+        """Replace the default executor used for offloading CPU intensive
+        work, such as compressing large responses, from the IOLoop.
+
+        :param executor: The executor to use
+        :type executor: concurrent.futures.Executor
+        """
+        assert not self._finalized, 'Do not change the environment at runtime'
+        assert isinstance(executor, Executor), 'executor not an Executor'
+        self._executor = executor
+
+    @property
+    def executor(self):
+        """The :class:`concurrent.futures.Executor` used for offloading CPU
+        intensive work from the IOLoop. By default this is a
+        :class:`concurrent.futures.ThreadPoolExecutor`."""
+        if not hasattr(self, '_executor'):
+            self._executor = ThreadPoolExecutor()
+        return self._executor
+
+    def set_response_cache(self, cache):
+        """Replace the default :class:`supercell.responsecache.ResponseCache`
+        used for caching responses in the process.
+
+        :param cache: The cache to use
+        :type cache: supercell.responsecache.ResponseCache
+        """
+        assert not self._finalized, 'Do not change the environment at runtime'
+        assert isinstance(cache, ResponseCache), 'cache not a ResponseCache'
+        self._response_cache = cache
+
+    @property
+    def response_cache(self):
+        """The :class:`supercell.responsecache.ResponseCache` for handlers
+        with a server side :class:`supercell.cache.CacheConfig`."""
+        if not hasattr(self, '_response_cache'):
+            self._response_cache = ResponseCache()
+        return self._response_cache
+
+    def set_fragment_cache(self, cache):
+        """Replace the default :class:`supercell.templates.FragmentCache`
+        used for caching rendered template fragments.
+
+        :param cache: The cache to use
+        :type cache: supercell.templates.FragmentCache
+        """
+        assert not self._finalized, 'Do not change the environment at runtime'
+        assert isinstance(cache, FragmentCache), 'cache not a FragmentCache'
+        self._fragment_cache = cache
+
+    @property
+    def fragment_cache(self):
+        """The :class:`supercell.templates.FragmentCache` used by the
+        `cached_fragment` function in templates."""
+        if not hasattr(self, '_fragment_cache'):
+            self._fragment_cache = FragmentCache()
+        return self._fragment_cache
+
+    def set_purge_channel(self, channel):
+        """Set the :class:`supercell.purge.PurgeChannel` used for purging
+        cache tags in all worker processes on the host.
+
+        :param channel: The channel to use
+        :type channel: supercell.purge.PurgeChannel
+        """
+        assert not self._finalized, 'Do not change the environment at runtime'
+        assert isinstance(channel, PurgeChannel), \
+            'channel not a PurgeChannel'
+        self._purge_channel = channel
+
+    @property
+    def purge_channel(self):
+        """The :class:`supercell.purge.PurgeChannel` or `None` if purges are
+        not sent to other processes."""
+        return getattr(self, '_purge_channel', None)
+
+    def purge_cache_tags(self, *tags):
+        """Remove all responses with one of the `tags` from the server side
+        response caches of all worker processes.
+
+        :param tags: The tags to purge
+        :type tags: str
+        """
+        self._purge_caches(tags, shared=True)
+        if self.purge_channel is not None:
+            self.purge_channel.publish(tags)
+
+    def set_batch(self, config):
+        """Enable the batch endpoint, see :mod:`supercell.batch`.
+
+        :param config: The configuration of the batch endpoint
+        :type config: supercell.batch.BatchConfigT
+        """
+        assert not self._finalized, 'Do not change the environment at runtime'
+        assert isinstance(config, BatchConfigT), 'config not a BatchConfig'
+        self._batch = config
+
+    @property
+    def batch(self):
+        """The :class:`supercell.batch.BatchConfigT` or `None` if the batch
+        endpoint is not enabled."""
+        return getattr(self, '_batch', None)
+
+    def _purge_local_caches(self, tags):
+        """Remove all responses with one of the `tags` from the in-process
+        response caches for a purge of another process.
+
+        Caches shared by all processes have already been purged by the
+        publishing process."""
+        self._purge_caches(tags, shared=False)
+
+    def _purge_caches(self, tags, shared):
+        """Remove all responses with one of the `tags` from the response
+        caches, including the shared ones if `shared` is set."""
+        caches = [self.response_cache]
+        for cache_config in self._cache_infos.values():
+            if cache_config.response_cache:
+                cache = getattr(self, cache_config.response_cache)
+                if cache not in caches:
+                    caches.append(cache)
+        for cache in caches:
+            if shared or not getattr(cache, 'shared', False):
+                cache.purge(*tags)
+
     @property
     def health_checks(self):
         """Simple property access for health checks."""
@@ -230,7 +503,13 @@ class Environment:
 
             # add the default health check
             self._app.add_handlers('.*', [('/_system/check',
-                                           SystemHealthCheck)])
+                                           SystemHealthCheck),
+                                          ('/_system/ready',
+                                           SystemReadyCheck)])
+
+            if self.batch is not None:
+                self._app.add_handlers('.*', [(self.batch.path,
+                                               BatchHandler)])
 
             # add the custom health checks
             for check_name in self.health_checks:
@@ -247,6 +526,12 @@ class Environment:
 
                 self._app.add_handlers(handler.host_pattern, [spec])
 
+            if self._app.settings.get('compiled_template_cache', True):
+                precompile_templates(self._app)
+
+            if self.purge_channel is not None:
+                self.purge_channel.start(self._purge_local_caches)
+
         return self._app
 
     def get_cache_info(self, handler):
@@ -259,6 +544,11 @@ class Environment:
         `Expires` header for GET and HEAD requests."""
         return self._expires_infos.get(handler, None)
 
+    def get_compression_info(self, handler):
+        """Return the :class:`supercell.compression.CompressionConfig` for a
+        certain handler."""
+        return self._compression_infos.get(handler, None)
+
     @property
     def config_name(self):
         """Determine the configuration file name for the machine this
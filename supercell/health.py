@@ -62,6 +62,13 @@ and an error a similar one::
 
     $ curl 'http://127.0.0.1/_system/check/http_resource_with_warning'
     {"code": "ERROR", "error": true}
+
+The readiness of the service is available as */_system/ready*. It returns
+**503** until the warmup of the service has finished (see
+:mod:`supercell.warmup`)::
+
+    $ curl 'http://127.0.0.1/_system/ready'
+    {"code": "READY", "message": "API ready", "ok": true}
 """
 
 from tornado.gen import coroutine
@@ -130,3 +137,19 @@ class SystemHealthCheck(RequestHandler):
     def get(self):
         """Run the default **/_system** healthcheck and return it's result."""
         raise HealthCheckOk(additional={'message': 'API running'})
+
+
+@provides(MediaType.ApplicationJson, default=True)
+class SystemReadyCheck(RequestHandler):
+    """The default readiness check.
+
+    It returns **200** once the environment is ready, i.e. the warmup of the
+    service has finished, and **503** before."""
+
+    @coroutine
+    def get(self):
+        """Return if the service is ready to serve requests."""
+        if self.environment.ready:
+            raise Ok(additional={'code': 'READY', 'message': 'API ready'})
+        raise Error(code=503, additional={'code': 'NOT_READY',
+                                          'message': 'Warming up'})
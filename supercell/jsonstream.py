@@ -0,0 +1,271 @@
+#
+# Copyright (c) 2013 Daniel Truemper <truemped at googlemail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+#
+
+"""Incremental parsing of JSON documents that arrive in chunks.
+
+The :class:`IncrementalJsonParser` is used by the
+:class:`supercell.consumer.JsonConsumer` for handlers that stream their
+request bodies. The top-level object or array and the objects and arrays
+directly contained in it are built as the chunks arrive. All other values
+are parsed with the JSON codec as soon as they are complete, so only the text
+of a single value is kept in memory, e.g. one element of a list of records::
+
+    parser = IncrementalJsonParser()
+    parser.feed(b'{"records": [{"id": 1}, {"i')
+    parser.feed(b'd": 2}]}')
+    assert parser.close() == {'records': [{'id': 1}, {'id': 2}]}
+"""
+
+import codecs
+import json
+import re
+
+
+__all__ = ['IncrementalJsonParser']
+
+
+_WHITESPACE = re.compile(r'[ \t\n\r]*')
+_STRUCTURAL = re.compile(r'["\[\]{}]')
+_STRING_SPECIAL = re.compile(r'["\\]')
+_SCALAR_END = re.compile(r'[ \t\n\r,\]}]')
+
+# parser states of the streamed objects and arrays
+_FIRST = 0
+_KEY = 1
+_COLON = 2
+_VALUE = 3
+_COMMA = 4
+
+
+class _Frame:
+    """An object or array that is being built."""
+
+    __slots__ = ('container', 'is_object', 'state', 'key')
+
+    def __init__(self, container):
+        self.container = container
+        self.is_object = isinstance(container, dict)
+        self.state = _FIRST
+        self.key = None
+
+
+class IncrementalJsonParser:
+    """Parse an utf-8 encoded JSON document from chunks of bytes.
+
+    :param loads: Function parsing a single complete JSON value from a
+                  `str`, e.g. :func:`supercell.codec.JsonCodec.decode`
+    :param stream_depth: The number of nesting levels of objects and arrays
+                         that are built incrementally
+    :type stream_depth: int
+    """
+
+    def __init__(self, loads=None, stream_depth=2):
+        assert stream_depth > 0, 'stream_depth must be positive'
+        self._loads = loads or json.loads
+        self._stream_depth = stream_depth
+        self._decoder = codecs.getincrementaldecoder('utf8')()
+        self._stack = []
+        self._root = None
+        self._done = False
+        # the chunks of an incomplete value, they are joined once the value
+        # is complete, and the state of its scan: (depth, in_string, escaped)
+        self._pending = []
+        self._scan = None
+
+    def feed(self, data):
+        """Parse the next chunk of the document.
+
+        :raises: :exc:`ValueError` if the document is malformed
+        """
+        self._parse(self._decoder.decode(data), final=False)
+
+    def close(self):
+        """Finish parsing and return the document.
+
+        :raises: :exc:`ValueError` if the document is malformed or
+                 incomplete
+        """
+        self._parse(self._decoder.decode(b'', final=True), final=True)
+        if not self._done:
+            raise ValueError('Incomplete JSON document')
+        return self._root
+
+    def _attach(self, value):
+        """Add a complete value to the current object or array."""
+        if not self._stack:
+            self._root = value
+            self._done = True
+            return
+        frame = self._stack[-1]
+        if frame.is_object:
+            frame.container[frame.key] = value
+        else:
+            frame.container.append(value)
+        frame.state = _COMMA
+
+    def _complete(self, text):
+        """Add the complete text of a value or property name."""
+        if self._stack and self._stack[-1].state == _KEY:
+            self._stack[-1].key = self._loads(text)
+            self._stack[-1].state = _COLON
+        else:
+            self._attach(self._loads(text))
+
+    def _close_frame(self):
+        self._stack.pop()
+        if not self._stack:
+            self._done = True
+
+    def _parse(self, buf, final):
+        pos = 0
+        if self._pending:
+            pos = self._scan_value(buf, 0, final)
+            if pos is None:
+                self._pending.append(buf)
+                return
+            self._pending.append(buf[:pos])
+            text = ''.join(self._pending)
+            self._pending = []
+            self._complete(text)
+        end = len(buf)
+        stack = self._stack
+        while True:
+            pos = _WHITESPACE.match(buf, pos).end()
+            if pos == end:
+                break
+            if self._done:
+                raise ValueError('Extra data after the JSON document')
+            c = buf[pos]
+
+            if not stack or stack[-1].state == _VALUE:
+                if c in '{[' and len(stack) < self._stream_depth:
+                    container = {} if c == '{' else []
+                    self._attach(container)
+                    self._done = False
+                    stack.append(_Frame(container))
+                    pos += 1
+                    continue
+                value_end = self._scan_value(buf, pos, final)
+                if value_end is None:
+                    self._pending.append(buf[pos:])
+                    break
+                self._complete(buf[pos:value_end])
+                pos = value_end
+                continue
+
+            frame = stack[-1]
+            closing = '}' if frame.is_object else ']'
+            if frame.state == _FIRST:
+                if c == closing:
+                    self._close_frame()
+                    pos += 1
+                else:
+                    frame.state = _KEY if frame.is_object else _VALUE
+            elif frame.state == _COMMA:
+                if c == ',':
+                    frame.state = _KEY if frame.is_object else _VALUE
+                elif c == closing:
+                    self._close_frame()
+                else:
+                    raise ValueError('Expecting %r or %r' % (',', closing))
+                pos += 1
+            elif frame.state == _KEY:
+                if c != '"':
+                    raise ValueError('Expecting property name')
+                value_end = self._scan_value(buf, pos, final)
+                if value_end is None:
+                    self._pending.append(buf[pos:])
+                    break
+                self._complete(buf[pos:value_end])
+                pos = value_end
+            else:
+                if c != ':':
+                    raise ValueError('Expecting %r' % ':')
+                frame.state = _VALUE
+                pos += 1
+
+    def _scan_value(self, buf, start, final):
+        """Return the end of the value starting at `start` or `None` if it
+        is incomplete.
+
+        The scan of an incomplete value is resumed at the start of the next
+        chunk."""
+        if self._scan is not None:
+            (depth, in_string, escaped) = self._scan
+            i = start
+        elif buf[start] in '"{[':
+            (depth, in_string, escaped) = (int(buf[start] != '"'),
+                                           buf[start] == '"', False)
+            i = start + 1
+        else:
+            # scalars are the only values scanned outside of a string at
+            # depth 0
+            (depth, in_string, escaped) = (0, False, False)
+            i = start
+
+        end = len(buf)
+        if depth == 0 and not in_string:
+            self._scan = None
+            match = _SCALAR_END.search(buf, i)
+            if match is not None:
+                return match.start()
+            if final:
+                return end
+            self._scan = (depth, in_string, escaped)
+            return None
+
+        if escaped and i < end:
+            (i, escaped) = (i + 1, False)
+        while i < end:
+            if in_string:
+                match = _STRING_SPECIAL.search(buf, i)
+                if match is None:
+                    i = end
+                    break
+                i = match.start()
+                if buf[i] == '\\':
+                    if i + 1 >= end:
+                        (i, escaped) = (end, True)
+                        break
+                    i += 2
+                    continue
+                i += 1
+                in_string = False
+                if depth == 0:
+                    self._scan = None
+                    return i
+                continue
+            match = _STRUCTURAL.search(buf, i)
+            if match is None:
+                i = end
+                break
+            i = match.end()
+            char = match.group()
+            if char == '"':
+                in_string = True
+            elif char in '[{':
+                depth += 1
+            else:
+                depth -= 1
+                if depth == 0:
+                    self._scan = None
+                    return i
+
+        if final:
+            raise ValueError('Incomplete JSON document')
+        self._scan = (depth, in_string, escaped)
+        return None
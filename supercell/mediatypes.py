@@ -42,6 +42,15 @@ class MediaType:
     TextHtml = 'text/html'
     """Content type for `text/html`"""
 
+    ApplicationMsgpack = 'application/x-msgpack'
+    """Content type for `application/x-msgpack`"""
+
+    ApplicationNdjson = 'application/x-ndjson'
+    """Content type for `application/x-ndjson`"""
+
+    ApplicationJsonSeq = 'application/json-seq'
+    """Content type for `application/json-seq`"""
+
 
 ReturnInformationT = namedtuple('ReturnInformation', ['code', 'message'])
 
@@ -0,0 +1,258 @@
+#
+# Copyright (c) 2013 Daniel Truemper <truemped at googlemail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+#
+
+"""A pure-Python implementation of the `MessagePack <https://msgpack.org>`_
+format used by the :class:`supercell.codec.MsgpackCodec`.
+
+Only the types that are the result of
+:func:`schematics.models.Model.to_primitive` are supported: `None`, `bool`,
+`int`, `float`, `str`, `bytes`, `list`, `tuple` and `dict`. Floats are always
+encoded with double precision, extension types are not supported.
+"""
+
+from struct import Struct, error as StructError
+
+
+__all__ = ['packb', 'unpackb', 'MAX_DEPTH']
+
+
+MAX_DEPTH = 128
+"""Maximum nesting depth of arrays and maps when unpacking."""
+
+_UINT8 = Struct('>B')
+_UINT16 = Struct('>H')
+_UINT32 = Struct('>I')
+_UINT64 = Struct('>Q')
+_INT8 = Struct('>b')
+_INT16 = Struct('>h')
+_INT32 = Struct('>i')
+_INT64 = Struct('>q')
+_FLOAT32 = Struct('>f')
+_FLOAT64 = Struct('>d')
+
+
+def _pack_int(value, append):
+    if 0 <= value < 0x80:
+        append(_UINT8.pack(value))
+    elif -32 <= value < 0:
+        append(_INT8.pack(value))
+    elif value > 0:
+        if value <= 0xff:
+            append(b'\xcc' + _UINT8.pack(value))
+        elif value <= 0xffff:
+            append(b'\xcd' + _UINT16.pack(value))
+        elif value <= 0xffffffff:
+            append(b'\xce' + _UINT32.pack(value))
+        elif value <= 0xffffffffffffffff:
+            append(b'\xcf' + _UINT64.pack(value))
+        else:
+            raise ValueError('Integer out of range: %d' % value)
+    elif value >= -0x80:
+        append(b'\xd0' + _INT8.pack(value))
+    elif value >= -0x8000:
+        append(b'\xd1' + _INT16.pack(value))
+    elif value >= -0x80000000:
+        append(b'\xd2' + _INT32.pack(value))
+    elif value >= -0x8000000000000000:
+        append(b'\xd3' + _INT64.pack(value))
+    else:
+        raise ValueError('Integer out of range: %d' % value)
+
+
+def _pack_header(size, fix, fix_limit, codes, append):
+    """Append the header of a `str`, `bin`, `array` or `map` of `size`."""
+    if size < fix_limit:
+        append(_UINT8.pack(fix | size))
+    elif codes[0] is not None and size <= 0xff:
+        append(codes[0] + _UINT8.pack(size))
+    elif size <= 0xffff:
+        append(codes[1] + _UINT16.pack(size))
+    elif size <= 0xffffffff:
+        append(codes[2] + _UINT32.pack(size))
+    else:
+        raise ValueError('Object too large: %d' % size)
+
+
+_STR = (0xa0, 32, (b'\xd9', b'\xda', b'\xdb'))
+_BIN = (0, 0, (b'\xc4', b'\xc5', b'\xc6'))
+_ARRAY = (0x90, 16, (None, b'\xdc', b'\xdd'))
+_MAP = (0x80, 16, (None, b'\xde', b'\xdf'))
+
+
+_FIXSTR = tuple(bytes([0xa0 | size]) for size in range(32))
+_FIXINT = tuple(bytes([value]) for value in range(0x80))
+
+
+def _pack(obj, append):
+    t = type(obj)
+    if t is str:
+        data = obj.encode('utf8')
+        if len(data) < 32:
+            append(_FIXSTR[len(data)])
+        else:
+            _pack_header(len(data), *_STR, append)
+        append(data)
+    elif obj is None:
+        append(b'\xc0')
+    elif t is bool:
+        append(b'\xc3' if obj else b'\xc2')
+    elif t is int:
+        if 0 <= obj < 0x80:
+            append(_FIXINT[obj])
+        else:
+            _pack_int(obj, append)
+    elif t is float:
+        append(b'\xcb' + _FLOAT64.pack(obj))
+    elif t is dict:
+        _pack_header(len(obj), *_MAP, append)
+        for (key, value) in obj.items():
+            _pack(key, append)
+            _pack(value, append)
+    elif t is list or t is tuple:
+        _pack_header(len(obj), *_ARRAY, append)
+        for value in obj:
+            _pack(value, append)
+    elif t is bytes or t is bytearray:
+        _pack_header(len(obj), *_BIN, append)
+        append(bytes(obj))
+    else:
+        _pack_subclass(obj, append)
+
+
+def _pack_subclass(obj, append):
+    """Pack instances of subclasses of the supported types."""
+    for t in (bool, int, float, str, bytes, bytearray, dict, list, tuple):
+        if isinstance(obj, t):
+            _pack(t(obj), append)
+            return
+    raise TypeError('Can not serialize %r' % type(obj))
+
+
+def packb(obj):
+    """Serialize `obj` into a MessagePack document.
+
+    :raises: :exc:`TypeError` for unsupported types and :exc:`ValueError` if
+             a value is out of the range of MessagePack
+    :rtype: bytes
+    """
+    chunks = []
+    _pack(obj, chunks.append)
+    return b''.join(chunks)
+
+
+def _read(data, pos, size):
+    end = pos + size
+    if end > len(data):
+        raise ValueError('Truncated MessagePack document')
+    return (data[pos:end], end)
+
+
+def _unpack(data, pos, depth):
+    """Unpack the object starting at `pos` and return it together with the
+    position after it."""
+    code = data[pos]
+    pos += 1
+    if code < 0x80:
+        return (code, pos)
+    if code >= 0xe0:
+        return (code - 0x100, pos)
+    if 0xa0 <= code < 0xc0:
+        (raw, pos) = _read(data, pos, code & 0x1f)
+        return (raw.decode('utf8'), pos)
+    if code < 0xa0:
+        if code < 0x90:
+            return _unpack_map(data, pos, code & 0x0f, depth)
+        return _unpack_array(data, pos, code & 0x0f, depth)
+
+    if code == 0xc0:
+        return (None, pos)
+    if code == 0xc2:
+        return (False, pos)
+    if code == 0xc3:
+        return (True, pos)
+    struct = _FIXED.get(code)
+    if struct is not None:
+        return (struct.unpack_from(data, pos)[0], pos + struct.size)
+    kind = _SIZED.get(code)
+    if kind is None:
+        raise ValueError('Unsupported MessagePack type: 0x%02x' % code)
+    (kind, struct) = kind
+    size = struct.unpack_from(data, pos)[0]
+    pos += struct.size
+    if kind == 'str':
+        (raw, pos) = _read(data, pos, size)
+        return (raw.decode('utf8'), pos)
+    if kind == 'bin':
+        return _read(data, pos, size)
+    if kind == 'array':
+        return _unpack_array(data, pos, size, depth)
+    return _unpack_map(data, pos, size, depth)
+
+
+def _unpack_array(data, pos, size, depth):
+    if depth >= MAX_DEPTH:
+        raise ValueError('MessagePack document nested too deeply')
+    depth += 1
+    result = []
+    append = result.append
+    for _ in range(size):
+        (value, pos) = _unpack(data, pos, depth)
+        append(value)
+    return (result, pos)
+
+
+def _unpack_map(data, pos, size, depth):
+    if depth >= MAX_DEPTH:
+        raise ValueError('MessagePack document nested too deeply')
+    depth += 1
+    result = {}
+    for _ in range(size):
+        (key, pos) = _unpack(data, pos, depth)
+        (value, pos) = _unpack(data, pos, depth)
+        try:
+            result[key] = value
+        except TypeError:
+            raise ValueError('Unhashable MessagePack map key')
+    return (result, pos)
+
+
+# types with a fixed size
+_FIXED = {0xca: _FLOAT32, 0xcb: _FLOAT64,
+          0xcc: _UINT8, 0xcd: _UINT16, 0xce: _UINT32, 0xcf: _UINT64,
+          0xd0: _INT8, 0xd1: _INT16, 0xd2: _INT32, 0xd3: _INT64}
+
+# types with a size header
+_SIZED = {0xd9: ('str', _UINT8), 0xda: ('str', _UINT16),
+          0xdb: ('str', _UINT32), 0xc4: ('bin', _UINT8),
+          0xc5: ('bin', _UINT16), 0xc6: ('bin', _UINT32),
+          0xdc: ('array', _UINT16), 0xdd: ('array', _UINT32),
+          0xde: ('map', _UINT16), 0xdf: ('map', _UINT32)}
+
+
+def unpackb(data):
+    """Parse the MessagePack document `data`.
+
+    :raises: :exc:`ValueError` if the document is malformed
+    """
+    data = bytes(data)
+    try:
+        (result, pos) = _unpack(data, 0, 0)
+    except (IndexError, StructError):
+        raise ValueError('Truncated MessagePack document')
+    if pos != len(data):
+        raise ValueError('Extra data after the MessagePack document')
+    return result
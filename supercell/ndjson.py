@@ -0,0 +1,162 @@
+#
+# Copyright (c) 2013 Daniel Truemper <truemped at googlemail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+#
+
+"""Newline delimited JSON (`application/x-ndjson`) request bodies.
+
+The :class:`supercell.consumer.NdjsonConsumer` parses the lines of a streamed
+request body as they arrive and passes a :class:`ModelStream` to the handler,
+which asynchronously iterates over the models before the body has been
+received completely::
+
+    @s.streams_request_body()
+    @s.consumes(s.MediaType.ApplicationNdjson, model=Record)
+    class BulkHandler(s.RequestHandler):
+
+        async def post(self, *args, **kwargs):
+            count = 0
+            async for record in kwargs['model']:
+                count += 1
+            return Summary({'count': count})
+
+A line that is not valid JSON or does not match the model raises a
+:exc:`LineError` during the iteration. Unless the handler catches it and
+continues with the next line, the request fails with **400** and the line
+number in the reason. Only a bounded number of parsed lines is buffered, if
+the handler does not keep up reading from the connection is paused.
+"""
+
+from collections import deque
+import json
+
+from schematics.exceptions import BaseError
+from tornado.concurrent import Future
+from tornado.web import HTTPError
+
+from supercell import validation
+from supercell._compat import error_messages
+from supercell.utils import escape_contents
+
+
+__all__ = ['LineError', 'ModelStream']
+
+
+class LineError(HTTPError):
+    """A line of a request body could not be consumed.
+
+    :param int line: The line number, starting at 1
+    :param errors: The error messages of the line
+    """
+
+    def __init__(self, line, errors):
+        self.line = line
+        self.errors = errors
+        super(LineError, self).__init__(400, reason=json.dumps(
+            escape_contents({'line': line, 'errors': errors})))
+
+
+class ModelStream:
+    """Async iterator over the models of the lines of a request body.
+
+    The lines are added with :func:`put`, converted into the `model` and
+    validated while iterating. The stream ends with :func:`close`.
+
+    :param model: The model of the lines
+    :type model: :class:`schematics.models.Model`
+
+    :param bool validate: Validate the models
+    :param int maxsize: The number of lines that are buffered before
+                        :func:`put` returns a `Future`
+    """
+
+    def __init__(self, model, validate=True, maxsize=1000):
+        assert maxsize > 0, 'maxsize must be positive'
+        self.model = model
+        self.validate = validate
+        self.maxsize = maxsize
+        self._items = deque()
+        self._closed = False
+        self._error = None
+        self._getter = None
+        self._putter = None
+
+    def put(self, line, value):
+        """Add the parsed `value` of a line, or the exception raised while
+        parsing it.
+
+        Returns a `Future` that is resolved once the buffer has room again
+        if it is full, otherwise `None`. Lines added after the stream was
+        closed are discarded.
+        """
+        if self._closed:
+            return None
+        self._items.append((line, value))
+        self._wakeup_getter()
+        if len(self._items) < self.maxsize:
+            return None
+        if self._putter is None or self._putter.done():
+            self._putter = Future()
+        return self._putter
+
+    def close(self, error=None):
+        """End the stream after all buffered lines and resolve the `Future`
+        returned by :func:`put`.
+
+        :param error: Raised by the iteration instead of ending it
+        """
+        if not self._closed:
+            self._closed = True
+            self._error = error
+        self._wakeup_getter()
+        self._wakeup_putter()
+
+    def __len__(self):
+        return len(self._items)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        while not self._items:
+            if self._closed:
+                if self._error is not None:
+                    (error, self._error) = (self._error, None)
+                    raise error
+                raise StopAsyncIteration
+            self._getter = Future()
+            await self._getter
+        (line, value) = self._items.popleft()
+        if len(self._items) < self.maxsize:
+            self._wakeup_putter()
+        if isinstance(value, Exception):
+            raise LineError(line, str(value))
+        try:
+            model = self.model(value)
+            if self.validate:
+                validation.validate(model)
+        except BaseError as e:
+            raise LineError(line, error_messages(e))
+        except Exception as e:
+            raise LineError(line, str(e))
+        return model
+
+    def _wakeup_getter(self):
+        if self._getter is not None and not self._getter.done():
+            self._getter.set_result(None)
+
+    def _wakeup_putter(self):
+        if self._putter is not None and not self._putter.done():
+            self._putter.set_result(None)
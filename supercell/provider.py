@@ -16,17 +16,42 @@
 #
 
 import json
+import random
 from collections import defaultdict
+from types import MappingProxyType
 from schematics.exceptions import ModelValidationError
+from schematics.models import Model
+from schematics.types.compound import DictType, ListType
+from tornado import gen
 from tornado.web import HTTPError
-from tornado import escape
 
+from supercell import stats
 from supercell._compat import with_metaclass, error_messages
 from supercell.mediatypes import ContentType, MediaType
 from supercell.acceptparsing import parse_accept_header
-from supercell.utils import escape_contents
+from supercell.serializer import to_primitive
+from supercell.utils import escape_contents, LRUCache
 
-__all__ = ['NoProviderFound', 'ProviderBase', 'JsonProvider']
+__all__ = ['NoProviderFound', 'ProviderBase', 'JsonProvider',
+           'MsgpackProvider', 'NdjsonProvider', 'JsonSeqProvider',
+           'VALIDATE_ALWAYS', 'VALIDATE_NEVER', 'VALIDATE_SAMPLED']
+
+
+VALIDATE_ALWAYS = 'always'
+"""Validate every outgoing model and return a 500 for invalid models."""
+
+VALIDATE_NEVER = 'never'
+"""Never validate outgoing models."""
+
+VALIDATE_SAMPLED = 'sampled'
+"""Validate one in `validate_every` outgoing models and only log and count
+invalid models."""
+
+
+_JSON_CONTENT_TYPE = 'application/json; charset=UTF-8'
+
+_MAX_CACHEABLE_ACCEPT_LENGTH = 1024
+"""Accept headers longer than this are negotiated without being cached."""
 
 
 class NoProviderFound(Exception):
@@ -45,6 +70,10 @@ class ProviderMeta(type):
 
     KNOWN_CONTENT_TYPES = defaultdict(list)
 
+    NEGOTIATION_CACHE = LRUCache(maxsize=512)
+    """Cache of already negotiated providers keyed by the handler class, the
+    `Accept` header and the `allow_default` flag."""
+
     def __new__(cls, name, bases, dct):
         provider_class = type.__new__(cls, name, bases, dct)
 
@@ -52,10 +81,59 @@ class ProviderMeta(type):
             ct = provider_class.CONTENT_TYPE
             ProviderMeta.KNOWN_CONTENT_TYPES[ct.content_type].append(
                 (ct, provider_class))
+            ProviderMeta.NEGOTIATION_CACHE.clear()
 
         return provider_class
 
 
+def _single_provider(handler_class, content_type):
+    """Return the only provider registered for `content_type`."""
+    known_types = [t[1] for t in
+                   ProviderMeta.KNOWN_CONTENT_TYPES[content_type.content_type]
+                   if t[0] == content_type]
+    if len(known_types) != 1:
+        raise NoProviderFound('%s: found %d providers for %r' % (
+            handler_class.__name__, len(known_types), content_type))
+    return known_types[0]
+
+
+def _should_validate(validate, validate_every):
+    """Apply the validation policy to an outgoing model."""
+    if validate == VALIDATE_NEVER:
+        return False
+    return validate != VALIDATE_SAMPLED or \
+        random.random() * validate_every < 1
+
+
+def _estimate_size(model, handler):
+    """Estimate the size of a model by the number of items of its list and
+    dict fields, unless the handler knows better."""
+    size = getattr(handler, '_size_hint', None)
+    if size is not None:
+        return size
+    size = 0
+    for (name, field) in model._fields.items():
+        if isinstance(field, (ListType, DictType)):
+            size += len(model.get(name) or ())
+    return size
+
+
+def _serialize(model, encode, partial, validate, check):
+    """Validate, serialize and encode a model in the executor.
+
+    Returns the encoded model and the validation errors. If the validation
+    fails and the errors are not only logged, the model is not encoded."""
+    messages = None
+    if check:
+        try:
+            model.validate(partial=partial)
+        except ModelValidationError as e:
+            messages = escape_contents(error_messages(e))
+            if validate != VALIDATE_SAMPLED:
+                return (None, messages)
+    return (encode(to_primitive(model)), messages)
+
+
 class ProviderBase(with_metaclass(ProviderMeta, object)):
     """Base class for content type providers.
 
@@ -92,6 +170,10 @@ class ProviderBase(with_metaclass(ProviderMeta, object)):
 
         If no provider matches, raise a `NoProviderFound` exception.
 
+        The result of the negotiation is stored in the
+        :data:`ProviderMeta.NEGOTIATION_CACHE`, so that subsequent requests
+        with the same `Accept` header do not have to parse it again.
+
         :param accept_header: HTTP Accept header value
         :type accept_header: str
         :param handler: supercell request handler
@@ -107,7 +189,33 @@ class ProviderBase(with_metaclass(ProviderMeta, object)):
         if not hasattr(handler, '_PROD_CONTENT_TYPES'):
             raise NoProviderFound()
 
+        if len(accept_header) > _MAX_CACHEABLE_ACCEPT_LENGTH:
+            return ProviderBase._negotiate(accept_header, handler,
+                                           allow_default)
+
+        handler_class = handler if isinstance(handler, type) else \
+            type(handler)
+        key = (handler_class, accept_header, allow_default)
+        cache = ProviderMeta.NEGOTIATION_CACHE
+        result = cache.get(key, default=False)
+        if result is False:
+            try:
+                result = ProviderBase._negotiate(accept_header, handler,
+                                                 allow_default)
+            except NoProviderFound:
+                result = None
+            cache.put(key, result)
+
+        if result is None:
+            raise NoProviderFound()
+        return result
+
+    @staticmethod
+    def _negotiate(accept_header, handler, allow_default):
+        """Parse the `Accept` header and find the matching provider without
+        consulting the cache."""
         accept = parse_accept_header(accept_header)
+        dispatch = getattr(handler, '_PROD_DISPATCH', None)
 
         for (ctype, params, q) in accept:
             if ctype not in handler._PROD_CONTENT_TYPES:
@@ -116,11 +224,18 @@ class ProviderBase(with_metaclass(ProviderMeta, object)):
             if ctype == '*/*':
                 if not allow_default:
                     continue
+                if dispatch is not None:
+                    return handler._PROD_DEFAULT
                 c = handler._PROD_CONTENT_TYPES[ctype][0]
             else:
                 c = ContentType(ctype, vendor=params.get('vendor', None),
                                 version=params.get('version', None))
 
+            if dispatch is not None:
+                if c in dispatch:
+                    return dispatch[c]
+                continue
+
             if c not in handler._PROD_CONTENT_TYPES[c.content_type]:
                 continue
 
@@ -134,6 +249,109 @@ class ProviderBase(with_metaclass(ProviderMeta, object)):
 
         raise NoProviderFound()
 
+    @staticmethod
+    def compile_dispatch_table(handler_class):
+        """Resolve the provider for every content type registered with the
+        :func:`supercell.decorators.provides` decorator.
+
+        The result is stored as a read-only mapping from the
+        :class:`supercell.mediatypes.ContentTypeT` to the provider class and
+        its configuration in `handler_class._PROD_DISPATCH`, so that
+        :func:`ProviderBase.map_provider` does not have to search the known
+        providers on every request.
+
+        :param handler_class: supercell request handler class
+        :raises: :exc:`NoProviderFound` if no or more than one provider is
+                 registered for a content type
+        """
+        dispatch = {}
+        for content_type, ctypes in handler_class._PROD_CONTENT_TYPES.items():
+            if content_type == '*/*':
+                continue
+            configuration = MappingProxyType(dict(
+                handler_class._PROD_CONFIGURATION[content_type]))
+            for c in ctypes:
+                dispatch[c] = (_single_provider(handler_class, c),
+                               configuration)
+
+        handler_class._PROD_DISPATCH = MappingProxyType(dispatch)
+        if '*/*' in handler_class._PROD_CONTENT_TYPES:
+            c = handler_class._PROD_CONTENT_TYPES['*/*'][0]
+            handler_class._PROD_DEFAULT = (
+                dispatch[c][0], MappingProxyType(dict(
+                    handler_class._PROD_CONFIGURATION['*/*'])))
+
+    def validate_model(self, model, handler, partial=False,
+                       validate=VALIDATE_ALWAYS, validate_every=100, **kwargs):
+        """Validate the outgoing `model` according to the validation policy
+        configured with the :func:`supercell.decorators.provides` decorator.
+
+        With :data:`VALIDATE_SAMPLED` validation errors are logged and counted
+        in the `provider.validation_errors` statistic, see
+        :mod:`supercell.stats`.
+
+        :param partial: if **True** the model will be validate as a partial.
+        :type partial: bool
+        :param validate: one of :data:`VALIDATE_ALWAYS`,
+                         :data:`VALIDATE_NEVER` or :data:`VALIDATE_SAMPLED`
+        :type validate: str
+        :param validate_every: sample rate for :data:`VALIDATE_SAMPLED`
+        :type validate_every: int
+        :raises: :exc:`tornado.web.HTTPError` if the model is invalid
+        """
+        if not _should_validate(validate, validate_every):
+            return
+
+        try:
+            model.validate(partial=partial)
+        except ModelValidationError as e:
+            self._invalid_model(escape_contents(error_messages(e)), handler,
+                                validate)
+
+    def _invalid_model(self, messages, handler, validate):
+        """Log and count or raise the validation errors of a model."""
+        if validate == VALIDATE_SAMPLED:
+            stats.increment('provider.validation_errors')
+            handler.logger.warning('Invalid result model: %s', messages)
+            return
+        raise HTTPError(500, reason=json.dumps({
+            "result_model": messages
+        }))
+
+    def offload_model(self, model, handler, encode, offload_items=None,
+                      partial=False, validate=VALIDATE_ALWAYS,
+                      validate_every=100, **kwargs):
+        """Validate, serialize and encode a large `model` in the environment's
+        :attr:`supercell.environment.Environment.executor` and write the
+        result on the IOLoop.
+
+        The size of the model is the size hint of the handler, see
+        :func:`supercell.requesthandler.RequestHandler.set_size_hint`, or
+        the number of items of its list and dict fields. If it is smaller
+        than `offload_items`, `None` is returned and the model has to be
+        provided on the IOLoop, otherwise a `Future` that is resolved once
+        the encoded model has been written.
+
+        :param encode: Function encoding the primitive model to `bytes`
+        :param offload_items: The size of models that are offloaded
+        :type offload_items: int
+        """
+        if offload_items is None or \
+                _estimate_size(model, handler) < offload_items:
+            return None
+        return self._write_offloaded(
+            model, handler, encode, partial,
+            validate, _should_validate(validate, validate_every))
+
+    @gen.coroutine
+    def _write_offloaded(self, model, handler, encode, partial, validate,
+                         check):
+        (data, messages) = yield handler.environment.executor.submit(
+            _serialize, model, encode, partial, validate, check)
+        if messages is not None:
+            self._invalid_model(messages, handler, validate)
+        handler.write(data)
+
     def provide(self, model, handler, **kwargs):
         """This method should return the correct representation as a simple
         string (i.e. byte buffer) that will be used as return value.
@@ -145,6 +363,59 @@ class ProviderBase(with_metaclass(ProviderMeta, object)):
         """
         raise NotImplementedError
 
+    def provide_stream(self, models, handler, **kwargs):
+        """Write the models of the async iterator `models`, e.g. an async
+        generator returned by the handler, and return a `Future` that is
+        resolved once all models have been written.
+
+        By default streams of models are not supported and a **406** is
+        raised.
+
+        The headers are sent with the first models, so streamed responses
+        are neither compressed, nor stored in the server side cache, nor
+        passed to coalesced requests, and no `Vary: Accept-Encoding` is
+        added. Errors after the headers have been sent, e.g. a value that is
+        not a model, close the connection without finishing the response.
+
+        :param models: the models to convert to a certain content type
+        :type models: async iterator of supercell.schematics.Model
+        :param handler: the handler to write the return
+        :type handler: supercell.requesthandler.RequestHandler
+        """
+        raise HTTPError(406, reason="Can not produce acceptable response")
+
+    def _write_stream(self, models, handler, encode, prefix=b'',
+                      separator=b'', suffix=b'', **kwargs):
+        """Write the encoded `models` between `prefix` and `suffix` and
+        return a `Future` that is resolved once all models have been written.
+
+        The response is flushed after every model, or every `flush_every`
+        models if configured with `streaming=True`, so only the models that
+        have not been sent yet are kept in memory."""
+        return gen.convert_yielded(self._write_models(
+            models, handler, encode, prefix, separator, suffix, **kwargs))
+
+    async def _write_models(self, models, handler, encode, prefix, separator,
+                            suffix, **kwargs):
+        flush_every = kwargs.get('flush_every', 1)
+        chunk = [prefix]
+        count = 0
+        async for model in models:
+            if not isinstance(model, Model):
+                handler.logger.error('Returning a non-model is not supported')
+                raise HTTPError(500)
+            self.validate_model(model, handler, **kwargs)
+            if count:
+                chunk.append(separator)
+            chunk.append(encode(to_primitive(model)))
+            count += 1
+            if count % flush_every == 0:
+                handler.write(b''.join(chunk))
+                chunk = []
+                await handler.flush()
+        chunk.append(suffix)
+        handler.write(b''.join(chunk))
+
     def error(self, status_code, message, handler):
         """This method should return the correct representation of errors
         that will be used as return value.
@@ -165,37 +436,218 @@ class JsonProvider(ProviderBase):
     CONTENT_TYPE = ContentType(MediaType.ApplicationJson)
 
     def provide(self, model, handler, **kwargs):
-        """Simply return the json via `json.dumps`.
+        """Simply return the json encoded by the environment's
+        :class:`supercell.codec.JsonCodec`.
 
         Keyword arguments:
         :param partial: if **True** the model will be validate as a partial.
         :type partial: bool
+        :param validate: the validation policy, see
+                         :func:`ProviderBase.validate_model`
+        :type validate: str
+        :param streaming: if **True** the list fields of the model are
+                          serialized item by item and sent with chunked
+                          transfer encoding.
+        :type streaming: bool
+        :param flush_every: when streaming, flush the response after this
+                            number of list items.
+        :type flush_every: int
+        :param offload_items: models of at least this size are serialized
+                              in the executor, see
+                              :func:`ProviderBase.offload_model`
+        :type offload_items: int
 
         .. seealso:: :py:mod:`supercell.api.provider.ProviderBase.provide`
         """
-        try:
-            partial = kwargs.get("partial", False)
-            model.validate(partial=partial)
-            handler.write(model.to_primitive())
-        except ModelValidationError as e:
-            raise HTTPError(500, reason=json.dumps({
-                "result_model": escape_contents(error_messages(e))
-            }))
+        codec = handler.environment.json_codec
+        handler.set_header('Content-Type', _JSON_CONTENT_TYPE)
+        if not kwargs.get("streaming", False):
+            offloaded = self.offload_model(model, handler, codec.encode,
+                                           **kwargs)
+            if offloaded is not None:
+                return offloaded
+        self.validate_model(model, handler, **kwargs)
+        if kwargs.get("streaming", False):
+            return self._stream(model, handler, codec,
+                                kwargs.get("flush_every", 1000))
+        handler.write(codec.encode(to_primitive(model)))
+
+    @gen.coroutine
+    def _stream(self, model, handler, codec, flush_every):
+        """Write the model with all non-empty list fields serialized
+        incrementally and flush the response every `flush_every` items."""
+        list_fields = [(name, field) for (name, field) in model._fields.items()
+                       if isinstance(field, ListType) and model.get(name)]
+        streamed = set(name for (name, _) in list_fields)
+        head = model.to_primitive(role=lambda name, value: name in streamed)
+        for (name, field) in list_fields:
+            head.pop(field.serialized_name or name, None)
+
+        # write the document without the closing bracket, list fields are
+        # appended afterwards
+        head = codec.encode(head).rstrip()[:-1].rstrip()
+        separator = b'' if head.endswith(b'{') else b', '
+        chunk = [head]
+        count = 0
+        for (name, field) in list_fields:
+            chunk.append(separator)
+            chunk.append(codec.encode(field.serialized_name or name))
+            chunk.append(b': [')
+            separator = b', '
+            item_separator = b''
+            for item in model[name]:
+                chunk.append(item_separator)
+                chunk.append(codec.encode(field.field.to_primitive(item)))
+                item_separator = b', '
+                count += 1
+                if count % flush_every == 0:
+                    handler.write(b''.join(chunk))
+                    chunk = []
+                    yield handler.flush()
+            chunk.append(b']')
+        chunk.append(b'}')
+        handler.write(b''.join(chunk))
+
+    def provide_stream(self, models, handler, **kwargs):
+        """Write the models as JSON array.
+
+        .. seealso::
+            :py:mod:`supercell.api.provider.ProviderBase.provide_stream`
+        """
+        handler.set_header('Content-Type', _JSON_CONTENT_TYPE)
+        return self._write_stream(models, handler,
+                                  handler.environment.json_codec.encode,
+                                  prefix=b'[', separator=b', ', suffix=b']',
+                                  **kwargs)
 
     def error(self, status_code, message, handler):
         """Simply return errors in  json.
 
         .. seealso:: :py:mod:`supercell.api.provider.ProviderBase.error`
         """
+        codec = handler.environment.json_codec
         try:
-            message = json.loads(message)
+            message = codec.decode(message)
         except ValueError:
             pass
 
         res = {"message": message,
                "error": True}
         handler.set_header('Content-Type', MediaType.ApplicationJson)
-        handler.finish(escape.json_encode(res))
+        handler.finish(codec.encode(res))
+
+
+class MsgpackProvider(ProviderBase):
+    """Default `application/x-msgpack` provider."""
+
+    CONTENT_TYPE = ContentType(MediaType.ApplicationMsgpack)
+
+    def provide(self, model, handler, **kwargs):
+        """Return the model encoded by the environment's
+        :class:`supercell.codec.MsgpackCodec`.
+
+        Keyword arguments:
+        :param partial: if **True** the model will be validate as a partial.
+        :type partial: bool
+        :param validate: the validation policy, see
+                         :func:`ProviderBase.validate_model`
+        :type validate: str
+        :param offload_items: models of at least this size are serialized
+                              in the executor, see
+                              :func:`ProviderBase.offload_model`
+        :type offload_items: int
+
+        The `streaming` mode of the :class:`JsonProvider` is not supported,
+        the whole document is written at once.
+
+        .. seealso:: :py:mod:`supercell.api.provider.ProviderBase.provide`
+        """
+        codec = handler.environment.msgpack_codec
+        handler.set_header('Content-Type', MediaType.ApplicationMsgpack)
+        offloaded = self.offload_model(model, handler, codec.encode, **kwargs)
+        if offloaded is not None:
+            return offloaded
+        self.validate_model(model, handler, **kwargs)
+        handler.write(codec.encode(to_primitive(model)))
+
+    def error(self, status_code, message, handler):
+        """Return errors encoded as MessagePack.
+
+        .. seealso:: :py:mod:`supercell.api.provider.ProviderBase.error`
+        """
+        try:
+            message = handler.environment.json_codec.decode(message)
+        except ValueError:
+            pass
+
+        res = {"message": message,
+               "error": True}
+        handler.set_header('Content-Type', MediaType.ApplicationMsgpack)
+        handler.finish(handler.environment.msgpack_codec.encode(res))
+
+
+class NdjsonProvider(ProviderBase):
+    """Default `application/x-ndjson` provider.
+
+    Every model is written as a single line of JSON, which allows clients to
+    process the models of a stream while it is received.
+    """
+
+    CONTENT_TYPE = ContentType(MediaType.ApplicationNdjson)
+
+    RECORD_PREFIX = b''
+    """Written before every model."""
+
+    def provide(self, model, handler, **kwargs):
+        """Write the model as a single line.
+
+        .. seealso:: :py:mod:`supercell.api.provider.ProviderBase.provide`
+        """
+        self.validate_model(model, handler, **kwargs)
+        handler.set_header('Content-Type', self.CONTENT_TYPE.content_type)
+        handler.write(self._encode(handler, to_primitive(model)))
+
+    def provide_stream(self, models, handler, **kwargs):
+        """Write every model as a single line.
+
+        .. seealso::
+            :py:mod:`supercell.api.provider.ProviderBase.provide_stream`
+        """
+        handler.set_header('Content-Type', self.CONTENT_TYPE.content_type)
+        return self._write_stream(
+            models, handler, lambda value: self._encode(handler, value),
+            **kwargs)
+
+    def _encode(self, handler, value):
+        return self.RECORD_PREFIX + \
+            handler.environment.json_codec.encode(value) + b'\n'
+
+    def error(self, status_code, message, handler):
+        """Return errors as a single line.
+
+        .. seealso:: :py:mod:`supercell.api.provider.ProviderBase.error`
+        """
+        try:
+            message = handler.environment.json_codec.decode(message)
+        except ValueError:
+            pass
+
+        res = {"message": message,
+               "error": True}
+        handler.set_header('Content-Type', self.CONTENT_TYPE.content_type)
+        handler.finish(self._encode(handler, res))
+
+
+class JsonSeqProvider(NdjsonProvider):
+    """Default `application/json-seq` provider (:rfc:`7464`).
+
+    Like the :class:`NdjsonProvider`, but every model is prefixed with the
+    record separator character.
+    """
+
+    CONTENT_TYPE = ContentType(MediaType.ApplicationJsonSeq)
+
+    RECORD_PREFIX = b'\x1e'
 
 
 class TornadoTemplateProvider(ProviderBase):
@@ -206,14 +658,15 @@ class TornadoTemplateProvider(ProviderBase):
     def provide(self, model, handler, **kwargs):
         """Render a template with the given model into HTML.
 
-        By default we will use the tornado built in template language."""
-        try:
-            model.validate()
-            handler.render(handler.get_template(model), **model.to_primitive())
-        except ModelValidationError as e:
-            raise HTTPError(500, reason=json.dumps({
-                "result_model": escape_contents(error_messages(e))
-            }))
+        By default we will use the tornado built in template language.
+
+        The model is validated according to the `validate` policy, see
+        :func:`ProviderBase.validate_model`."""
+        self.validate_model(
+            model, handler,
+            validate=kwargs.get("validate", VALIDATE_ALWAYS),
+            validate_every=kwargs.get("validate_every", 100))
+        handler.render(handler.get_template(model), **to_primitive(model))
 
     def error(self, status_code, message, handler):
         """Simply return errors in  html
@@ -0,0 +1,143 @@
+#
+# Copyright (c) 2013 Daniel Truemper <truemped at googlemail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+#
+
+"""Broadcast of purged cache tags to all worker processes on a host.
+
+Every worker binds a Unix domain datagram socket named after its pid in a
+common directory. Purged tags are sent to the sockets of all other workers,
+which then remove the tagged responses from their in-process caches. Caches
+shared by all processes, e.g. the
+:class:`supercell.sharedcache.SharedResponseCache`, are only purged by the
+publishing process::
+
+    class MyService(Service):
+
+        def run(self):
+            self.environment.set_purge_channel(
+                PurgeChannel('/run/myservice/purge'))
+
+Sockets of workers that are no longer running are removed when sending to
+them fails. Tags are delivered at most once, i.e. if the receive buffer of a
+worker is full, the purge is lost for this worker.
+"""
+
+import logging
+import os
+import socket
+
+from tornado.ioloop import IOLoop
+
+from supercell.msgpack import packb, unpackb
+
+
+__all__ = ['PurgeChannel']
+
+
+_MAX_MESSAGE_SIZE = 64 * 1024
+
+
+class PurgeChannel:
+    """Send and receive purged cache tags via Unix domain sockets.
+
+    :param directory: The directory containing the sockets of all workers
+    :type directory: str
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.path = None
+        self._socket = None
+        self._callback = None
+        self.logger = logging.getLogger('supercell.purge')
+
+    def start(self, callback):
+        """Bind the socket of the current process and call `callback` with
+        the list of tags for every purge of other processes.
+
+        :param callback: The function removing the tags from the local caches
+        :type callback: callable
+        """
+        assert self._socket is None, 'PurgeChannel already started'
+        os.makedirs(self.directory, exist_ok=True)
+        self.path = os.path.join(self.directory, '%d.sock' % os.getpid())
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+        self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self._socket.setblocking(False)
+        self._socket.bind(self.path)
+        self._callback = callback
+        IOLoop.current().add_handler(self._socket.fileno(), self._receive,
+                                     IOLoop.READ)
+
+    def stop(self):
+        """Close and remove the socket of the current process."""
+        if self._socket is None:
+            return
+        IOLoop.current().remove_handler(self._socket.fileno())
+        self._socket.close()
+        self._socket = None
+        try:
+            os.unlink(self.path)
+        except FileNotFoundError:
+            pass
+
+    def publish(self, tags):
+        """Send the `tags` to all other processes."""
+        data = packb(list(tags))
+        assert len(data) <= _MAX_MESSAGE_SIZE, 'Too many tags'
+        sender = self._socket
+        if sender is None:
+            sender = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+            sender.setblocking(False)
+        try:
+            for name in os.listdir(self.directory):
+                path = os.path.join(self.directory, name)
+                if not name.endswith('.sock') or path == self.path:
+                    continue
+                try:
+                    sender.sendto(data, path)
+                except (ConnectionRefusedError, FileNotFoundError):
+                    self._remove_socket(path)
+                except BlockingIOError:
+                    self.logger.warning('Dropped purge for %s', path)
+        finally:
+            if sender is not self._socket:
+                sender.close()
+
+    def _remove_socket(self, path):
+        """Remove the socket of a process that is no longer running."""
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            pass
+
+    def _receive(self, fd, events):
+        while self._socket is not None:
+            try:
+                data = self._socket.recv(_MAX_MESSAGE_SIZE)
+            except BlockingIOError:
+                return
+            try:
+                tags = unpackb(data)
+            except ValueError:
+                self.logger.warning('Ignoring malformed purge message')
+                continue
+            if not isinstance(tags, list) or \
+                    not all(isinstance(tag, str) for tag in tags):
+                self.logger.warning('Ignoring malformed purge message')
+                continue
+            self._callback(tags)
@@ -15,7 +15,12 @@
 #
 #
 
-from datetime import datetime
+from collections import namedtuple
+from collections.abc import AsyncIterable
+from contextlib import contextmanager
+import copy
+from datetime import datetime, timedelta
+import hashlib
 import json
 import logging
 import time
@@ -25,14 +30,20 @@ from schematics.models import Model
 from schematics.types.compound import ListType
 from schematics.exceptions import BaseError
 from tornado import gen, iostream
-from tornado.concurrent import is_future
+from tornado.concurrent import Future, is_future
 from tornado.escape import to_unicode
+from tornado.httputil import HTTPConnection
+from tornado.ioloop import IOLoop
 from tornado.util import bytes_type, unicode_type
-from tornado.web import (RequestHandler as rq, HTTPError,
+from tornado.web import (RequestHandler as rq, Finish, HTTPError,
                          _has_stream_request_body)
 
+from supercell import validation
 from supercell._compat import error_messages
-from supercell.cache import compute_cache_header
+from supercell.cache import RETRY_ERRORS, compute_cache_header
+from supercell.compression import compress, negotiate_encoding
+from supercell.responsecache import (CachedResponse, cache_key,
+                                     is_private, response_headers)
 from supercell.mediatypes import Error, MediaType, ReturnInformationT
 from supercell.consumer import ConsumerBase, NoConsumerFound
 from supercell.provider import ProviderBase, NoProviderFound
@@ -44,6 +55,80 @@ __all__ = ['RequestHandler']
 
 _DEFAULT_CONTENT_TYPE = '*/*'
 
+# futures of the coalesced requests that are currently executed, by cache key
+_IN_FLIGHT = {}
+
+# cache keys of the stale responses that are currently refreshed
+_REFRESHING = set()
+
+
+class _DiscardingConnection(HTTPConnection):
+    """Connection of requests executed in the background, e.g. for refreshing
+    a stale response, that discards the response."""
+
+    def _done(self):
+        future = Future()
+        future.set_result(None)
+        return future
+
+    def write_headers(self, start_line, headers, chunk=None):
+        return self._done()
+
+    def write(self, chunk):
+        return self._done()
+
+    def finish(self):
+        pass
+
+    def set_close_callback(self, callback):
+        pass
+
+
+class _OffloadedHandler:
+    """Stand-in for the request handler that is passed to consumers running
+    in the executor.
+
+    It only provides the `request` with its `body` and `headers` and the
+    `environment` with its codecs, so that it can be passed to a process
+    pool."""
+
+    def __init__(self, handler):
+        self.request = _OffloadedRequest(handler.request.body,
+                                         dict(handler.request.headers))
+        self.environment = _OffloadedEnvironment(
+            handler.environment.json_codec, handler.environment.msgpack_codec)
+
+
+_OffloadedRequest = namedtuple('_OffloadedRequest', ['body', 'headers'])
+
+_OffloadedEnvironment = namedtuple('_OffloadedEnvironment', ['json_codec',
+                                                             'msgpack_codec'])
+
+
+def _consume(consumer_class, handler, model_type, validate):
+    """Consume and validate the request body in the executor."""
+    model = consumer_class().consume(handler, model_type)
+    if validate:
+        validation.validate(model)
+    return model
+
+
+@contextmanager
+def _consumer_errors():
+    """Turn errors while consuming the request body into `400` responses."""
+    try:
+        yield
+    except NoConsumerFound:
+        # TODO return available consumer types?!
+        raise HTTPError(400, reason='Content-Type not supported.')
+    except HTTPError:
+        raise
+    except BaseError as e:
+        raise HTTPError(400, reason=json.dumps(
+            escape_contents(error_messages(e))))
+    except Exception as e:
+        raise HTTPError(400, reason=str(escape_contents(e)))
+
 
 def _decode_utf8_and_latin1(value):
     """Convert an string argument to a unicode string.
@@ -68,6 +153,14 @@ class RequestHandler(rq):
     the consuming and providing of request inputs and results.
     """
 
+    def __init__(self, application, request, **kwargs):
+        super().__init__(application, request, **kwargs)
+        self._init_kwargs = kwargs
+        # set for executions refreshing a stale cached response
+        self._refreshing = False
+        # async iterator of a consumer that streams models
+        self._models = None
+
     @property
     def environment(self):
         """Convenience method for accessing the environment."""
@@ -128,31 +221,152 @@ class RequestHandler(rq):
         """
         raise NotImplementedError
 
+    def get_template_namespace(self):
+        """Add the `cached_fragment` function to the namespace of the
+        templates, see :mod:`supercell.templates`."""
+        namespace = super().get_template_namespace()
+        namespace['cached_fragment'] = self.cached_fragment
+        return namespace
+
+    def cached_fragment(self, key, ttl, template_name, **kwargs):
+        """Return the rendered template `template_name` from the fragment
+        cache or render it with the `kwargs` and cache it for `ttl` seconds.
+
+        :param key: The key of the fragment
+        :type key: str
+
+        :param ttl: The time to live in seconds
+        :type ttl: float
+
+        :param template_name: The template of the fragment
+        :type template_name: str
+        """
+        cache = self.environment.fragment_cache
+        fragment = cache.get(key)
+        if fragment is None:
+            fragment = self.render_string(template_name, **kwargs)
+            cache.put(key, fragment, ttl)
+        return fragment
+
     def _check_consumer(self):
         """For a PATCH, POST, or PUT request check if we can find a matching
-        consumer for the incoming data."""
+        consumer for the incoming data.
+
+        If the handler streams the request body, the consumer is only
+        started here and fed in :func:`data_received`. Bodies of at least
+        the `offload_size` of the :func:`supercell.decorators.consumes`
+        decorator are consumed and validated in the environment's executor
+        and a `Future` is returned, all other bodies are consumed
+        synchronously."""
         verb = self.request.method.lower()
         headers = self.request.headers
         kwargs = self.path_kwargs
 
         if verb in ['patch', 'post', 'put'] and 'Content-Type' in headers:
             # try to find a matching consumer
-            try:
+            with _consumer_errors():
                 ((model_type, validate), consumer_class) = \
                     ConsumerBase.map_consumer(headers['Content-Type'], self)
                 consumer = consumer_class()
+                if _has_stream_request_body(self.__class__):
+                    self._start_stream(consumer, model_type, validate)
+                    return
+                offload_size = getattr(self, '_CONS_OFFLOAD', {}).get(
+                    consumer_class.CONTENT_TYPE)
+                if offload_size is not None and \
+                        not consumer.STREAMS_MODELS and \
+                        len(self.request.body) >= offload_size:
+                    return self._consume_offloaded(consumer_class,
+                                                   model_type, validate)
                 model = consumer.consume(self, model_type)
-                if validate:
-                    model.validate()
+                if consumer.STREAMS_MODELS:
+                    model = consumer.models(self, validate)
+                elif validate:
+                    validation.validate(model)
                 kwargs['model'] = model
-            except NoConsumerFound:
-                # TODO return available consumer types?!
-                raise HTTPError(400, reason='Content-Type not supported.')
-            except BaseError as e:
-                raise HTTPError(400, reason=json.dumps(
-                    escape_contents(error_messages(e))))
-            except Exception as e:
-                raise HTTPError(400, reason=str(escape_contents(e)))
+
+    @gen.coroutine
+    def _consume_offloaded(self, consumer_class, model_type, validate):
+        """Consume and validate the request body in the executor."""
+        with _consumer_errors():
+            self.path_kwargs['model'] = yield self.environment.executor.submit(
+                _consume, consumer_class, _OffloadedHandler(self), model_type,
+                validate)
+
+    def _start_stream(self, consumer, model_type, validate):
+        """Start consuming a streamed request body."""
+        max_size = getattr(self, '_STREAM_MAX_SIZE', None)
+        if max_size is not None:
+            if int(self.request.headers.get('Content-Length', 0)) > max_size:
+                raise HTTPError(413)
+            self.request.connection.set_max_body_size(max_size)
+        consumer.start(self, model_type)
+        self._stream = (consumer, model_type, validate)
+        self._stream_size = 0
+        self._stream_error = None
+        if consumer.STREAMS_MODELS:
+            self._models = consumer.models(self, validate)
+            self.path_kwargs['model'] = self._models
+
+    def data_received(self, chunk):
+        """Pass a chunk of a streamed request body to the consumer.
+
+        Errors are raised once the body has been received completely, or by
+        the iterator of a consumer that streams models, and the remaining
+        chunks are discarded. The `Future` returned by the consumer pauses
+        reading from the connection until the handler caught up."""
+        if getattr(self, '_stream', None) is None or \
+                self._stream_error is not None or self._finished:
+            return None
+        self._stream_size += len(chunk)
+        max_size = getattr(self, '_STREAM_MAX_SIZE', None)
+        try:
+            if max_size is not None and self._stream_size > max_size:
+                raise HTTPError(413)
+            return self._stream[0].feed(self, chunk)
+        except Exception as e:
+            self._stream_error = e
+            if self._models is not None:
+                self._models.close(e)
+        return None
+
+    def _finish_stream(self):
+        """Add the model of a completely received streamed request body to
+        the keyword arguments of the handler method."""
+        if getattr(self, '_stream', None) is None:
+            return
+        (consumer, model_type, validate) = self._stream
+        self._stream = None
+        with _consumer_errors():
+            if self._stream_error is not None:
+                raise self._stream_error
+            model = consumer.finish(self, model_type)
+            if validate:
+                validation.validate(model)
+            self.path_kwargs['model'] = model
+
+    def on_finish(self):
+        """End the iterator of a consumer that streams models, so that the
+        rest of the body is not buffered for a finished handler."""
+        if self._models is not None:
+            self._models.close()
+
+    def on_connection_close(self):
+        if self._models is not None:
+            self._models.close(iostream.StreamClosedError())
+        super().on_connection_close()
+
+    def _end_model_stream(self, body_future):
+        """End the iterator of a consumer that streams models once the body
+        has been received or the connection was closed."""
+        if self._stream is None:
+            return
+        (consumer, model_type, _) = self._stream
+        self._stream = None
+        if body_future.exception() is not None:
+            self._models.close(body_future.exception())
+        elif self._stream_error is None:
+            consumer.finish(self, model_type)
 
     def _add_cache_headers(self):
         """Maybe add cache headers on GET and HEAD requests."""
@@ -168,18 +382,319 @@ class RequestHandler(rq):
             if expires:
                 self.set_header('Expires', datetime.now() + expires)
 
+    def etag_key(self, *args, **kwargs):
+        """Return a version key of the requested resource or `None`.
+
+        Only called for GET and HEAD requests if the handler was added with
+        `CacheConfig(..., etag=True)`. The key is used to compute a weak
+        `ETag` for each representation of the resource. If it matches the
+        request's `If-None-Match` header, `304 Not Modified` is returned
+        without calling the handler method. The key must change whenever the
+        resource changes and may be returned as a `Future`.
+
+        :param args: The path arguments of the request
+        :param kwargs: The path keyword arguments of the request
+        """
+        return None
+
+    def set_size_hint(self, size):
+        """Set the size of the response model, e.g. the number of rows
+        returned by a query, if it is not reflected by the number of items of
+        its list and dict fields.
+
+        Models of at least the `offload_items` of the
+        :func:`supercell.decorators.provides` decorator are serialized in the
+        environment's executor.
+
+        :param size: The estimated number of items of the model
+        :type size: int
+        """
+        self._size_hint = size
+
+    def add_cache_tags(self, *tags):
+        """Tag the response of the current request.
+
+        If the handler was added with `CacheConfig(..., server_side=True)`,
+        all cached responses with a tag can be removed with
+        :func:`purge_cache_tags`.
+
+        :param tags: The tags of the response
+        :type tags: str
+        """
+        if not hasattr(self, '_cache_tags'):
+            self._cache_tags = set()
+        self._cache_tags.update(tags)
+
+    def purge_cache_tags(self, *tags):
+        """Remove all cached responses with one of the `tags` from the server
+        side response caches of all worker processes.
+
+        :param tags: The tags to purge
+        :type tags: str
+        """
+        self.environment.purge_cache_tags(*tags)
+
+    @gen.coroutine
+    def _check_etag_key(self):
+        """Set the `ETag` header from :func:`etag_key` and return *True* if
+        the client already has the current version."""
+        cache_config = self.environment.get_cache_info(self.__class__)
+        if not (cache_config and cache_config.etag) or \
+                self.request.method not in ('GET', 'HEAD'):
+            return False
+
+        key = self.etag_key(*self.path_args, **self.path_kwargs)
+        if is_future(key):
+            key = yield key
+        if key is None:
+            return False
+
+        try:
+            provider_class, _ = ProviderBase.map_provider(
+                self.request.headers.get('Accept', ''), self,
+                allow_default=True)
+        except NoProviderFound:
+            return False
+
+        self._add_vary('Accept')
+        digest = hashlib.sha1(('%s:%s' % (provider_class.__name__, key))
+                              .encode('utf8')).hexdigest()
+        self.set_header('Etag', 'W/"%s"' % digest)
+        return self.check_etag_header()
+
+    def _add_vary(self, header):
+        """Add `header` to the `Vary` header of the response."""
+        vary = self._headers.get('Vary')
+        if not vary:
+            self.set_header('Vary', header)
+        elif header.lower() not in (v.strip().lower()
+                                    for v in vary.split(',')):
+            self.set_header('Vary', '%s, %s' % (vary, header))
+
+    @gen.coroutine
+    def _compress_response(self):
+        """Compress the response body according to the
+        :class:`supercell.compression.CompressionConfig` of the handler.
+
+        Bodies of at least `offload_size` bytes are compressed in the
+        environment's executor."""
+        config = self.environment.get_compression_info(self.__class__)
+        if config is None or self._finished or self._headers_written:
+            return
+
+        self._add_vary('Accept-Encoding')
+        if self._status_code in (204, 304) or \
+                'Content-Encoding' in self._headers:
+            return
+        size = sum(len(part) for part in self._write_buffer)
+        if size < config.min_size:
+            return
+        encoding = negotiate_encoding(
+            self.request.headers.get('Accept-Encoding', ''), config.encodings)
+        if encoding is None:
+            return
+
+        data = b''.join(self._write_buffer)
+        if size >= config.offload_size:
+            data = yield self.environment.executor.submit(
+                compress, data, encoding, config.level)
+        else:
+            data = compress(data, encoding, config.level)
+        self._write_buffer = [data]
+        self.set_header('Content-Encoding', encoding)
+
+    def _response_cache_key(self):
+        """Return the key of the server side response cache for the current
+        request or `None` if the response is neither cached nor coalesced.
+
+        Requests with credentials that are not part of the key, see
+        :func:`supercell.responsecache.is_private`, are never cached or
+        coalesced."""
+        cache_config = self.environment.get_cache_info(self.__class__)
+        if not (cache_config and
+                (cache_config.server_side or cache_config.coalesce)) or \
+                self.request.method != 'GET' or \
+                is_private(self.request, cache_config.key_headers):
+            return None
+
+        try:
+            provider_class, _ = ProviderBase.map_provider(
+                self.request.headers.get('Accept', ''), self,
+                allow_default=True)
+        except NoProviderFound:
+            return None
+
+        encoding = None
+        compression = self.environment.get_compression_info(self.__class__)
+        if compression:
+            encoding = negotiate_encoding(
+                self.request.headers.get('Accept-Encoding', ''),
+                compression.encodings)
+        return cache_key(self, provider_class.__name__, encoding,
+                         cache_config.key_headers)
+
+    def _write_cached_response(self, response):
+        """Write the :class:`supercell.responsecache.CachedResponse` and
+        finish the request."""
+        self.set_status(response.status)
+        written = set()
+        for (name, value) in response.headers:
+            if name in written:
+                self.add_header(name, value)
+            else:
+                self.set_header(name, value)
+                written.add(name)
+        self.finish(response.body)
+
+    def _response_cache(self, cache_config):
+        """Return the server side response cache of the handler."""
+        if cache_config.response_cache:
+            return getattr(self.environment, cache_config.response_cache)
+        return self.environment.response_cache
+
+    def _cached_response(self, cache_config):
+        """Return the response from the server side response cache or `None`
+        if the handler has to be called.
+
+        A stale response is returned during `stale_while_revalidate` and
+        refreshed in the background. During `stale_if_error` it is kept for
+        :func:`_write_stale_response`."""
+        stale = max(cache_config.stale_while_revalidate or timedelta(0),
+                    cache_config.stale_if_error or timedelta(0))
+        response = self._response_cache(cache_config).get(
+            self._cache_key, stale=stale.total_seconds())
+        if response is None:
+            return None
+        age = time.time() - response.expires
+        if age < 0:
+            return response
+
+        if cache_config.stale_if_error and \
+                age < cache_config.stale_if_error.total_seconds():
+            self._stale_response = response
+        if cache_config.stale_while_revalidate and \
+                age < cache_config.stale_while_revalidate.total_seconds():
+            self._refresh_response()
+            return response
+        return None
+
+    def _refresh_response(self):
+        """Execute the current request again in the background in order to
+        refresh the stale cached response.
+
+        Only one refresh per cache key runs at a time."""
+        key = self._cache_key
+        if key in _REFRESHING:
+            return
+        _REFRESHING.add(key)
+
+        request = copy.copy(self.request)
+        request.connection = _DiscardingConnection()
+        request.headers = request.headers.copy()
+        request.headers.pop('If-None-Match', None)
+        request._start_time = time.time()
+        request._finish_time = None
+        handler = self.__class__(self.application, request,
+                                 **self._init_kwargs)
+        handler._refreshing = True
+        IOLoop.current().add_future(
+            handler._execute([], *self.path_args, **self.path_kwargs),
+            lambda future: _REFRESHING.discard(key))
+
+    def _write_stale_response(self, error):
+        """Write the stale response instead of the `error` raised by the
+        handler and return *True*, or *False* if there is none."""
+        response = getattr(self, '_stale_response', None)
+        if response is None or self._finished or self._headers_written or \
+                isinstance(error, Finish) or \
+                (isinstance(error, HTTPError) and error.status_code < 500):
+            return False
+        self.logger.warning('Returning a stale response due to %r', error)
+        self.clear()
+        self._add_cache_headers()
+        self._write_cached_response(response)
+        return True
+
+    @gen.coroutine
+    def _complete_response(self):
+        """Compress the response, store it in the server side response cache
+        and pass it to the coalesced requests before the request is
+        finished."""
+        yield self._compress_response()
+
+        key = getattr(self, '_cache_key', None)
+        if key is None or self._finished or self._headers_written:
+            return
+        cache_config = self.environment.get_cache_info(self.__class__)
+        response = CachedResponse(
+            self._status_code, response_headers(self._headers),
+            b''.join(self._write_buffer),
+            time.time() + cache_config.max_age.total_seconds())
+        if cache_config.server_side and self._status_code == 200:
+            self._response_cache(cache_config).put(
+                key, response, tags=getattr(self, '_cache_tags', ()))
+        self._land(response)
+
+    @gen.coroutine
+    def _coalesce(self):
+        """Wait for an identical request that is currently executed and
+        return its :class:`supercell.responsecache.CachedResponse`.
+
+        If there is none, the current request is registered as in flight and
+        `None` is returned, i.e. the handler has to be called."""
+        cache_config = self.environment.get_cache_info(self.__class__)
+        while True:
+            flight = _IN_FLIGHT.get(self._cache_key)
+            if flight is None:
+                self._flight = _IN_FLIGHT[self._cache_key] = Future()
+                return None
+            try:
+                response = yield flight
+            except Exception:
+                if cache_config.coalesce_errors != RETRY_ERRORS:
+                    raise
+                continue
+            if response is not None:
+                return response
+
+    def _land(self, response=None, error=None):
+        """Pass the `response` or the `error` of the request to the coalesced
+        requests waiting for it. Without both they call the handler
+        themselves."""
+        flight = getattr(self, '_flight', None)
+        if flight is None:
+            return
+        self._flight = None
+        del _IN_FLIGHT[self._cache_key]
+        if error is not None:
+            flight.set_exception(error)
+            # the error is handled by this request, do not log it again if
+            # no other request waited for it
+            flight.exception()
+        else:
+            flight.set_result(response)
+
     def set_default_headers(self):
         self.set_header("Server", "Supercell")
 
-    @gen.coroutine
     def prepare(self):
         """Check for a consumer and optionally add the cache headers.
 
+        The request body is consumed synchronously, unless it is consumed in
+        the executor, see the `offload_size` of
+        :func:`supercell.decorators.consumes`. The returned `Future` is
+        resolved once the `model` is available.
+
         note:: when overriding the `prepare()` method, don't forget to call
-               the super method.
+               the super method and to wait for its result, e.g. with
+               `yield super().prepare()` or `await super().prepare()`.
         """
-        self._check_consumer()
+        consumed = self._check_consumer()
         self._add_cache_headers()
+        if consumed is None:
+            consumed = Future()
+            consumed.set_result(None)
+        return consumed
 
     @gen.coroutine
     def _execute(self, transforms, *args, **kwargs):
@@ -204,12 +719,12 @@ class RequestHandler(rq):
                 self.check_xsrf_cookie()
 
             result = self.prepare()
-            if is_future(result):
+            if is_future(result) or inspect.isawaitable(result):
                 result = yield result
             if result is not None:
                 # TODO: provide all results in this case or only errors?
                 if type(result) is ReturnInformationT:
-                    self._provide_result(verb, headers, result)
+                    yield self._provide_result(verb, headers, result)
                 else:
                     raise TypeError("Expected None, got %r" % result)
             if self._prepared_future is not None:
@@ -224,9 +739,37 @@ class RequestHandler(rq):
                 # the body has been completely received.  The Future has no
                 # result; the data has been passed to self.data_received
                 # instead.
-                try:
-                    yield self.request.body
-                except iostream.StreamClosedError:
+                if self._models is not None:
+                    # the handler iterates over the models while the body
+                    # is received
+                    self.request._body_future.add_done_callback(
+                        self._end_model_stream)
+                else:
+                    try:
+                        yield self.request._body_future
+                    except iostream.StreamClosedError:
+                        return
+                    self._finish_stream()
+
+            not_modified = yield self._check_etag_key()
+            if not_modified:
+                self.set_status(304)
+                yield self._compress_response()
+                self.finish()
+                return
+
+            self._cache_key = self._response_cache_key()
+            if self._cache_key is not None:
+                cache_config = self.environment.get_cache_info(
+                    self.__class__)
+                cached = None
+                if cache_config.server_side and not self._refreshing:
+                    cached = self._cached_response(cache_config)
+                if cached is None and cache_config.coalesce and \
+                        not self._refreshing:
+                    cached = yield self._coalesce()
+                if cached is not None:
+                    self._write_cached_response(cached)
                     return
 
             method = getattr(self, self.request.method.lower())
@@ -234,11 +777,15 @@ class RequestHandler(rq):
             if is_future(result) or inspect.iscoroutinefunction(method):
                 result = yield result
             if result is not None:
-                self._provide_result(verb, headers, result)
+                yield self._provide_result(verb, headers, result)
             if self._auto_finish and not self._finished:
+                yield self._complete_response()
                 self.finish()
+            self._land()
         except Exception as e:
-            self._handle_request_exception(e)
+            self._land(error=e)
+            if not self._write_stale_response(e):
+                self._handle_request_exception(e)
             if (self._prepared_future is not None and
                     not self._prepared_future.done()):
                 # In case we failed before setting _prepared_future, do it
@@ -246,9 +793,15 @@ class RequestHandler(rq):
                 # in a finally block to avoid GC issues prior to Python 3.4.
                 self._prepared_future.set_result(None)
 
+    @gen.coroutine
     def _provide_result(self, verb, headers, result):
         """Find the correct provider for the result and call it with the final
-        result."""
+        result.
+
+        If the provider returns a `Future`, e.g. when streaming the result,
+        it is awaited before the request is finished. If it fails after the
+        headers have been sent, the connection is closed without finishing
+        the response."""
 
         if isinstance(result, ReturnInformationT):
             self.set_header('Content-Type', MediaType.ApplicationJson)
@@ -256,9 +809,9 @@ class RequestHandler(rq):
             if result.message and 'additional' in result.message:
                 self.logger.info(result.message['additional'])
             if result.code != 204:
-                self.write(json.dumps(result.message))
+                self.write(self.environment.json_codec.encode(result.message))
 
-        elif not isinstance(result, Model):
+        elif not isinstance(result, (Model, AsyncIterable)):
             # raise an error when something else than a model has been returned
             self.logger.error('Returning a non-model is not supported')
             raise HTTPError(500)
@@ -270,14 +823,34 @@ class RequestHandler(rq):
             except NoProviderFound:
                 raise HTTPError(406,
                                 reason="Can not produce acceptable response")
+            self._add_vary('Accept')
 
             provider = provider_class()
             if isinstance(result, Model):
-                provider.provide(result, self, **provider_config)
+                provided = provider.provide(result, self, **provider_config)
+            else:
+                # e.g. an async generator of models
+                provided = provider.provide_stream(result, self,
+                                                   **provider_config)
+            if is_future(provided):
+                try:
+                    yield provided
+                except Exception:
+                    self._abort_response()
+                    raise
 
         if not self._finished:
+            yield self._complete_response()
             self.finish()
 
+    def _abort_response(self):
+        """Close the connection if the headers have already been sent, so
+        that the client sees an incomplete response instead of a truncated
+        response that was finished successfully."""
+        stream = getattr(self.request.connection, 'stream', None)
+        if self._headers_written and stream is not None:
+            stream.close()
+
     def write_error(self, status_code, **kwargs):
         """
         If there is any provider decorator, try to find the corresponding
@@ -329,7 +902,7 @@ class RequestHandler(rq):
         })
         model = model_cls(raw_data)
         if validate:
-            model.validate()
+            validation.validate(model)
         return model
 
     def _handle_request_exception(self, e):
@@ -0,0 +1,285 @@
+#
+# Copyright (c) 2013 Daniel Truemper <truemped at googlemail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+#
+
+"""In-process cache for serialized responses.
+
+The server side cache is enabled per handler with the `server_side` flag of
+the :func:`supercell.cache.CacheConfig`::
+
+    class MyService(Service):
+
+        def run(self):
+            self.environment.add_handler(...,
+                                         cache=CacheConfig(
+                                            timedelta(minutes=10),
+                                            server_side=True,
+                                            key_headers=('Authorization',)))
+
+Successful GET responses are stored for `max_age` in the environment's
+:attr:`supercell.environment.Environment.response_cache`. The key consists of
+the handler, the normalized URL, the negotiated provider and content encoding
+and the values of the `key_headers`. On a hit neither the handler method nor
+the provider is called. The cache is bounded by the total number of bytes of
+the cached responses and evicts the least recently used responses first.
+
+Responses to requests with an `Authorization` or `Cookie` header usually
+depend on the user, so these requests are neither cached nor coalesced unless
+the header is one of the `key_headers`.
+
+Handlers can tag their responses with
+:func:`supercell.requesthandler.RequestHandler.add_cache_tags`. Handlers
+changing the resources then remove all responses with a tag from the caches
+with :func:`supercell.requesthandler.RequestHandler.purge_cache_tags`. With a
+:class:`supercell.purge.PurgeChannel` the tags are also purged from the caches
+of all other worker processes on the host::
+
+    @s.provides(s.MediaType.ApplicationJson)
+    class User(RequestHandler):
+
+        @s.coroutine
+        def get(self, user_id):
+            self.add_cache_tags('user:%s' % user_id)
+            ...
+
+        @s.coroutine
+        def put(self, user_id, model=None):
+            ...
+            self.purge_cache_tags('user:%s' % user_id)
+
+The statistics of the cache, e.g. its hit rate, are available with
+:func:`ResponseCache.metrics` and can be exported with a health check::
+
+    class CacheMetrics(RequestHandler):
+
+        @s.coroutine
+        def get(self):
+            raise s.HealthCheckOk(
+                additional=self.environment.response_cache.metrics())
+"""
+
+from collections import namedtuple, OrderedDict
+import time
+
+from tornado.httputil import parse_qs_bytes
+
+
+__all__ = ['CachedResponse', 'ResponseCache', 'cache_key', 'is_private']
+
+
+CachedResponse = namedtuple('CachedResponse', ['status', 'headers', 'body',
+                                               'expires'])
+"""A cached response. The `headers` are a tuple of `(name, value)` tuples and
+`expires` is the unix timestamp after which the response is outdated."""
+
+
+# headers that are computed for every request and are not cached
+_UNCACHED_HEADERS = frozenset(['Date', 'Server', 'Cache-Control', 'Expires',
+                               'Content-Length', 'Transfer-Encoding',
+                               'Set-Cookie'])
+
+
+# request headers identifying the user
+_PRIVATE_HEADERS = ('Authorization', 'Cookie')
+
+
+def is_private(request, key_headers):
+    """Return `True` if the `request` has an `Authorization` or `Cookie`
+    header that is not one of the `key_headers`, i.e. the response must not
+    be shared with other requests.
+
+    :param request: The request
+    :type request: tornado.httputil.HTTPServerRequest
+    :param key_headers: The names of request headers whose values are part of
+                        the key
+    """
+    names = set(name.lower() for name in key_headers)
+    return any(name in request.headers and name.lower() not in names
+               for name in _PRIVATE_HEADERS)
+
+
+def cache_key(handler, provider, encoding, key_headers):
+    """Compute the cache key for the current request of `handler`.
+
+    The URL is normalized by sorting the query arguments.
+
+    :param handler: The request handler
+    :param provider: The name of the negotiated provider
+    :param encoding: The negotiated content encoding or `None`
+    :param key_headers: The names of request headers whose values are part of
+                        the key
+    :rtype: str
+    """
+    request = handler.request
+    query = parse_qs_bytes(request.query, keep_blank_values=True)
+    args = '&'.join('%s=%s' % (name, value.decode('latin1'))
+                    for name in sorted(query) for value in query[name])
+    handler_class = type(handler)
+    parts = ['%s.%s' % (handler_class.__module__, handler_class.__qualname__),
+             request.host, request.path, args,
+             provider, encoding or '']
+    for name in key_headers:
+        parts.append(request.headers.get(name, ''))
+    return '\x00'.join(parts)
+
+
+def response_headers(headers):
+    """Return the headers of a response that should be cached.
+
+    :param headers: The response headers
+    :type headers: tornado.httputil.HTTPHeaders
+    """
+    return tuple((name, value) for (name, value) in headers.get_all()
+                 if name not in _UNCACHED_HEADERS)
+
+
+def _size(key, response):
+    return len(key) + len(response.body) + sum(
+        len(name) + len(value) for (name, value) in response.headers)
+
+
+class ResponseCache:
+    """LRU cache of :class:`CachedResponse` objects that is bounded by the
+    total size of the cached responses.
+
+    :param max_bytes: The maximum total size of all cached responses
+    :type max_bytes: int
+    """
+
+    shared = False
+    """The cache is local to the current process."""
+
+    def __init__(self, max_bytes=64 * 1024 * 1024):
+        assert max_bytes > 0, 'max_bytes must be positive'
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.stale_hits = 0
+        self.evictions = 0
+        self._data = OrderedDict()
+        self._tags = {}
+
+    def get(self, key, stale=0):
+        """Return the :class:`CachedResponse` for `key` or `None` if it is
+        not cached or outdated.
+
+        :param stale: Number of seconds after its expiration during which an
+                      outdated response is still returned, it is counted as a
+                      stale hit instead of a hit
+        :type stale: float
+        """
+        item = self._data.get(key)
+        if item is not None and item[0].expires + stale <= time.time():
+            self.invalidate(key)
+            item = None
+        if item is None:
+            self.misses += 1
+            return None
+        self._data.move_to_end(key)
+        if item[0].expires <= time.time():
+            self.stale_hits += 1
+        else:
+            self.hits += 1
+        return item[0]
+
+    def put(self, key, response, tags=()):
+        """Store the :class:`CachedResponse` for `key`.
+
+        Responses larger than `max_bytes` are not cached.
+
+        :param tags: Tags for removing the response with :func:`purge`
+        :type tags: tuple
+        """
+        self.invalidate(key)
+        size = _size(key, response)
+        if size > self.max_bytes:
+            return
+        tags = frozenset(tags)
+        self._data[key] = (response, size, tags)
+        self.size += size
+        for tag in tags:
+            self._tags.setdefault(tag, set()).add(key)
+        while self.size > self.max_bytes:
+            self.invalidate(next(iter(self._data)))
+            self.evictions += 1
+
+    def invalidate(self, key):
+        """Remove the response for `key` from the cache."""
+        item = self._data.pop(key, None)
+        if item is not None:
+            self.size -= item[1]
+            for tag in item[2]:
+                keys = self._tags[tag]
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
+
+    def purge(self, *tags):
+        """Remove all responses with one of the `tags` from the cache and
+        return their number."""
+        keys = set()
+        for tag in tags:
+            keys.update(self._tags.get(tag, ()))
+        for key in keys:
+            self.invalidate(key)
+        return len(keys)
+
+    def clear(self):
+        """Remove all responses and reset the statistics."""
+        self._data.clear()
+        self._tags.clear()
+        self.size = self.hits = self.misses = self.stale_hits = \
+            self.evictions = 0
+
+    def dump(self):
+        """Return the `(key, value, ttl)` tuples of all responses that are
+        not outdated, see :mod:`supercell.snapshot`."""
+        now = time.time()
+        return [(key, [response.status,
+                       [list(header) for header in response.headers],
+                       response.body, sorted(tags)],
+                 response.expires - now)
+                for (key, (response, _, tags)) in self._data.items()
+                if response.expires > now]
+
+    def load(self, key, value, ttl):
+        """Restore a response returned by :func:`dump`."""
+        (status, headers, body, tags) = value
+        self.put(key, CachedResponse(
+            status, tuple(tuple(header) for header in headers), body,
+            time.time() + ttl), tags=tags)
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def __len__(self):
+        return len(self._data)
+
+    @property
+    def hit_rate(self):
+        """The ratio of hits to all lookups, stale hits are not counted as
+        hits."""
+        lookups = self.hits + self.stale_hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def metrics(self):
+        """Return the statistics of the cache as a `dict`."""
+        return {'hits': self.hits, 'stale_hits': self.stale_hits,
+                'misses': self.misses,
+                'hit_rate': self.hit_rate, 'evictions': self.evictions,
+                'entries': len(self._data), 'bytes': self.size,
+                'max_bytes': self.max_bytes}
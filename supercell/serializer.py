@@ -0,0 +1,234 @@
+#
+# Copyright (c) 2013 Daniel Truemper <truemped at googlemail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+#
+
+"""Compiled serializers for :class:`schematics.models.Model` classes.
+
+:func:`schematics.models.Model.to_primitive` walks the field metadata of a
+model on every call. :func:`to_primitive` instead generates a specialized
+function once per model class that produces the same result and stores it on
+the class::
+
+    from supercell.serializer import to_primitive
+
+    to_primitive(model) == model.to_primitive()
+
+Models with `serializable` fields, a `default` role, `export_order` or field
+types that are not supported are serialized with schematics. The same holds
+for all models with schematics versions older than 2.0.
+"""
+
+from schematics.models import Model
+from schematics import types as _types
+from schematics.types.base import BaseType
+from schematics.types.compound import (CompoundType, DictType, ListType,
+                                       ModelType)
+
+try:
+    from schematics.common import DROP, NONEMPTY, NOT_NONE, DEFAULT
+    from schematics.undefined import Undefined
+except ImportError:  # pragma: no cover
+    # schematics < 2.0
+    Undefined = None
+
+
+__all__ = ['compile_serializer', 'to_primitive']
+
+
+_SERIALIZER_ATTRIBUTE = '_supercell_serializer'
+
+
+# field types whose `to_primitive` does not depend on the export context
+_CONTEXT_FREE_TYPES = ('DateTimeType', 'UTCDateTimeType', 'TimestampType',
+                       'DateType', 'TimedeltaType', 'DecimalType',
+                       'UUIDType', 'IntType', 'LongType', 'FloatType',
+                       'NumberType', 'BooleanType', 'StringType', 'URLType',
+                       'EmailType', 'MD5Type', 'SHA1Type', 'IPAddressType',
+                       'IPv4Type', 'IPv6Type', 'MACAddressType', 'HashType',
+                       'GeoPointType', 'BaseType')
+
+_CONTEXT_FREE_FUNCTIONS = frozenset(
+    getattr(_types, name).to_primitive for name in _CONTEXT_FREE_TYPES
+    if hasattr(_types, name))
+
+
+class _Unsupported(Exception):
+    """Raised while compiling if a model cannot be compiled."""
+
+
+class _ExportContext:
+    """Minimal stand-in for the schematics export context used to determine
+    the export level of a field."""
+
+    export_level = None
+
+
+def _export_level(field):
+    return field.get_export_level(_ExportContext)
+
+
+def _model_converter(field):
+    """Convert the value of a `ModelType` field."""
+    fallback = field.to_primitive
+
+    def convert(value):
+        if isinstance(value, Model):
+            return to_primitive(value)
+        return fallback(value)
+
+    return convert
+
+
+def _items_converter(field, iterate, container):
+    """Convert the values of a `ListType` or `DictType` field in the same
+    way as schematics' `_export` methods."""
+    level = _export_level(field.field)
+    if level == DROP:
+        return lambda value: container()
+
+    convert_item = _converter(field.field) or (lambda v: v)
+    compound = field.field.is_compound
+
+    def convert(value):
+        data = []
+        for (key, item) in iterate(value):
+            item = convert_item(item)
+            if item is None:
+                if level <= NOT_NONE:
+                    continue
+            elif compound and len(item) == 0:
+                if level <= NONEMPTY:
+                    continue
+            data.append((key, item))
+        return container(data)
+
+    return convert
+
+
+def _list_items(value):
+    return ((None, item) for item in value)
+
+
+def _list(data=()):
+    return [item for (_, item) in data]
+
+
+def _converter(field):
+    """Return a function converting a field value into its primitive or
+    `None` if the value can be used as is."""
+    cls = type(field)
+    if cls.export is not BaseType.export and \
+            cls.export is not CompoundType.export:
+        raise _Unsupported(field)
+
+    if isinstance(field, ModelType) and cls._export is ModelType._export:
+        return _model_converter(field)
+    if isinstance(field, ListType) and cls._export is ListType._export:
+        return _items_converter(field, _list_items, _list)
+    if isinstance(field, DictType) and cls._export is DictType._export:
+        return _items_converter(field, lambda value: value.items(), dict)
+    if isinstance(field, CompoundType):
+        raise _Unsupported(field)
+
+    if cls.to_primitive is BaseType.to_primitive:
+        return None
+    if cls.to_primitive in _CONTEXT_FREE_FUNCTIONS:
+        return field.to_primitive
+    raise _Unsupported(field)
+
+
+def _compile(model_class):
+    """Generate the source code of the serializer for `model_class`."""
+    options = model_class._options
+    if 'default' in options.roles or options.export_order:
+        raise _Unsupported(model_class)
+
+    namespace = {'Undefined': Undefined}
+    lines = ['def serialize(model):',
+             '    get = model._data.get',
+             '    data = {}']
+    for (i, (name, field)) in enumerate(model_class._fields.items()):
+        if not isinstance(field, BaseType):
+            # e.g. serializable fields
+            raise _Unsupported(field)
+        level = _export_level(field)
+        if level == DROP:
+            continue
+
+        key = repr(field.serialized_name or name)
+        lines.append('    value = get(%r, Undefined)' % name)
+        lines.append('    if value is Undefined:')
+        if level <= DEFAULT:
+            lines.append('        pass')
+        else:
+            lines.append('        data[%s] = None' % key)
+        lines.append('    else:')
+
+        converter = _converter(field)
+        if converter is not None:
+            namespace['convert_%d' % i] = converter
+            lines.append('        if value is not None:')
+            lines.append('            value = convert_%d(value)' % i)
+
+        lines.append('        if value is None:')
+        if level <= NOT_NONE:
+            lines.append('            pass')
+        else:
+            lines.append('            data[%s] = None' % key)
+        if field.is_compound and level <= NONEMPTY:
+            lines.append('        elif len(value) == 0:')
+            lines.append('            pass')
+        lines.append('        else:')
+        lines.append('            data[%s] = value' % key)
+    lines.append('    return data')
+
+    source = '\n'.join(lines)
+    exec(compile(source, '<serializer %s>' % model_class.__name__, 'exec'),
+         namespace)
+    serializer = namespace['serialize']
+    serializer.source = source
+    return serializer
+
+
+def compile_serializer(model_class):
+    """Return the compiled serializer for `model_class`.
+
+    The serializer is generated on the first call and cached on the class.
+    If the model class is not supported, `None` is returned.
+    """
+    try:
+        return model_class.__dict__[_SERIALIZER_ATTRIBUTE]
+    except KeyError:
+        pass
+
+    serializer = None
+    if Undefined is not None:
+        try:
+            serializer = _compile(model_class)
+        except _Unsupported:
+            pass
+    setattr(model_class, _SERIALIZER_ATTRIBUTE, serializer)
+    return serializer
+
+
+def to_primitive(model):
+    """Convert `model` into primitive types, exactly like
+    `model.to_primitive()` but with the compiled serializer of its class if
+    possible."""
+    serializer = compile_serializer(type(model))
+    if serializer is None:
+        return model.to_primitive()
+    return serializer(model)
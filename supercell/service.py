@@ -30,12 +30,15 @@ import sys
 import time
 
 import tornado.options
+from tornado import gen
 from tornado.httpserver import HTTPServer
 from tornado.ioloop import IOLoop
 from tornado.options import define
 
 from supercell.environment import Environment
 from supercell.logging import HostnameFormatter, SupercellLoggingHandler
+from supercell.snapshot import read_snapshot, write_snapshot
+from supercell.warmup import warmup_request
 
 
 define('logfile', default='root-%(pid)s.log',
@@ -66,6 +69,23 @@ define('max_grace_seconds', default=3,
        'shutdown')
 
 
+define('cache_snapshot', default=None,
+       help='Persist the caches of the environment in this file during ' +
+       'shutdown and restore them on startup')
+
+
+define('warmup_host', default=None,
+       help='Host header of the warmup requests, it has to match the host ' +
+       'of the requests that should hit the warmed caches. Defaults to ' +
+       'address:port')
+
+
+define('warmup_timeout', default=60,
+       help='Stop waiting for warmup requests that take longer than this ' +
+       'amount of seconds and continue the warmup; their handlers are not ' +
+       'cancelled and keep running in the background')
+
+
 define('debug', default=False, help='If set, Tornado is started in debug mode')
 
 
@@ -98,6 +118,10 @@ class Service:
         (http://circus.readthedocs.org/). There you would bind the socket from
         circus and start the worker processes by binding to the file
         descriptor.
+
+        Once the socket is bound, :func:`Service.warmup()` is started. Until
+        it has finished, the readiness check */_system/ready* returns
+        **503**.
         """
         app = self.get_app()
 
@@ -117,6 +141,8 @@ class Service:
             signal.signal(signal.SIGTERM, sig_handler)
             signal.signal(signal.SIGINT, sig_handler)
 
+        IOLoop.current().spawn_callback(self.warmup, app)
+
         self.slog.info('Starting supercell')
         IOLoop.current().start()
 
@@ -126,7 +152,7 @@ class Service:
         In this method we stop the `tornado.httpserver` in order to stop
         accepting new connections. During a period of `max_grace_seconds`
         current requests are allowed to finish. After this period the `IOLoop`
-        is stopped.
+        is stopped and the socket of the purge channel is removed.
         """
         io_loop = IOLoop.current()
         self.slog.info('Stopping HTTP server')
@@ -139,7 +165,10 @@ class Service:
             if now < dl and self._has_callbacks(io_loop):
                 io_loop.add_timeout(now + 1, stop_loop)
             else:
+                if self.environment.purge_channel is not None:
+                    self.environment.purge_channel.stop()
                 io_loop.stop()
+                self.write_cache_snapshot()
                 self.slog.info('Shutdown')
         stop_loop()
 
@@ -181,6 +210,9 @@ class Service:
         # add handlers, health checks, managed objects to the environment
         self.run()
 
+        # restore the persistent caches from the last shutdown
+        self.read_cache_snapshot()
+
         # do not allow any changes on the environment anymore.
         self.environment._finalize()
 
@@ -188,6 +220,26 @@ class Service:
 
         return self.environment.get_application(self.config)
 
+    def read_cache_snapshot(self):
+        """Restore the persistent caches of the environment from the
+        `cache_snapshot` file."""
+        path = self.config.cache_snapshot
+        if not path or not self.environment.persistent_caches:
+            return
+        restored = read_snapshot(path, self.environment.persistent_caches)
+        self.slog.info('Restored %d cache entries from %s', restored, path)
+
+    def write_cache_snapshot(self):
+        """Write the persistent caches of the environment to the
+        `cache_snapshot` file."""
+        path = self.config.cache_snapshot
+        if not path or not self.environment.persistent_caches:
+            return
+        try:
+            write_snapshot(path, self.environment.persistent_caches)
+        except Exception:
+            self.slog.exception('Writing the cache snapshot %s failed', path)
+
     @property
     def slog(self):
         """Initialize the logging and return the logger."""
@@ -304,6 +356,42 @@ class Service:
         to the environment, before the app is started."""
         pass
 
+    @gen.coroutine
+    def warmup(self, app):
+        """Warm up the caches and mark the environment as ready.
+
+        By default the warmup callbacks and requests of the environment are
+        run, see :mod:`supercell.warmup`. Override this method in order to
+        add more steps.
+
+        :param app: The application
+        :type app: tornado.web.Application
+        """
+        for callback in self.environment.warmup_callbacks:
+            try:
+                result = callback()
+                if result is not None:
+                    yield result
+            except Exception:
+                self.slog.exception('Warmup callback %r failed', callback)
+
+        host = self.config.warmup_host or '%s:%s' % (self.config.address,
+                                                     self.config.port)
+        for (uri, headers) in self.environment.warmup_requests:
+            headers = dict(headers or {})
+            headers.setdefault('Host', host)
+            try:
+                code = yield warmup_request(
+                    app, uri, headers, timeout=self.config.warmup_timeout)
+            except gen.TimeoutError:
+                self.slog.warning('Warmup request %s timed out', uri)
+                continue
+            if code >= 400:
+                self.slog.warning('Warmup request %s returned %s', uri, code)
+
+        self.environment.set_ready()
+        self.slog.info('Warmup finished')
+
     def _has_callbacks(self, io_loop):
         """Check if the io_loop has pending callbacks.
 
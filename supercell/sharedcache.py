@@ -0,0 +1,362 @@
+#
+# Copyright (c) 2013 Daniel Truemper <truemped at googlemail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+#
+
+"""Response cache shared by all worker processes on a host.
+
+The :class:`SharedResponseCache` stores the serialized responses in a memory
+mapped file, so that all workers started from the same circus watcher (or
+forked by :func:`tornado.process.fork_processes`) share their cached
+responses. It is added as managed object and selected per handler with the
+`response_cache` of the :func:`supercell.cache.CacheConfig`::
+
+    class MyService(Service):
+
+        def run(self):
+            self.environment.add_managed_object(
+                'shared_cache', SharedResponseCache('/run/myservice.cache'))
+            self.environment.add_handler(...,
+                                         cache=CacheConfig(
+                                            timedelta(minutes=10),
+                                            server_side=True,
+                                            response_cache='shared_cache'))
+
+The file consists of a header and a fixed number of slots of `slot_size`
+bytes. The layout is appended to the path, e.g. *myservice.cache.1024x65536*,
+so that workers with a different number or size of slots, e.g. during a
+rolling deployment, use their own file instead of changing a file that is
+still mapped by other workers.
+
+The slot of a response is determined by a hash of its key, a new response
+replaces the one in its slot. Responses larger than a slot are not
+cached. Each slot is protected by a sequence counter: writers lock the slot
+with :func:`fcntl.lockf`, while readers do not lock at all and retry if the
+slot was changed during the read. Outdated responses are removed when they
+are read and replaced by new responses.
+"""
+
+import fcntl
+import hashlib
+import mmap
+import os
+from struct import Struct
+import time
+
+from supercell.msgpack import packb, unpackb
+from supercell.responsecache import CachedResponse
+
+
+__all__ = ['SharedResponseCache']
+
+
+_MAGIC = b'SCRC'
+_VERSION = 1
+
+# magic, version, number of slots, slot size
+_HEADER = Struct('<4sIII')
+_HEADER_SIZE = 64
+
+# sequence counter, key digest, expiration time, payload length
+_SLOT = Struct('<Q8sdI')
+_SLOT_HEADER_SIZE = 32
+_SEQ = Struct('<Q')
+_EMPTY = b'\0' * 8
+
+# number of attempts to read a slot that is changed concurrently
+_READ_ATTEMPTS = 8
+
+
+def _digest(key):
+    return hashlib.blake2b(key.encode('utf8'), digest_size=8).digest()
+
+
+def _begin(data, offset):
+    """Mark the slot at `offset` as changing and return its odd sequence
+    counter.
+
+    The counter may already be odd if a process died while changing the
+    slot, it is then kept so that readers keep rejecting the slot until it
+    has been rewritten."""
+    begin = _SEQ.unpack_from(data, offset)[0] | 1
+    _SEQ.pack_into(data, offset, begin)
+    return begin
+
+
+class SharedResponseCache:
+    """Cache of :class:`supercell.responsecache.CachedResponse` objects in a
+    memory mapped file with the same interface as the
+    :class:`supercell.responsecache.ResponseCache`.
+
+    The file is created if it does not exist. The statistics are kept per
+    process.
+
+    :param path: The path of the cache file, the suffix `.<slots>x<slot_size>`
+                 is appended to it
+    :type path: str
+
+    :param slots: The number of cached responses
+    :type slots: int
+
+    :param slot_size: The maximum size of a single response in bytes,
+                      including its key and headers
+    :type slot_size: int
+    """
+
+    shared = True
+    """The cache is shared by all processes, i.e. purges are not repeated by
+    the processes receiving them via the
+    :class:`supercell.purge.PurgeChannel`."""
+
+    def __init__(self, path, slots=1024, slot_size=64 * 1024):
+        assert slots > 0, 'slots must be positive'
+        assert slot_size > _SLOT_HEADER_SIZE, 'slot_size too small'
+        self.path = path
+        self.filename = '%s.%dx%d' % (path, slots, slot_size)
+        self.slots = slots
+        self.slot_size = slot_size
+        self.max_bytes = slots * slot_size
+        self.hits = 0
+        self.misses = 0
+        self.stale_hits = 0
+        self.evictions = 0
+
+        self._fd = os.open(self.filename, os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            self._init_file()
+            self._map = mmap.mmap(self._fd, _HEADER_SIZE + self.max_bytes)
+        except Exception:
+            os.close(self._fd)
+            raise
+
+    def _init_file(self):
+        """Initialize a new file or check the layout of an existing one.
+
+        Existing files are never truncated, as they may be mapped by other
+        processes.
+
+        :raises: :exc:`ValueError` if the file has a different layout
+        """
+        size = _HEADER_SIZE + self.max_bytes
+        header = _HEADER.pack(_MAGIC, _VERSION, self.slots, self.slot_size)
+        fcntl.lockf(self._fd, fcntl.LOCK_EX, _HEADER_SIZE, 0, os.SEEK_SET)
+        try:
+            current_size = os.fstat(self._fd).st_size
+            if current_size == 0:
+                os.ftruncate(self._fd, size)
+                os.pwrite(self._fd, header, 0)
+                return
+            current = os.pread(self._fd, _HEADER.size, 0)
+            if current_size == size and current == b'\0' * _HEADER.size:
+                # a process creating the file did not write the header
+                os.pwrite(self._fd, header, 0)
+                return
+            if current_size != size or current != header:
+                raise ValueError('%s is not a response cache with %d slots '
+                                 'of %d bytes' % (self.filename, self.slots,
+                                                  self.slot_size))
+        finally:
+            fcntl.lockf(self._fd, fcntl.LOCK_UN, _HEADER_SIZE, 0, os.SEEK_SET)
+
+    def _offset(self, digest):
+        index = int.from_bytes(digest, 'little') % self.slots
+        return _HEADER_SIZE + index * self.slot_size
+
+    def _read(self, offset):
+        """Return the digest, expiration time and payload of the slot at
+        `offset` or `None` if it is empty or permanently changing."""
+        data = self._map
+        for _ in range(_READ_ATTEMPTS):
+            (seq, digest, expires, length) = _SLOT.unpack_from(data, offset)
+            if seq % 2:
+                continue
+            start = offset + _SLOT_HEADER_SIZE
+            payload = data[start:start + length]
+            if _SEQ.unpack_from(data, offset)[0] == seq:
+                if not length:
+                    return None
+                return (digest, expires, payload)
+        return None
+
+    def _write(self, offset, digest, expires, payload):
+        """Replace the slot at `offset` while holding its lock."""
+        data = self._map
+        fcntl.lockf(self._fd, fcntl.LOCK_EX, self.slot_size, offset,
+                    os.SEEK_SET)
+        try:
+            begin = _begin(data, offset)
+            start = offset + _SLOT_HEADER_SIZE
+            data[start:start + len(payload)] = payload
+            _SLOT.pack_into(data, offset, begin, digest, expires,
+                            len(payload))
+            _SEQ.pack_into(data, offset, begin + 1)
+        finally:
+            fcntl.lockf(self._fd, fcntl.LOCK_UN, self.slot_size, offset,
+                        os.SEEK_SET)
+
+    def _remove(self, offset, digest):
+        """Empty the slot at `offset` if it still contains the response with
+        the `digest`."""
+        data = self._map
+        fcntl.lockf(self._fd, fcntl.LOCK_EX, self.slot_size, offset,
+                    os.SEEK_SET)
+        try:
+            current = _SLOT.unpack_from(data, offset)[1]
+            if current == digest:
+                begin = _begin(data, offset)
+                _SLOT.pack_into(data, offset, begin, _EMPTY, 0.0, 0)
+                _SEQ.pack_into(data, offset, begin + 1)
+        finally:
+            fcntl.lockf(self._fd, fcntl.LOCK_UN, self.slot_size, offset,
+                        os.SEEK_SET)
+
+    def _load(self, key):
+        digest = _digest(key)
+        offset = self._offset(digest)
+        slot = self._read(offset)
+        if slot is None or slot[0] != digest:
+            return (offset, None)
+        try:
+            (cached_key, status, headers, body, _) = unpackb(slot[2])
+        except ValueError:
+            return (offset, None)
+        if cached_key != key:
+            return (offset, None)
+        return (offset, CachedResponse(
+            status, tuple(tuple(header) for header in headers), body,
+            slot[1]))
+
+    def get(self, key, stale=0):
+        """Return the :class:`supercell.responsecache.CachedResponse` for
+        `key` or `None` if it is not cached or outdated.
+
+        :param stale: Number of seconds after its expiration during which an
+                      outdated response is still returned, it is counted as a
+                      stale hit instead of a hit
+        :type stale: float
+        """
+        (offset, response) = self._load(key)
+        if response is not None and response.expires + stale <= time.time():
+            self._remove(offset, _digest(key))
+            response = None
+        if response is None:
+            self.misses += 1
+            return None
+        if response.expires <= time.time():
+            self.stale_hits += 1
+        else:
+            self.hits += 1
+        return response
+
+    def put(self, key, response, tags=()):
+        """Store the :class:`supercell.responsecache.CachedResponse` for
+        `key`, replacing the response in its slot.
+
+        Responses larger than a slot are not cached.
+
+        :param tags: Tags for removing the response with :func:`purge`
+        :type tags: tuple
+        """
+        payload = packb([key, response.status,
+                         [list(header) for header in response.headers],
+                         response.body, list(tags)])
+        if len(payload) > self.slot_size - _SLOT_HEADER_SIZE:
+            return
+        digest = _digest(key)
+        offset = self._offset(digest)
+        slot = self._read(offset)
+        if slot is not None and slot[0] != digest and \
+                slot[1] > time.time():
+            self.evictions += 1
+        self._write(offset, digest, response.expires, payload)
+
+    def invalidate(self, key):
+        """Remove the response for `key` from the cache."""
+        (offset, response) = self._load(key)
+        if response is not None:
+            self._remove(offset, _digest(key))
+
+    def purge(self, *tags):
+        """Remove all responses with one of the `tags` from the cache and
+        return their number.
+
+        As the cache is shared, the responses are removed for all processes.
+        """
+        tags = set(tags)
+        purged = 0
+        for index in range(self.slots):
+            offset = _HEADER_SIZE + index * self.slot_size
+            slot = self._read(offset)
+            if slot is None:
+                continue
+            try:
+                cached_tags = unpackb(slot[2])[4]
+            except (ValueError, IndexError):
+                continue
+            if tags.intersection(cached_tags):
+                self._remove(offset, slot[0])
+                purged += 1
+        return purged
+
+    def clear(self):
+        """Remove all responses and reset the statistics."""
+        for index in range(self.slots):
+            offset = _HEADER_SIZE + index * self.slot_size
+            slot = self._read(offset)
+            if slot is not None:
+                self._remove(offset, slot[0])
+        self.hits = self.misses = self.stale_hits = \
+            self.evictions = 0
+
+    def close(self):
+        """Unmap and close the cache file."""
+        self._map.close()
+        os.close(self._fd)
+
+    def _slots(self):
+        """Iterate over the payload lengths of all non-outdated slots."""
+        now = time.time()
+        for index in range(self.slots):
+            slot = self._read(_HEADER_SIZE + index * self.slot_size)
+            if slot is not None and slot[1] > now:
+                yield len(slot[2])
+
+    def __contains__(self, key):
+        (_, response) = self._load(key)
+        return response is not None
+
+    def __len__(self):
+        return sum(1 for _ in self._slots())
+
+    @property
+    def size(self):
+        """The total size of the non-outdated responses."""
+        return sum(self._slots())
+
+    @property
+    def hit_rate(self):
+        """The ratio of hits to all lookups of this process, stale hits are
+        not counted as hits."""
+        lookups = self.hits + self.stale_hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def metrics(self):
+        """Return the statistics of the cache as a `dict`."""
+        sizes = list(self._slots())
+        return {'hits': self.hits, 'stale_hits': self.stale_hits,
+                'misses': self.misses,
+                'hit_rate': self.hit_rate, 'evictions': self.evictions,
+                'entries': len(sizes), 'bytes': sum(sizes),
+                'max_bytes': self.max_bytes}
@@ -0,0 +1,138 @@
+#
+# Copyright (c) 2013 Daniel Truemper <truemped at googlemail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+#
+
+"""Persisting in-process caches across restarts.
+
+Caches are registered on the environment with a unique name::
+
+    class MyService(Service):
+
+        def run(self):
+            self.environment.add_persistent_cache(
+                'responses', self.environment.response_cache)
+
+If the `cache_snapshot` option is set, :func:`supercell.service.Service`
+writes all registered caches to this file during the shutdown and restores
+them when the application is created. Entries that are outdated by then are
+dropped, the time to live of all other entries is reduced by the time that
+passed since the snapshot was written.
+
+Any object can be registered as long as it implements two methods:
+`dump()` returns an iterable of `(key, value, ttl)` tuples, where `value` can
+be serialized with :mod:`supercell.msgpack` and `ttl` is the remaining time
+to live in seconds, and `load(key, value, ttl)` restores an entry. The
+:class:`supercell.responsecache.ResponseCache` implements both.
+
+The snapshot consists of a small header with the format version followed by
+a MessagePack document. Snapshots with another version or that are corrupt
+are ignored.
+"""
+
+import logging
+import os
+from struct import Struct, error as StructError
+import time
+
+from supercell.msgpack import packb, unpackb
+
+
+__all__ = ['read_snapshot', 'write_snapshot', 'VERSION']
+
+
+_MAGIC = b'SCSN'
+
+VERSION = 1
+"""The version of the snapshot format."""
+
+# magic, version, wall clock time of the snapshot
+_HEADER = Struct('<4sHd')
+
+logger = logging.getLogger('supercell.snapshot')
+
+
+def write_snapshot(path, caches):
+    """Write the entries of all `caches` to the file `path`.
+
+    The file is replaced atomically.
+
+    :param path: The path of the snapshot
+    :type path: str
+
+    :param caches: The caches by their names
+    :type caches: dict
+    """
+    document = {}
+    for (name, cache) in caches.items():
+        document[name] = [[key, value, ttl]
+                          for (key, value, ttl) in cache.dump() if ttl > 0]
+    data = _HEADER.pack(_MAGIC, VERSION, time.time()) + packb(document)
+
+    tmp = '%s.%d.tmp' % (path, os.getpid())
+    with open(tmp, 'wb') as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+def read_snapshot(path, caches):
+    """Restore the still valid entries from the snapshot in `path` into the
+    `caches` and return the number of restored entries.
+
+    Missing, corrupt or outdated snapshots are ignored, as are entries of
+    caches that are not in `caches`.
+
+    :param path: The path of the snapshot
+    :type path: str
+
+    :param caches: The caches by their names
+    :type caches: dict
+    """
+    try:
+        with open(path, 'rb') as f:
+            data = f.read()
+    except FileNotFoundError:
+        return 0
+
+    try:
+        (magic, version, written) = _HEADER.unpack_from(data)
+    except StructError:
+        magic = version = None
+    if magic != _MAGIC or version != VERSION:
+        logger.warning('Ignoring snapshot %s with unknown format', path)
+        return 0
+    try:
+        document = unpackb(data[_HEADER.size:])
+        entries = [(caches[name], key, value, ttl)
+                   for name in document if name in caches
+                   for (key, value, ttl) in document[name]]
+    except (ValueError, TypeError):
+        logger.warning('Ignoring corrupt snapshot %s', path)
+        return 0
+
+    elapsed = max(0.0, time.time() - written)
+    restored = 0
+    for (cache, key, value, ttl) in entries:
+        try:
+            ttl -= elapsed
+            if ttl <= 0:
+                continue
+            cache.load(key, value, ttl)
+        except (ValueError, TypeError):
+            logger.warning('Ignoring corrupt entry %r in snapshot %s', key,
+                           path)
+            continue
+        restored += 1
+    return restored
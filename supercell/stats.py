@@ -0,0 +1,56 @@
+#
+# Copyright (c) 2013 Daniel Truemper <truemped at googlemail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+#
+
+"""Simple in-process counters for events inside **supercell** that should be
+monitored but do not result in an error response, e.g. failed output
+validations in the `sampled` validation mode::
+
+    from supercell import stats
+
+    stats.increment('provider.validation_errors')
+    stats.get('provider.validation_errors')
+
+Use :func:`snapshot` to export all counters, e.g. from a health check.
+"""
+
+from collections import Counter
+
+
+__all__ = ['increment', 'get', 'snapshot', 'reset']
+
+
+_COUNTERS = Counter()
+
+
+def increment(name, value=1):
+    """Increment the counter `name` by `value`."""
+    _COUNTERS[name] += value
+
+
+def get(name):
+    """Return the current value of the counter `name`."""
+    return _COUNTERS[name]
+
+
+def snapshot():
+    """Return a copy of all counters as a `dict`."""
+    return dict(_COUNTERS)
+
+
+def reset():
+    """Reset all counters."""
+    _COUNTERS.clear()
@@ -0,0 +1,164 @@
+#
+# Copyright (c) 2013 Daniel Truemper <truemped at googlemail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+#
+
+"""Helpers for the templates of the
+:class:`supercell.provider.TornadoTemplateProvider`.
+
+All templates below the `template_path` of the tornado settings are compiled
+when the application is created, so that syntax errors are detected at
+startup and the first requests do not have to compile them.
+
+Rendered fragments of templates can be cached with an explicit key and a time
+to live in seconds with the `cached_fragment` function that is available in
+all templates::
+
+    <div class="sidebar">
+    {% raw cached_fragment('sidebar:%s' % section, 300, 'sidebar.html',
+                           section=section) %}
+    </div>
+
+On a miss the template *sidebar.html* is rendered with the keyword arguments
+and stored in the environment's
+:attr:`supercell.environment.Environment.fragment_cache`, on a hit it is not
+rendered at all. As the fragments are already rendered, they have to be
+included with `raw`. The key must contain everything the fragment depends on.
+"""
+
+from collections import OrderedDict
+import os
+import time
+
+from tornado import template
+from tornado.web import RequestHandler
+
+
+__all__ = ['FragmentCache', 'precompile_templates']
+
+
+TEMPLATE_EXTENSIONS = ('.html', '.htm', '.xml', '.txt')
+"""The file extensions of templates that are compiled at startup."""
+
+
+def _create_loader(settings, template_path):
+    """Create the template loader just like
+    :func:`tornado.web.RequestHandler.create_template_loader`."""
+    if 'template_loader' in settings:
+        return settings['template_loader']
+    kwargs = {}
+    if 'autoescape' in settings:
+        kwargs['autoescape'] = settings['autoescape']
+    if 'template_whitespace' in settings:
+        kwargs['whitespace'] = settings['template_whitespace']
+    return template.Loader(template_path, **kwargs)
+
+
+def precompile_templates(application, extensions=TEMPLATE_EXTENSIONS):
+    """Compile all templates below the `template_path` of the `application`
+    and return their number.
+
+    The templates are compiled with the loader that is used by the request
+    handlers later on.
+
+    :param application: The application
+    :type application: tornado.web.Application
+
+    :param extensions: The file extensions of the templates
+    :type extensions: tuple
+    """
+    template_path = application.settings.get('template_path')
+    if not template_path:
+        return 0
+
+    with RequestHandler._template_loader_lock:
+        loader = RequestHandler._template_loaders.get(template_path)
+        if loader is None:
+            loader = _create_loader(application.settings, template_path)
+            RequestHandler._template_loaders[template_path] = loader
+
+    compiled = 0
+    for (directory, _, filenames) in os.walk(template_path):
+        for filename in filenames:
+            if not filename.endswith(extensions):
+                continue
+            name = os.path.relpath(os.path.join(directory, filename),
+                                   template_path)
+            loader.load(name.replace(os.sep, '/'))
+            compiled += 1
+    return compiled
+
+
+class FragmentCache:
+    """LRU cache of rendered template fragments with a time to live.
+
+    :param maxsize: The maximum number of fragments to keep
+    :type maxsize: int
+    """
+
+    def __init__(self, maxsize=1024):
+        assert maxsize > 0, 'maxsize must be positive'
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+
+    def get(self, key):
+        """Return the fragment for `key` or `None` if it is not cached or
+        outdated."""
+        item = self._data.get(key)
+        if item is not None and item[1] <= time.time():
+            del self._data[key]
+            item = None
+        if item is None:
+            self.misses += 1
+            return None
+        self._data.move_to_end(key)
+        self.hits += 1
+        return item[0]
+
+    def put(self, key, fragment, ttl):
+        """Store the `fragment` for `key` for `ttl` seconds."""
+        self._data[key] = (fragment, time.time() + ttl)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def invalidate(self, key):
+        """Remove the fragment for `key` from the cache."""
+        self._data.pop(key, None)
+
+    def clear(self):
+        """Remove all fragments and reset the statistics."""
+        self._data.clear()
+        self.hits = self.misses = 0
+
+    def dump(self):
+        """Return the `(key, value, ttl)` tuples of all fragments that are
+        not outdated, see :mod:`supercell.snapshot`."""
+        now = time.time()
+        return [(key, fragment, expires - now)
+                for (key, (fragment, expires)) in self._data.items()
+                if expires > now]
+
+    def load(self, key, value, ttl):
+        """Restore a fragment returned by :func:`dump`."""
+        self.put(key, value, ttl)
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def __len__(self):
+        return len(self._data)
@@ -15,10 +15,11 @@
 #
 #
 
+from collections import OrderedDict
 from html import escape
 
 
-__all__ = ['escape_contents']
+__all__ = ['escape_contents', 'LRUCache']
 
 
 def escape_contents(o):
@@ -37,3 +38,63 @@ def escape_contents(o):
     elif isinstance(o, set):
         o = {_e(v) for v in o}
     return o
+
+
+class LRUCache:
+    """Simple least recently used cache with a fixed number of entries.
+
+    The cache keeps track of its hits and misses so that the effectiveness
+    can be monitored::
+
+        cache = LRUCache(maxsize=128)
+        cache.put('key', 'value')
+        cache.get('key')
+        assert cache.hits == 1
+
+    Once `maxsize` entries are stored, the least recently used entry is
+    evicted for every new entry.
+    """
+
+    _MISSING = object()
+
+    def __init__(self, maxsize=256):
+        """Initialize the cache.
+
+        :param maxsize: The maximum number of entries to keep
+        :type maxsize: int
+        """
+        assert maxsize > 0, 'maxsize must be positive'
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+
+    def get(self, key, default=None):
+        """Return the value for `key` and mark it as recently used."""
+        value = self._entries.get(key, self._MISSING)
+        if value is self._MISSING:
+            self.misses += 1
+            return default
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key, value):
+        """Store `value` for `key`, evicting the least recently used entry
+        if the cache is full."""
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        """Remove all entries and reset the statistics."""
+        self._entries.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def __len__(self):
+        return len(self._entries)
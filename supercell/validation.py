@@ -0,0 +1,317 @@
+#
+# Copyright (c) 2013 Daniel Truemper <truemped at googlemail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+#
+
+"""Compiled validators for :class:`schematics.models.Model` classes.
+
+After a consumer created a model from the request body,
+:func:`schematics.models.Model.validate` converts all values a second time
+and creates a new instance for every nested model before the validators of
+the fields are run. :func:`validate` instead generates a specialized function
+once per model class that runs the same checks on the already converted data
+and raises the same :exc:`schematics.exceptions.DataError`::
+
+    from supercell.validation import validate
+
+    validate(model)  # instead of model.validate()
+
+Models with model level validators, `serializable` fields or field types that
+are not supported are validated with schematics. The same holds for all models
+with schematics versions older than 2.0.
+"""
+
+from collections.abc import Mapping
+
+from schematics.models import Model
+from schematics import types as _types
+from schematics.exceptions import (BaseError, CompoundError, ConversionError,
+                                   DataError, FieldError, StopValidationError,
+                                   ValidationError)
+from schematics.types.base import BaseType
+from schematics.types.compound import (CompoundType, DictType, ListType,
+                                       ModelType)
+
+try:
+    from schematics.datastructures import Context
+    from schematics.transforms import validation_converter
+    from schematics.undefined import Undefined
+except ImportError:  # pragma: no cover
+    # schematics < 2.0
+    Undefined = None
+
+
+__all__ = ['compile_validator', 'validate']
+
+
+_VALIDATOR_ATTRIBUTE = '_supercell_validator'
+
+
+# field types whose conversion returns values of the native type unchanged
+_NATIVE_TYPES = (('StringType', str), ('URLType', str), ('EmailType', str),
+                 ('MD5Type', str), ('SHA1Type', str), ('IntType', int),
+                 ('LongType', int), ('FloatType', float),
+                 ('BooleanType', bool))
+
+_NATIVE_CLASSES = dict(
+    (getattr(_types, name), native_type)
+    for (name, native_type) in _NATIVE_TYPES if hasattr(_types, name))
+
+
+class _Unsupported(Exception):
+    """Raised while compiling if a model cannot be compiled."""
+
+
+def _validation_context():
+    """Return the context `Model.validate()` passes to the fields."""
+    return Context(field_converter=validation_converter, partial=False,
+                   strict=False, convert=True, validate=True, new=False,
+                   initialized=True, trusted_data={}, mapping={},
+                   init_values=False, apply_defaults=False, oo=True,
+                   recursive=False, app_data={})
+
+
+def _model_converter(field):
+    """Validate the value of a `ModelType` field.
+
+    Instead of creating a new instance like schematics, the nested model is
+    validated in place with its compiled validator.
+    """
+    model_class = field.model_class
+    fallback = field.convert
+
+    def convert(value, context):
+        if isinstance(value, model_class) and not value._data.unsafe:
+            validator = compile_validator(type(value))
+            if validator is not None:
+                validator(value._data, context)
+                return value
+        return fallback(value, context)
+
+    return convert
+
+
+def _items_validator(field):
+    """Return a function validating a single item of a `ListType` or
+    `DictType` like schematics' `validation_converter`."""
+    inner = field.field
+    validate_item = _validator(inner)
+    required = inner.required
+
+    def validate(item, context):
+        if item is None or item is Undefined:
+            if required:
+                raise ConversionError(inner.messages['required'])
+            return item
+        return validate_item(item, context)
+
+    return validate
+
+
+def _list_converter(field):
+    """Validate the items of a `ListType` field."""
+    validate_item = _items_validator(field)
+    coerce = field._coerce
+
+    def convert(value, context):
+        data = []
+        errors = {}
+        for (index, item) in enumerate(coerce(value)):
+            try:
+                data.append(validate_item(item, context))
+            except BaseError as exc:
+                errors[index] = exc
+        if errors:
+            raise CompoundError(errors)
+        return data
+
+    return convert
+
+
+def _dict_converter(field):
+    """Validate the values of a `DictType` field."""
+    validate_item = _items_validator(field)
+    coerce_key = field.coerce_key
+    fallback = field.convert
+
+    def convert(value, context):
+        if not isinstance(value, Mapping):
+            return fallback(value, context)
+        data = {}
+        errors = {}
+        for (key, item) in value.items():
+            try:
+                data[coerce_key(key)] = validate_item(item, context)
+            except BaseError as exc:
+                errors[key] = exc
+        if errors:
+            raise CompoundError(errors)
+        return data
+
+    return convert
+
+
+def _native_converter(field, native_type):
+    """Convert values of a simple field only if they do not already have the
+    native type."""
+    fallback = field.convert
+
+    def convert(value, context):
+        if type(value) is native_type:
+            return value
+        return fallback(value, context)
+
+    return convert
+
+
+def _converter(field):
+    """Return a function converting a value of the field like its `convert`
+    method."""
+    cls = type(field)
+    if isinstance(field, CompoundType):
+        if cls.convert is not CompoundType.convert:
+            raise _Unsupported(field)
+        if isinstance(field, ModelType) and \
+                cls._convert is ModelType._convert:
+            return _model_converter(field)
+        if isinstance(field, ListType) and cls._convert is ListType._convert:
+            return _list_converter(field)
+        if isinstance(field, DictType) and cls._convert is DictType._convert:
+            return _dict_converter(field)
+        raise _Unsupported(field)
+
+    native_type = _NATIVE_CLASSES.get(cls)
+    if native_type is not None:
+        return _native_converter(field, native_type)
+    return field.convert
+
+
+def _validator(field):
+    """Return a function with the same result as `field.validate`."""
+    if type(field).validate is not BaseType.validate:
+        raise _Unsupported(field)
+
+    convert = _converter(field)
+    validators = field.validators
+
+    def validate(value, context):
+        value = convert(value, context)
+        errors = []
+        for validator in validators:
+            try:
+                validator(value, context)
+            except ValidationError as exc:
+                errors.append(exc)
+                if isinstance(exc, StopValidationError):
+                    break
+        if errors:
+            raise ValidationError(errors)
+        return value
+
+    return validate
+
+
+def _compile(model_class):
+    """Generate the source code of the validator for `model_class`."""
+    if model_class._schema.validators:
+        raise _Unsupported(model_class)
+
+    namespace = {'Undefined': Undefined, 'DataError': DataError,
+                 'FieldError': FieldError, 'CompoundError': CompoundError,
+                 'ConversionError': ConversionError}
+    lines = ['def validate(raw, context):',
+             '    get = raw.get',
+             '    data = {}',
+             '    errors = {}']
+    for (i, (name, field)) in enumerate(model_class._fields.items()):
+        if not isinstance(field, BaseType):
+            # e.g. serializable fields
+            raise _Unsupported(field)
+
+        key = repr(field.serialized_name or name)
+        namespace['field_%d' % i] = field
+        namespace['validate_%d' % i] = _validator(field)
+        lines.append('    value = get(%r, Undefined)' % name)
+        lines.append('    if value is None or value is Undefined:')
+        if field.required:
+            lines.append('        errors[%s] = ConversionError('
+                         'field_%d.messages["required"])' % (key, i))
+        else:
+            lines.append('        if value is None:')
+            lines.append('            data[%r] = None' % name)
+        lines.append('    else:')
+        lines.append('        try:')
+        lines.append('            data[%r] = validate_%d(value, context)' % (
+            name, i))
+        lines.append('        except DataError as exc:')
+        lines.append('            errors[%s] = exc' % key)
+        lines.append('            data[%r] = exc.partial_data' % name)
+        lines.append('        except (FieldError, CompoundError) as exc:')
+        lines.append('            errors[%s] = exc' % key)
+    lines.append('    if errors:')
+    lines.append('        raise DataError(errors, data)')
+    lines.append('    return data')
+
+    source = '\n'.join(lines)
+    exec(compile(source, '<validator %s>' % model_class.__name__, 'exec'),
+         namespace)
+    validator = namespace['validate']
+    validator.source = source
+    return validator
+
+
+def compile_validator(model_class):
+    """Return the compiled validator for `model_class`.
+
+    The validator is generated on the first call and cached on the class.
+    If the model class is not supported, `None` is returned.
+    """
+    if not (isinstance(model_class, type) and issubclass(model_class, Model)):
+        return None
+    try:
+        return model_class.__dict__[_VALIDATOR_ATTRIBUTE]
+    except KeyError:
+        pass
+
+    validator = None
+    if Undefined is not None:
+        try:
+            validator = _compile(model_class)
+        except _Unsupported:
+            pass
+    setattr(model_class, _VALIDATOR_ATTRIBUTE, validator)
+    return validator
+
+
+def validate(model):
+    """Validate `model`, exactly like `model.validate()` but with the
+    compiled validator of its class if possible.
+
+    :raises: :exc:`schematics.exceptions.DataError`
+    """
+    validator = compile_validator(type(model))
+    state = model._data
+    if validator is None or state.unsafe or not state.converted:
+        return model.validate()
+
+    try:
+        state.valid = validator(state.converted, _validation_context())
+    except DataError as e:
+        valid = dict(state.valid)
+        valid.update(e.partial_data)
+        state.valid = valid
+        raise
+    finally:
+        state.converted = {}
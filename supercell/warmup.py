@@ -0,0 +1,111 @@
+#
+# Copyright (c) 2013 Daniel Truemper <truemped at googlemail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+#
+
+"""Warming up caches before a service accepts requests.
+
+Warmup requests and callbacks are added to the environment in
+:func:`supercell.service.Service.run`::
+
+    class MyService(Service):
+
+        def run(self):
+            self.environment.add_handler('/users', Users, cache=...)
+            self.environment.add_managed_object('users', UserStore())
+
+            self.environment.add_warmup(self.environment.users.load)
+            self.environment.add_warmup_request('/users?page=1')
+
+:func:`supercell.service.Service.main` starts the warmup once the socket is
+bound. The callbacks are called first, then the GET requests are executed one
+after another by the application just like external requests, but without a
+network connection, so that they fill the server side response caches.
+Failing callbacks and requests, and requests taking longer than
+`--warmup_timeout` seconds, are logged and do not stop the warmup. The warmup
+only stops waiting for requests that time out, their handlers are not
+cancelled and keep running in the background.
+
+As the host is part of the cache key, the `Host` header of the warmup
+requests has to match the host of the real requests, e.g. the virtual host
+behind a proxy. It is set to `--warmup_host` (by default the configured
+address and port) unless the request has its own `Host` header.
+
+Until the warmup has finished, the readiness check at */_system/ready*
+returns **503**, so that load balancers only send requests once the caches
+are warm. Requests arriving before are served with cold caches.
+"""
+
+from datetime import timedelta
+
+from tornado import gen
+from tornado.concurrent import Future
+from tornado.httputil import HTTPHeaders, HTTPServerRequest
+
+from supercell.requesthandler import _DiscardingConnection
+
+
+__all__ = ['warmup_request']
+
+
+class _WarmupConnection(_DiscardingConnection):
+    """Connection that discards the response but records its status code and
+    signals when the request is finished."""
+
+    def __init__(self):
+        self.code = None
+        self.finished = Future()
+
+    def write_headers(self, start_line, headers, chunk=None):
+        self.code = start_line.code
+        return super().write_headers(start_line, headers, chunk)
+
+    def finish(self):
+        if not self.finished.done():
+            self.finished.set_result(self.code)
+
+
+@gen.coroutine
+def warmup_request(application, uri, headers=None, timeout=None):
+    """Execute a GET request for `uri` with the `application` and return the
+    status code of the response.
+
+    :raises: :exc:`tornado.gen.TimeoutError` if the response is not finished
+             within `timeout` seconds; the handler is not cancelled and keeps
+             running
+
+    :param application: The application
+    :type application: tornado.web.Application
+
+    :param uri: The path and query of the request
+    :type uri: str
+
+    :param headers: The request headers, e.g. `Accept` or `Host`
+    :type headers: dict
+
+    :param timeout: The maximum number of seconds to wait for the response
+    :type timeout: float
+    """
+    connection = _WarmupConnection()
+    request = HTTPServerRequest(method='GET', uri=uri,
+                                headers=HTTPHeaders(headers or {}),
+                                connection=connection)
+    request.remote_ip = '127.0.0.1'
+    application.find_handler(request).execute()
+    finished = connection.finished
+    if timeout is not None:
+        finished = gen.with_timeout(timedelta(seconds=timeout), finished)
+    code = yield finished
+    raise gen.Return(code)
@@ -4,7 +4,8 @@
 #
 from unittest import TestCase
 
-from supercell.acceptparsing import parse_accept_header
+from supercell.acceptparsing import (parse_accept_header, INTERNED,
+                                     MAX_MEDIA_RANGES, MAX_MEDIA_PARAMS)
 
 
 class TestParseAcceptHeader(TestCase):
@@ -59,3 +60,45 @@ class TestParseAcceptHeader(TestCase):
         should = [('*/*', {}, 1.0)]
         self.assertEqual(parse_accept_header(accept), should)
 
+    def test_parameter_without_value_is_skipped(self):
+        accept = 'text/html;level,application/json'
+        should = [('application/json', {}, 1.0)]
+        self.assertEqual(parse_accept_header(accept), should)
+
+    def test_empty_parameters_are_ignored(self):
+        accept = 'application/json;,text/html;;level=1;q=0.5;'
+        should = [('application/json', {}, 1.0),
+                  ('text/html', {'level': '1'}, 0.5)]
+        self.assertEqual(parse_accept_header(accept), should)
+
+    def test_invalid_q_value_is_skipped(self):
+        accept = 'text/html;q=high,application/json;q=0.5'
+        should = [('application/json', {}, 0.5)]
+        self.assertEqual(parse_accept_header(accept), should)
+
+    def test_invalid_media_type_is_skipped(self):
+        accept = 'text/html/foo,application/json'
+        should = [('application/json', {}, 1.0)]
+        self.assertEqual(parse_accept_header(accept), should)
+
+    def test_number_of_media_ranges_is_bounded(self):
+        accept = ','.join(['application/json'] * (MAX_MEDIA_RANGES * 10))
+        self.assertEqual(len(parse_accept_header(accept)), MAX_MEDIA_RANGES)
+
+    def test_number_of_parameters_is_bounded(self):
+        params = ';'.join(['a%d=b' % i for i in range(MAX_MEDIA_PARAMS + 1)])
+        accept = 'text/html;%s,application/json' % params
+        should = [('application/json', {}, 1.0)]
+        self.assertEqual(parse_accept_header(accept), should)
+
+    def test_parsed_headers_are_interned(self):
+        INTERNED.clear()
+        accept = 'application/json;q=0.9,text/html'
+        first = parse_accept_header(accept)
+        second = parse_accept_header(accept)
+        self.assertEqual(first, second)
+        self.assertEqual(INTERNED.hits, 1)
+
+        # the returned list is a copy
+        second.append(('text/plain', {}, 0.1))
+        self.assertEqual(parse_accept_header(accept), first)
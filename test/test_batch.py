@@ -0,0 +1,148 @@
+# vim: set fileencoding=utf-8 :
+#
+# Copyright (c) 2013 Daniel Truemper <truemped at googlemail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+#
+from datetime import timedelta
+import json
+
+import pytest
+from schematics.models import Model
+from schematics.types import IntType, StringType
+from tornado import gen
+from tornado.testing import AsyncHTTPTestCase
+
+import supercell.api as s
+from supercell.batch import BatchConfig
+from supercell.environment import Environment
+
+
+class Item(Model):
+    id = IntType()
+    name = StringType()
+
+
+@s.provides(s.MediaType.ApplicationJson, default=True)
+@s.consumes(s.MediaType.ApplicationJson, model=Item)
+class ItemHandler(s.RequestHandler):
+
+    running = 0
+    max_running = 0
+
+    @s.coroutine
+    def get(self, item_id):
+        cls = self.__class__
+        cls.running += 1
+        cls.max_running = max(cls.max_running, cls.running)
+        yield gen.sleep(0.01)
+        cls.running -= 1
+        self.set_header('X-Auth', self.request.headers.get('Authorization',
+                                                            ''))
+        if item_id == '404':
+            raise s.Error(404, additional={'reason': 'not found'})
+        raise s.Return(Item({'id': int(item_id), 'name': 'item'}))
+
+    @s.coroutine
+    def put(self, item_id, model=None):
+        raise s.Return(Item({'id': int(item_id), 'name': model.name}))
+
+
+class HangingHandler(s.RequestHandler):
+
+    @s.coroutine
+    def get(self, *args, **kwargs):
+        yield gen.Future()
+
+
+def test_batch_config():
+    config = BatchConfig()
+    assert config.path == '/_batch'
+    assert config.forward_headers == ('Authorization', 'Cookie')
+    with pytest.raises(AssertionError):
+        BatchConfig(concurrency=0)
+    with pytest.raises(AssertionError):
+        BatchConfig(path='_batch')
+    with pytest.raises(AssertionError):
+        BatchConfig(timeout=timedelta(0))
+
+
+class TestBatch(AsyncHTTPTestCase):
+
+    def get_app(self):
+        env = Environment()
+        env.add_handler(r'/items/(\d+)', ItemHandler)
+        env.add_handler('/hanging', HangingHandler)
+        env.set_batch(BatchConfig(max_requests=10, concurrency=2,
+                                  timeout=timedelta(seconds=0.2)))
+        env._finalize()
+        return env.get_application()
+
+    def batch(self, requests, **headers):
+        headers['Content-Type'] = s.MediaType.ApplicationJson
+        response = self.fetch('/_batch', method='POST', headers=headers,
+                              body=json.dumps({'requests': requests}))
+        return response
+
+    def test_requests_are_executed(self):
+        ItemHandler.max_running = 0
+        response = self.batch(
+            [{'path': '/items/%d' % i} for i in range(6)] +
+            [{'path': '/items/404'},
+             {'path': '/unknown'},
+             {'method': 'PUT', 'path': '/items/7', 'body': {'name': 'new'}}],
+            Authorization='secret')
+        self.assertEqual(200, response.code)
+        responses = json.loads(response.body.decode('utf8'))['responses']
+
+        self.assertEqual([200] * 6 + [404, 404, 200],
+                         [r['status'] for r in responses])
+        self.assertEqual([{'id': i, 'name': 'item'} for i in range(6)],
+                         [r['body'] for r in responses[:6]])
+        self.assertEqual('secret', responses[0]['headers']['X-Auth'])
+        self.assertEqual({'id': 7, 'name': 'new'}, responses[-1]['body'])
+        self.assertEqual(2, ItemHandler.max_running)
+
+    def test_text_bodies(self):
+        response = self.batch([{'path': '/unknown'}])
+        body = json.loads(response.body.decode('utf8'))['responses'][0]
+        self.assertEqual(404, body['status'])
+        self.assertIn('404', body['body'])
+
+    def test_requests_time_out(self):
+        response = self.batch([{'path': '/hanging'}, {'path': '/items/1'}])
+        self.assertEqual(200, response.code)
+        responses = json.loads(response.body.decode('utf8'))['responses']
+        self.assertEqual([504, 200], [r['status'] for r in responses])
+        self.assertEqual(None, responses[0]['body'])
+
+    def test_invalid_batches(self):
+        self.assertEqual(400, self.batch([{'path': '/items/1'}] * 11).code)
+        self.assertEqual(400, self.batch([{'path': '/_batch'}]).code)
+        self.assertEqual(400, self.batch([{'path': 'items'}]).code)
+        self.assertEqual(400, self.batch([{'method': 'TRACE',
+                                           'path': '/items/1'}]).code)
+
+
+class TestWithoutBatch(AsyncHTTPTestCase):
+
+    def get_app(self):
+        env = Environment()
+        env.add_handler(r'/items/(\d+)', ItemHandler)
+        env._finalize()
+        return env.get_application()
+
+    def test_batch_is_disabled(self):
+        response = self.fetch('/_batch', method='POST', body='{}')
+        self.assertEqual(404, response.code)
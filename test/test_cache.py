@@ -26,6 +26,7 @@ from tornado.testing import AsyncHTTPTestCase
 
 import supercell.api as s
 from supercell.api import (RequestHandler, provides, CacheConfig)
+from supercell.cache import compute_cache_header
 from supercell.environment import Environment
 
 
@@ -141,3 +142,88 @@ class TestCacheDecorator(AsyncHTTPTestCase):
         self.assertEqual('{"doc_id": "test123", "message": "A test"}',
                          json.dumps(json.loads(response.body.decode('utf8')),
                                     sort_keys=True))
+
+
+@provides(s.MediaType.ApplicationMsgpack)
+@provides(s.MediaType.ApplicationJson, default=True)
+class VersionedHandler(RequestHandler):
+
+    version = 1
+    calls = 0
+
+    def etag_key(self, *args, **kwargs):
+        return self.version
+
+    @s.coroutine
+    def get(self, *args, **kwargs):
+        VersionedHandler.calls += 1
+        raise s.Return(SimpleMessage({"doc_id": 'test123',
+                                      "message": 'A test'}))
+
+
+@provides(s.MediaType.ApplicationJson, default=True)
+class UnversionedHandler(VersionedHandler):
+
+    def etag_key(self, *args, **kwargs):
+        raise AssertionError('etag_key called without etag option')
+
+
+class TestETag(AsyncHTTPTestCase):
+
+    def get_app(self):
+        VersionedHandler.version = 1
+        VersionedHandler.calls = 0
+        env = Environment()
+        env.add_handler(r'/versioned', VersionedHandler,
+                        cache=CacheConfig(timedelta(minutes=10), etag=True))
+        env.add_handler(r'/unversioned', UnversionedHandler,
+                        cache=CacheConfig(timedelta(minutes=10)))
+        return env.get_application()
+
+    def test_not_modified_skips_the_handler(self):
+        response = self.fetch('/versioned')
+        self.assertEqual(response.code, 200)
+        self.assertEqual(response.headers['Vary'], 'Accept')
+        etag = response.headers['Etag']
+        self.assertTrue(etag.startswith('W/"'))
+        self.assertEqual(VersionedHandler.calls, 1)
+
+        response = self.fetch('/versioned', headers={'If-None-Match': etag})
+        self.assertEqual(response.code, 304)
+        self.assertEqual(response.headers['Etag'], etag)
+        self.assertEqual(response.headers['Vary'], 'Accept')
+        self.assertEqual('max-age=600, must-revalidate',
+                         response.headers['Cache-Control'])
+        self.assertEqual(VersionedHandler.calls, 1)
+
+        VersionedHandler.version = 2
+        response = self.fetch('/versioned', headers={'If-None-Match': etag})
+        self.assertEqual(response.code, 200)
+        self.assertNotEqual(response.headers['Etag'], etag)
+        self.assertEqual(VersionedHandler.calls, 2)
+
+    def test_etag_per_representation(self):
+        json_etag = self.fetch('/versioned').headers['Etag']
+        response = self.fetch('/versioned', headers={
+            'Accept': s.MediaType.ApplicationMsgpack,
+            'If-None-Match': json_etag})
+        self.assertEqual(response.code, 200)
+        self.assertNotEqual(response.headers['Etag'], json_etag)
+
+    def test_body_hash_without_etag_option(self):
+        response = self.fetch('/unversioned')
+        self.assertEqual(response.code, 200)
+        etag = response.headers['Etag']
+        self.assertFalse(etag.startswith('W/'))
+
+        response = self.fetch('/unversioned', headers={'If-None-Match': etag})
+        self.assertEqual(response.code, 304)
+
+
+def test_cache_header_with_days():
+    config = CacheConfig(timedelta(days=1), s_max_age=timedelta(days=2),
+                         stale_while_revalidate=timedelta(days=1),
+                         stale_if_error=timedelta(days=7))
+    assert compute_cache_header(config) == (
+        'max-age=86400, s-max-age=172800, must-revalidate, '
+        'stale-while-revalidate=86400, stale-if-error=604800')
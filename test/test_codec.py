@@ -0,0 +1,112 @@
+# vim: set fileencoding=utf-8 :
+#
+# Copyright (c) 2013 Daniel Truemper <truemped at googlemail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import json
+
+from schematics.models import Model
+from schematics.types import StringType
+from tornado.testing import AsyncHTTPTestCase
+
+import supercell.api as s
+from supercell.codec import JsonCodec
+from supercell.environment import Environment
+
+
+class SimpleMessage(Model):
+    message = StringType()
+
+
+def test_default_codec_encodes_utf8():
+    codec = JsonCodec()
+    assert codec.encode({'message': u'é</script>'}) == \
+        b'{"message": "\\u00e9<\\/script>"}'
+
+
+def test_default_codec_decodes_bytes():
+    codec = JsonCodec()
+    assert codec.decode(b'{"message": "\xc3\xa9"}') == {'message': u'é'}
+
+
+def test_custom_codec():
+    codec = JsonCodec(dumps=lambda o: json.dumps(o, separators=(',', ':')))
+    assert codec.encode({'a': 1, 'b': 2}) == b'{"a":1,"b":2}'
+
+
+class CountingCodec(JsonCodec):
+
+    def __init__(self):
+        super().__init__()
+        self.calls = []
+
+    def encode(self, obj):
+        self.calls.append('encode')
+        return super().encode(obj)
+
+    def decode(self, data):
+        self.calls.append('decode')
+        return super().decode(data)
+
+
+@s.consumes(s.MediaType.ApplicationJson, SimpleMessage)
+@s.provides(s.MediaType.ApplicationJson, default=True)
+class MyHandler(s.RequestHandler):
+
+    @s.coroutine
+    def get(self, *args, **kwargs):
+        raise s.Return(SimpleMessage({'message': 'A test'}))
+
+    @s.coroutine
+    def post(self, *args, **kwargs):
+        raise s.OkCreated({'message': kwargs['model'].message})
+
+
+class TestEnvironmentCodec(AsyncHTTPTestCase):
+
+    def get_app(self):
+        self.codec = CountingCodec()
+        env = Environment()
+        env.set_json_codec(self.codec)
+        env.add_handler('/test', MyHandler)
+        return env.get_application()
+
+    def test_provider_uses_codec(self):
+        response = self.fetch('/test')
+        self.assertEqual(response.code, 200)
+        self.assertEqual(response.headers['Content-Type'],
+                         'application/json; charset=UTF-8')
+        self.assertEqual(json.loads(response.body.decode('utf8')),
+                         {'message': 'A test'})
+        self.assertEqual(self.codec.calls, ['encode'])
+
+    def test_consumer_and_return_information_use_codec(self):
+        response = self.fetch('/test', method='POST',
+                              headers={'Content-Type':
+                                       s.MediaType.ApplicationJson},
+                              body='{"message": "posted"}')
+        self.assertEqual(response.code, 201)
+        self.assertEqual(json.loads(response.body.decode('utf8')),
+                         {'message': 'posted', 'ok': True})
+        self.assertEqual(self.codec.calls, ['decode', 'encode'])
+
+    def test_errors_use_codec(self):
+        response = self.fetch('/test', method='POST',
+                              headers={'Content-Type':
+                                       s.MediaType.ApplicationJson},
+                              body='{"message": 1')
+        self.assertEqual(response.code, 400)
+        self.assertEqual(json.loads(response.body.decode('utf8'))['error'],
+                         True)
+        self.assertEqual(self.codec.calls[-1], 'encode')
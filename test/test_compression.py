@@ -0,0 +1,150 @@
+# vim: set fileencoding=utf-8 :
+#
+# Copyright (c) 2013 Daniel Truemper <truemped at googlemail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+from concurrent.futures import ThreadPoolExecutor
+import gzip
+import json
+import zlib
+
+import pytest
+
+from schematics.models import Model
+from schematics.types import StringType
+from tornado.testing import AsyncHTTPTestCase
+
+import supercell.api as s
+from supercell.compression import (CompressionConfig, DEFLATE, GZIP,
+                                   compress, negotiate_encoding)
+from supercell.environment import Environment
+
+
+@pytest.mark.parametrize('accept_encoding,encoding', [
+    ('', None),
+    ('gzip', GZIP),
+    ('deflate', DEFLATE),
+    ('gzip, deflate', GZIP),
+    ('deflate, gzip', GZIP),
+    ('gzip;q=0.5, deflate', DEFLATE),
+    ('gzip;q=0, deflate;q=0', None),
+    ('br', None),
+    ('br, *', GZIP),
+    ('*, gzip;q=0', DEFLATE),
+    ('GZIP;q=invalid, deflate;q=0.1', DEFLATE),
+])
+def test_negotiate_encoding(accept_encoding, encoding):
+    assert negotiate_encoding(accept_encoding, (GZIP, DEFLATE)) == encoding
+
+
+def test_compress():
+    data = b'a' * 1000
+    assert gzip.decompress(compress(data, GZIP, 6)) == data
+    assert zlib.decompress(compress(data, DEFLATE, 6)) == data
+    assert compress(data, GZIP, 6) == compress(data, GZIP, 6)
+
+
+def test_compression_config():
+    with pytest.raises(AssertionError):
+        CompressionConfig(level=0)
+    with pytest.raises(AssertionError):
+        CompressionConfig(encodings=('br',))
+    assert CompressionConfig(encodings=[DEFLATE]).encodings == (DEFLATE,)
+
+
+class SimpleMessage(Model):
+    message = StringType()
+
+
+@s.provides(s.MediaType.ApplicationJson, default=True)
+class MyHandler(s.RequestHandler):
+
+    @s.coroutine
+    def get(self, *args, **kwargs):
+        size = int(self.get_argument('size'))
+        raise s.Return(SimpleMessage({'message': 'a' * size}))
+
+
+@s.provides(s.MediaType.ApplicationJson, default=True)
+class UncompressedHandler(MyHandler):
+    pass
+
+
+class CountingExecutor(ThreadPoolExecutor):
+
+    def __init__(self):
+        super().__init__(max_workers=1)
+        self.submitted = 0
+
+    def submit(self, *args, **kwargs):
+        self.submitted += 1
+        return super().submit(*args, **kwargs)
+
+
+class TestCompression(AsyncHTTPTestCase):
+
+    def get_app(self):
+        self.executor = CountingExecutor()
+        env = Environment()
+        env.set_executor(self.executor)
+        env.add_handler('/compressed', MyHandler,
+                        compression=CompressionConfig(min_size=100,
+                                                      offload_size=1000))
+        env.add_handler('/uncompressed', UncompressedHandler)
+        return env.get_application()
+
+    def fetch(self, path, accept_encoding='gzip'):
+        return super().fetch(path, decompress_response=False,
+                             headers={'Accept-Encoding': accept_encoding})
+
+    def test_small_responses_are_not_compressed(self):
+        response = self.fetch('/compressed?size=10')
+        self.assertEqual(response.code, 200)
+        self.assertNotIn('Content-Encoding', response.headers)
+        self.assertEqual(response.headers['Vary'], 'Accept, Accept-Encoding')
+        self.assertEqual(json.loads(response.body.decode('utf8')),
+                         {'message': 'a' * 10})
+
+    def test_gzip(self):
+        response = self.fetch('/compressed?size=500')
+        self.assertEqual(response.code, 200)
+        self.assertEqual(response.headers['Content-Encoding'], 'gzip')
+        self.assertEqual(response.headers['Vary'], 'Accept, Accept-Encoding')
+        self.assertEqual(json.loads(gzip.decompress(response.body)),
+                         {'message': 'a' * 500})
+        self.assertEqual(self.executor.submitted, 0)
+
+    def test_deflate(self):
+        response = self.fetch('/compressed?size=500', 'deflate')
+        self.assertEqual(response.headers['Content-Encoding'], 'deflate')
+        self.assertEqual(json.loads(zlib.decompress(response.body)),
+                         {'message': 'a' * 500})
+
+    def test_not_accepted(self):
+        response = self.fetch('/compressed?size=500', 'identity')
+        self.assertNotIn('Content-Encoding', response.headers)
+        self.assertEqual(json.loads(response.body.decode('utf8')),
+                         {'message': 'a' * 500})
+
+    def test_large_responses_are_compressed_in_the_executor(self):
+        response = self.fetch('/compressed?size=5000')
+        self.assertEqual(response.headers['Content-Encoding'], 'gzip')
+        self.assertEqual(json.loads(gzip.decompress(response.body)),
+                         {'message': 'a' * 5000})
+        self.assertEqual(self.executor.submitted, 1)
+
+    def test_handlers_without_config_are_not_compressed(self):
+        response = self.fetch('/uncompressed?size=5000')
+        self.assertNotIn('Content-Encoding', response.headers)
+        self.assertEqual(response.headers['Vary'], 'Accept')
@@ -98,3 +98,31 @@ class TestBasicConsumer(TestCase):
         with self.assertRaises(NoConsumerFound):
             ConsumerBase.map_consumer(MediaType.ApplicationJson,
                                       handler=MyHandler)
+
+    def test_compiled_dispatch_table(self):
+
+        @consumes(MediaType.ApplicationJson, object, vendor='supercell')
+        class MyHandler(RequestHandler):
+            pass
+
+        ConsumerBase.compile_dispatch_table(MyHandler)
+        ctype = ContentType(MediaType.ApplicationJson, vendor='supercell')
+        self.assertEqual(MyHandler._CONS_DISPATCH[ctype],
+                         ((object, True), MoreDetailedJsonConsumer))
+
+        (_, consumer) = ConsumerBase.map_consumer(
+            'application/vnd.supercell+json', handler=MyHandler)
+        self.assertIs(consumer, MoreDetailedJsonConsumer)
+
+        with self.assertRaises(NoConsumerFound):
+            ConsumerBase.map_consumer(MediaType.ApplicationJson,
+                                      handler=MyHandler)
+
+    def test_compiling_dispatch_table_without_consumer(self):
+
+        @consumes('application/xml', object)
+        class MyHandler(RequestHandler):
+            pass
+
+        with self.assertRaises(NoConsumerFound):
+            ConsumerBase.compile_dispatch_table(MyHandler)
@@ -184,3 +184,16 @@ class TestProvidesDecorator(TestCase):
         configuration = MyHandler._PROD_CONFIGURATION[
             MediaType.ApplicationJson]
         self.assertIs(configuration["partial"], True)
+
+    def test_provides_decorator_with_streaming(self):
+
+        @provides(MediaType.ApplicationJson, streaming=True, flush_every=10)
+        class MyHandler(RequestHandler):
+
+            def update_stuff(self):
+                pass
+
+        configuration = MyHandler._PROD_CONFIGURATION[
+            MediaType.ApplicationJson]
+        self.assertIs(configuration["streaming"], True)
+        self.assertEqual(configuration["flush_every"], 10)
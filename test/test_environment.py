@@ -26,7 +26,9 @@ import tornado
 from tornado import httputil
 from tornado.web import Application, RequestHandler
 
+from supercell.api import provides, RequestHandler as SupercellHandler
 from supercell.environment import Environment
+from supercell.provider import NoProviderFound
 
 
 class EnvironmentTest(TestCase):
@@ -88,3 +90,27 @@ class EnvironmentTest(TestCase):
 
         with self.assertRaises(AssertionError):
             env.add_managed_object('another_managed', object())
+
+    def test_finalizing_compiles_dispatch_tables(self):
+
+        @provides('application/json')
+        class MyHandler(SupercellHandler):
+            pass
+
+        env = Environment()
+        env.add_handler('/test', MyHandler)
+        env._finalize()
+
+        self.assertEqual(len(MyHandler._PROD_DISPATCH), 1)
+
+    def test_finalizing_with_missing_provider(self):
+
+        @provides('application/xml')
+        class MyHandler(SupercellHandler):
+            pass
+
+        env = Environment()
+        env.add_handler('/test', MyHandler)
+
+        with self.assertRaises(NoProviderFound):
+            env._finalize()
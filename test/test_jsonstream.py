@@ -0,0 +1,142 @@
+# vim: set fileencoding=utf-8 :
+#
+# Copyright (c) 2013 Daniel Truemper <truemped at googlemail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+#
+import json
+
+import pytest
+from schematics.models import Model
+from schematics.types import IntType, StringType
+from schematics.types.compound import ListType, ModelType
+from tornado.testing import AsyncHTTPTestCase
+
+import supercell.api as s
+from supercell.environment import Environment
+from supercell.jsonstream import IncrementalJsonParser
+from supercell.msgpack import packb
+
+
+DOCUMENT = {'name': 'stream', 'records': [
+    {'id': i, 'text': u'über "quoted" \\ [%d] {}' % i,
+     'tags': ['a', {'b': [1, 2.5, None, True, False]}]}
+    for i in range(50)], 'empty': [], 'nested': {'x': {}}}
+
+
+def parse(data, chunk_size):
+    parser = IncrementalJsonParser()
+    for i in range(0, len(data), chunk_size):
+        parser.feed(data[i:i + chunk_size])
+    return parser.close()
+
+
+@pytest.mark.parametrize('chunk_size', [1, 2, 3, 7, 64, 100000])
+def test_parse_in_chunks(chunk_size):
+    data = json.dumps(DOCUMENT, ensure_ascii=False).encode('utf8')
+    assert parse(data, chunk_size) == DOCUMENT
+
+
+@pytest.mark.parametrize('value', [
+    u'ü\\"' * 100000,
+    {'rows': [[i, 'x' * 10] for i in range(20000)]},
+    12345678901234567890,
+])
+def test_large_value_in_many_chunks(value):
+    document = {'large': value, 'after': [1]}
+    data = json.dumps(document, ensure_ascii=False).encode('utf8')
+    assert parse(data, 101) == document
+
+
+@pytest.mark.parametrize('document', [1, 'text', None, [], {}, [[1], [2]]])
+def test_parse_simple_documents(document):
+    assert parse(json.dumps(document).encode('utf8'), 1) == document
+
+
+@pytest.mark.parametrize('data', [b'', b'{"a": 1', b'{"a" 1}', b'[1 2]',
+                                  b'{1: 2}', b'[1] [2]', b'["abc',
+                                  b'[{"a": tru}]'])
+def test_malformed_documents(data):
+    with pytest.raises(ValueError):
+        parse(data, 1)
+
+
+class Record(Model):
+    id = IntType(required=True)
+    text = StringType()
+
+
+class Upload(Model):
+    name = StringType(required=True)
+    records = ListType(ModelType(Record))
+
+
+class Saved(Model):
+    name = StringType()
+    count = IntType()
+
+
+@s.streams_request_body(max_size=64 * 1024)
+@s.provides(s.MediaType.ApplicationJson, default=True)
+@s.consumes(s.MediaType.ApplicationJson, model=Upload)
+@s.consumes(s.MediaType.ApplicationMsgpack, model=Upload)
+class StreamingHandler(s.RequestHandler):
+
+    @s.coroutine
+    def post(self, *args, **kwargs):
+        upload = kwargs['model']
+        raise s.Return(Saved({'name': upload.name,
+                              'count': len(upload.records)}))
+
+
+class TestStreamingRequestBody(AsyncHTTPTestCase):
+
+    def get_app(self):
+        env = Environment()
+        env.add_handler('/upload', StreamingHandler)
+        env._finalize()
+        return env.get_application()
+
+    def post(self, body, content_type=s.MediaType.ApplicationJson):
+        return self.fetch('/upload', method='POST', body=body,
+                          headers={'Content-Type': content_type})
+
+    def test_streamed_json_body(self):
+        body = json.dumps({'name': 'big', 'records': [
+            {'id': i, 'text': 'x' * 20} for i in range(1000)]})
+        response = self.post(body)
+        self.assertEqual(200, response.code)
+        self.assertEqual({'name': 'big', 'count': 1000},
+                         json.loads(response.body.decode('utf8')))
+
+    def test_invalid_json(self):
+        response = self.post('{"name": "big", "records": [')
+        self.assertEqual(400, response.code)
+
+    def test_invalid_model(self):
+        response = self.post('{"records": [{"id": "one"}]}')
+        self.assertEqual(400, response.code)
+
+    def test_body_too_large(self):
+        body = json.dumps({'name': 'big', 'records': [
+            {'id': i, 'text': 'x' * 100} for i in range(1000)]})
+        response = self.post(body)
+        self.assertEqual(413, response.code)
+
+    def test_consumers_without_streaming_support(self):
+        body = packb({'name': 'small', 'records': [{'id': 1}]})
+        response = self.post(body, s.MediaType.ApplicationMsgpack)
+        self.assertEqual(200, response.code)
+        self.assertEqual({'name': 'small', 'count': 1},
+                         json.loads(response.body.decode('utf8')))
@@ -0,0 +1,160 @@
+# vim: set fileencoding=utf-8 :
+#
+# Copyright (c) 2013 Daniel Truemper <truemped at googlemail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import json
+
+import pytest
+
+from schematics.models import Model
+from schematics.types import IntType, StringType
+from schematics.types.compound import ListType
+from tornado.testing import AsyncHTTPTestCase
+
+import supercell.api as s
+from supercell.codec import MsgpackCodec
+from supercell.environment import Environment
+from supercell.msgpack import MAX_DEPTH, packb, unpackb
+
+
+@pytest.mark.parametrize('obj,packed', [
+    (None, b'\xc0'),
+    (True, b'\xc3'),
+    (False, b'\xc2'),
+    (1, b'\x01'),
+    (-1, b'\xff'),
+    (-33, b'\xd0\xdf'),
+    (200, b'\xcc\xc8'),
+    (-200, b'\xd1\xff\x38'),
+    (2 ** 16, b'\xce\x00\x01\x00\x00'),
+    (2 ** 64 - 1, b'\xcf' + b'\xff' * 8),
+    (1.5, b'\xcb\x3f\xf8\x00\x00\x00\x00\x00\x00'),
+    (u'é', b'\xa2\xc3\xa9'),
+    (u'a' * 32, b'\xd9\x20' + b'a' * 32),
+    (b'\x00', b'\xc4\x01\x00'),
+    ([1, 2], b'\x92\x01\x02'),
+    ((1, 2), b'\x92\x01\x02'),
+    ({'a': None}, b'\x81\xa1a\xc0'),
+    (list(range(16)), b'\xdc\x00\x10' + bytes(range(16))),
+])
+def test_packb(obj, packed):
+    assert packb(obj) == packed
+    assert unpackb(packed) == (list(obj) if isinstance(obj, tuple) else obj)
+
+
+@pytest.mark.parametrize('obj', [
+    -2 ** 63, 2 ** 32, u'a' * 70000, list(range(70000)),
+    {str(i): [i, {'n': None}] for i in range(100)},
+])
+def test_roundtrip(obj):
+    assert unpackb(packb(obj)) == obj
+
+
+def test_packb_unsupported():
+    with pytest.raises(TypeError):
+        packb(object())
+    with pytest.raises(ValueError):
+        packb(2 ** 64)
+
+
+@pytest.mark.parametrize('data', [
+    b'', b'\x92\x01', b'\xc1', b'\x01\x02', b'\xd9', b'\x81\x90\x01',
+    b'\xa2\xff\xff', b'\x91' * (MAX_DEPTH + 1),
+])
+def test_unpackb_malformed(data):
+    with pytest.raises(ValueError):
+        unpackb(data)
+
+
+class Item(Model):
+    name = StringType(required=True)
+    values = ListType(IntType())
+
+
+@s.consumes(s.MediaType.ApplicationJson, Item)
+@s.consumes(s.MediaType.ApplicationMsgpack, Item)
+@s.provides(s.MediaType.ApplicationJson, default=True)
+@s.provides(s.MediaType.ApplicationMsgpack)
+class MyHandler(s.RequestHandler):
+
+    @s.coroutine
+    def get(self, *args, **kwargs):
+        raise s.Return(Item({'name': 'item', 'values': [1, 2]}))
+
+    @s.coroutine
+    def post(self, *args, **kwargs):
+        raise s.Return(kwargs['model'])
+
+
+class CountingCodec(MsgpackCodec):
+
+    def __init__(self):
+        super().__init__()
+        self.calls = []
+
+    def encode(self, obj):
+        self.calls.append('encode')
+        return super().encode(obj)
+
+
+class TestMsgpackProviderAndConsumer(AsyncHTTPTestCase):
+
+    def get_app(self):
+        self.codec = CountingCodec()
+        env = Environment()
+        env.set_msgpack_codec(self.codec)
+        env.add_handler('/test', MyHandler)
+        return env.get_application()
+
+    def test_provide(self):
+        response = self.fetch('/test', headers={
+            'Accept': s.MediaType.ApplicationMsgpack})
+        self.assertEqual(response.code, 200)
+        self.assertEqual(response.headers['Content-Type'],
+                         'application/x-msgpack')
+        self.assertEqual(unpackb(response.body),
+                         {'name': 'item', 'values': [1, 2]})
+        self.assertEqual(self.codec.calls, ['encode'])
+
+    def test_json_is_still_the_default(self):
+        response = self.fetch('/test')
+        self.assertEqual(response.code, 200)
+        self.assertEqual(json.loads(response.body.decode('utf8')),
+                         {'name': 'item', 'values': [1, 2]})
+
+    def test_consume(self):
+        response = self.fetch('/test', method='POST', headers={
+            'Accept': s.MediaType.ApplicationMsgpack,
+            'Content-Type': s.MediaType.ApplicationMsgpack},
+            body=packb({'name': 'posted', 'values': [3]}))
+        self.assertEqual(response.code, 200)
+        self.assertEqual(unpackb(response.body),
+                         {'name': 'posted', 'values': [3]})
+
+    def test_errors(self):
+        response = self.fetch('/test', method='POST', headers={
+            'Accept': s.MediaType.ApplicationMsgpack,
+            'Content-Type': s.MediaType.ApplicationMsgpack},
+            body=packb({'values': [3]}))
+        self.assertEqual(response.code, 400)
+        self.assertEqual(response.headers['Content-Type'],
+                         'application/x-msgpack')
+        self.assertEqual(unpackb(response.body), {
+            'error': True, 'message': {'name': ['This field is required.']}})
+
+    def test_malformed_body(self):
+        response = self.fetch('/test', method='POST', headers={
+            'Content-Type': s.MediaType.ApplicationMsgpack}, body=b'\x92\x01')
+        self.assertEqual(response.code, 400)
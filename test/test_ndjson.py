@@ -0,0 +1,206 @@
+# vim: set fileencoding=utf-8 :
+#
+# Copyright (c) 2013 Daniel Truemper <truemped at googlemail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+#
+import json
+
+from schematics.models import Model
+from schematics.types import IntType, StringType
+from tornado.testing import AsyncHTTPTestCase, AsyncTestCase, gen_test
+
+import supercell.api as s
+from supercell.environment import Environment
+from supercell.ndjson import LineError, ModelStream
+
+
+class Record(Model):
+    id = IntType(required=True)
+    text = StringType()
+
+
+class Summary(Model):
+    count = IntType()
+    errors = IntType()
+
+
+@s.streams_request_body()
+@s.provides(s.MediaType.ApplicationJson, default=True)
+@s.consumes(s.MediaType.ApplicationNdjson, model=Record)
+class EarlyReturningHandler(s.RequestHandler):
+
+    streams = []
+
+    async def post(self, *args, **kwargs):
+        models = kwargs['model']
+        EarlyReturningHandler.streams.append(models)
+        record = await models.__anext__()
+        return Summary({'count': record.id, 'errors': 0})
+
+
+@s.provides(s.MediaType.ApplicationJson, default=True)
+@s.consumes(s.MediaType.ApplicationNdjson, model=Record)
+class BufferedHandler(s.RequestHandler):
+
+    async def post(self, *args, **kwargs):
+        count = 0
+        async for record in kwargs['model']:
+            count += record.id
+        return Summary({'count': count, 'errors': 0})
+
+
+@s.streams_request_body()
+@s.provides(s.MediaType.ApplicationJson, default=True)
+@s.consumes(s.MediaType.ApplicationNdjson, model=Record)
+class SkippingHandler(s.RequestHandler):
+
+    async def post(self, *args, **kwargs):
+        models = kwargs['model']
+        (count, errors) = (0, [])
+        while True:
+            try:
+                await models.__anext__()
+                count += 1
+            except LineError as e:
+                errors.append(e.line)
+            except StopAsyncIteration:
+                break
+        return Summary({'count': count, 'errors': len(errors)})
+
+
+@s.streams_request_body(max_size=1024 * 1024)
+class StreamingHandler(BufferedHandler):
+    pass
+
+
+def ndjson(records):
+    return '\n'.join(json.dumps(r) for r in records) + '\n'
+
+
+class TestNdjsonConsumer(AsyncHTTPTestCase):
+
+    def get_app(self):
+        env = Environment()
+        env.add_handler('/stream', StreamingHandler)
+        env.add_handler('/skip', SkippingHandler)
+        env.add_handler('/buffered', BufferedHandler)
+        env.add_handler('/early', EarlyReturningHandler)
+        env._finalize()
+        return env.get_application()
+
+    def post(self, path, body):
+        return self.fetch(path, method='POST', body=body, headers={
+            'Content-Type': s.MediaType.ApplicationNdjson})
+
+    def test_streamed_lines(self):
+        records = [{'id': i, 'text': 'x' * 50} for i in range(5000)]
+        for path in ('/stream', '/buffered'):
+            response = self.post(path, ndjson(records))
+            self.assertEqual(200, response.code)
+            self.assertEqual({'count': sum(range(5000)), 'errors': 0},
+                             json.loads(response.body.decode('utf8')))
+
+    def test_last_line_without_newline(self):
+        response = self.post('/stream', '{"id": 1}\n\n{"id": 2}')
+        self.assertEqual(200, response.code)
+        self.assertEqual({'count': 3, 'errors': 0},
+                         json.loads(response.body.decode('utf8')))
+
+    def test_invalid_lines(self):
+        response = self.post('/stream', '{"id": 1}\n{"id": \n')
+        self.assertEqual(400, response.code)
+        self.assertEqual(2, json.loads(response.reason)['line'])
+
+        response = self.post('/stream', '{"id": 1}\n{"text": "a"}\n')
+        self.assertEqual(400, response.code)
+        reason = json.loads(response.reason)
+        self.assertEqual(2, reason['line'])
+        self.assertIn('id', reason['errors'])
+
+    def test_skipping_invalid_lines(self):
+        body = '{"id": 1}\n{"id": \n{"text": "a"}\n{"id": 3}\n'
+        response = self.post('/skip', body)
+        self.assertEqual(200, response.code)
+        self.assertEqual({'count': 2, 'errors': 2},
+                         json.loads(response.body.decode('utf8')))
+
+    def test_body_too_large(self):
+        records = [{'id': i, 'text': 'x' * 500} for i in range(5000)]
+        response = self.post('/stream', ndjson(records))
+        self.assertEqual(413, response.code)
+
+    def test_line_too_long(self):
+        consumer = s.NdjsonConsumer
+        max_line_size = consumer.MAX_LINE_SIZE
+        consumer.MAX_LINE_SIZE = 64
+        try:
+            body = '{"id": 1}\n{"id": 2, "text": "%s"}\n{"id": 3}\n' % (
+                'x' * 100)
+            response = self.post('/skip', body)
+        finally:
+            consumer.MAX_LINE_SIZE = max_line_size
+        self.assertEqual(200, response.code)
+        self.assertEqual({'count': 2, 'errors': 1},
+                         json.loads(response.body.decode('utf8')))
+
+    def test_finished_handlers_do_not_wait_for_the_stream(self):
+        consumer = s.NdjsonConsumer
+        max_buffered_lines = consumer.MAX_BUFFERED_LINES
+        consumer.MAX_BUFFERED_LINES = 2
+        EarlyReturningHandler.streams = []
+        try:
+            records = [{'id': i + 1} for i in range(20000)]
+            response = self.post('/early', ndjson(records))
+        finally:
+            consumer.MAX_BUFFERED_LINES = max_buffered_lines
+        self.assertEqual(200, response.code)
+        self.assertEqual({'count': 1, 'errors': 0},
+                         json.loads(response.body.decode('utf8')))
+
+        (stream,) = EarlyReturningHandler.streams
+        self.assertIsNone(stream.put(1, {'id': 1}))
+        self.assertTrue(stream._putter is None or stream._putter.done())
+
+
+class TestModelStream(AsyncTestCase):
+
+    @gen_test
+    def test_bounded_buffer(self):
+        stream = ModelStream(Record, maxsize=2)
+        self.assertIsNone(stream.put(1, {'id': 1}))
+        waiting = stream.put(2, {'id': 2})
+        self.assertIsNotNone(waiting)
+        self.assertFalse(waiting.done())
+
+        record = yield stream.__anext__()
+        self.assertEqual(1, record.id)
+        self.assertTrue(waiting.done())
+
+        stream.close(ValueError('closed'))
+        record = yield stream.__anext__()
+        self.assertEqual(2, record.id)
+        with self.assertRaises(ValueError):
+            yield stream.__anext__()
+        with self.assertRaises(StopAsyncIteration):
+            yield stream.__anext__()
+
+    def test_put_after_close(self):
+        stream = ModelStream(Record, maxsize=1)
+        waiting = stream.put(1, {'id': 1})
+        self.assertFalse(waiting.done())
+        stream.close()
+        self.assertTrue(waiting.done())
+        self.assertIsNone(stream.put(2, {'id': 2}))
+        self.assertEqual(1, len(stream))
@@ -23,7 +23,7 @@ from unittest import TestCase
 
 from supercell.api import provides, RequestHandler
 from supercell.mediatypes import ContentType, MediaType
-from supercell.provider import (ProviderBase, JsonProvider,
+from supercell.provider import (ProviderBase, ProviderMeta, JsonProvider,
                                          NoProviderFound)
 
 
@@ -93,3 +93,102 @@ class TestBasicProvider(TestCase):
             MediaType.ApplicationJson, handler=MyHandler)
         self.assertIs(provider, JsonProvider)
         self.assertIs(configuration["partial"], True)
+
+    def test_compiled_dispatch_table(self):
+
+        @provides(MediaType.ApplicationJson, partial=True, default=True)
+        class MyHandler(RequestHandler):
+            pass
+
+        ProviderBase.compile_dispatch_table(MyHandler)
+        ctype = ContentType(MediaType.ApplicationJson)
+        self.assertEqual(list(MyHandler._PROD_DISPATCH), [ctype])
+        provider, configuration = MyHandler._PROD_DISPATCH[ctype]
+        self.assertIs(provider, JsonProvider)
+        self.assertIs(configuration['partial'], True)
+        with self.assertRaises(TypeError):
+            MyHandler._PROD_DISPATCH[ctype] = None
+
+        provider, _ = ProviderBase.map_provider(MediaType.ApplicationJson,
+                                                handler=MyHandler)
+        self.assertIs(provider, JsonProvider)
+        provider, _ = ProviderBase.map_provider('', handler=MyHandler,
+                                                allow_default=True)
+        self.assertIs(provider, JsonProvider)
+        with self.assertRaises(NoProviderFound):
+            ProviderBase.map_provider('application/vnd.supercell-v1.1+json',
+                                      handler=MyHandler)
+
+    def test_compiling_dispatch_table_without_provider(self):
+
+        @provides('application/xml')
+        class MyHandler(RequestHandler):
+            pass
+
+        with self.assertRaises(NoProviderFound):
+            ProviderBase.compile_dispatch_table(MyHandler)
+
+
+class TestProviderNegotiationCache(TestCase):
+
+    def setUp(self):
+        ProviderMeta.NEGOTIATION_CACHE.clear()
+
+    def test_repeated_negotiation_hits_cache(self):
+
+        @provides(MediaType.ApplicationJson)
+        class MyHandler(RequestHandler):
+            pass
+
+        cache = ProviderMeta.NEGOTIATION_CACHE
+        for _ in range(3):
+            provider, _ = ProviderBase.map_provider(MediaType.ApplicationJson,
+                                                    handler=MyHandler)
+            self.assertIs(provider, JsonProvider)
+
+        self.assertEqual(cache.misses, 1)
+        self.assertEqual(cache.hits, 2)
+        self.assertEqual(len(cache), 1)
+
+    def test_failed_negotiation_is_cached(self):
+
+        @provides(MediaType.ApplicationJson)
+        class MyHandler(RequestHandler):
+            pass
+
+        cache = ProviderMeta.NEGOTIATION_CACHE
+        for _ in range(2):
+            with self.assertRaises(NoProviderFound):
+                ProviderBase.map_provider('text/html', handler=MyHandler)
+
+        self.assertEqual(cache.misses, 1)
+        self.assertEqual(cache.hits, 1)
+
+    def test_allow_default_is_part_of_the_key(self):
+
+        @provides(MediaType.ApplicationJson, default=True)
+        class MyHandler(RequestHandler):
+            pass
+
+        with self.assertRaises(NoProviderFound):
+            ProviderBase.map_provider('*/*', handler=MyHandler)
+        provider, _ = ProviderBase.map_provider('*/*', handler=MyHandler,
+                                                allow_default=True)
+        self.assertIs(provider, JsonProvider)
+
+    def test_cache_size_is_bounded(self):
+
+        @provides(MediaType.ApplicationJson)
+        class MyHandler(RequestHandler):
+            pass
+
+        cache = ProviderMeta.NEGOTIATION_CACHE
+        for i in range(cache.maxsize + 10):
+            ProviderBase.map_provider('application/json; x=%d' % i,
+                                      handler=MyHandler)
+        self.assertEqual(len(cache), cache.maxsize)
+
+        long_header = 'application/json; x=%s' % ('a' * 2048)
+        cache.clear()
+        ProviderBase.map_provider(long_header, handler=MyHandler)
+        self.assertEqual(len(cache), 0)
@@ -0,0 +1,144 @@
+# vim: set fileencoding=utf-8 :
+#
+# Copyright (c) 2013 Daniel Truemper <truemped at googlemail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+from datetime import timedelta
+import os
+import shutil
+import socket
+import tempfile
+import time
+
+from tornado import gen
+from tornado.testing import AsyncTestCase, gen_test
+
+from supercell.api import RequestHandler
+from supercell.cache import CacheConfig
+from supercell.environment import Environment
+from supercell.msgpack import packb, unpackb
+from supercell.purge import PurgeChannel
+from supercell.responsecache import CachedResponse
+from supercell.sharedcache import SharedResponseCache
+
+
+class TestPurgeChannel(AsyncTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.directory = tempfile.mkdtemp()
+        self.other_path = os.path.join(self.directory, '1.sock')
+        self.other = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self.other.bind(self.other_path)
+        self.purged = []
+        self.channel = PurgeChannel(self.directory)
+        self.channel.start(self.purged.append)
+
+    def tearDown(self):
+        self.channel.stop()
+        self.other.close()
+        shutil.rmtree(self.directory)
+        super().tearDown()
+
+    def test_publish_to_other_processes(self):
+        self.channel.publish(['user:1', 'users'])
+        self.assertEqual(unpackb(self.other.recv(1024)), ['user:1', 'users'])
+        self.assertEqual(self.purged, [])
+
+    @gen_test
+    def test_receive_from_other_processes(self):
+        self.other.sendto(packb(['user:1']), self.channel.path)
+        self.other.sendto(b'\xc1', self.channel.path)
+        self.other.sendto(packb([1]), self.channel.path)
+        self.other.sendto(packb(['user:2']), self.channel.path)
+        yield gen.sleep(0.01)
+        self.assertEqual(self.purged, [['user:1'], ['user:2']])
+
+    def test_sockets_of_stopped_processes_are_removed(self):
+        self.other.close()
+        self.channel.publish(['user:1'])
+        self.assertFalse(os.path.exists(self.other_path))
+        self.assertTrue(os.path.exists(self.channel.path))
+
+    def test_publish_without_started_channel_does_not_block(self):
+        self.channel.stop()
+        for _ in range(1000):
+            self.channel.publish(['user:%s' % ('x' * 1000)])
+
+    def test_stop_removes_the_socket(self):
+        path = self.channel.path
+        self.channel.stop()
+        self.assertFalse(os.path.exists(path))
+
+
+class TestEnvironmentPurge(AsyncTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+        super().tearDown()
+
+    @gen_test
+    def test_purges_are_broadcast(self):
+        env = Environment()
+        env.set_purge_channel(PurgeChannel(self.directory))
+        env.get_application()
+        response = CachedResponse(200, (), b'a', time.time() + 60)
+        env.response_cache.put('a', response, tags=('user:1',))
+        env.response_cache.put('b', response, tags=('user:2',))
+
+        other = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        try:
+            other.bind(os.path.join(self.directory, '1.sock'))
+            env.purge_cache_tags('user:1')
+            self.assertNotIn('a', env.response_cache)
+            self.assertEqual(unpackb(other.recv(1024)), ['user:1'])
+
+            other.sendto(packb(['user:2']), env.purge_channel.path)
+            yield gen.sleep(0.01)
+            self.assertNotIn('b', env.response_cache)
+        finally:
+            other.close()
+            env.purge_channel.stop()
+
+    @gen_test
+    def test_shared_caches_are_purged_by_the_publisher(self):
+        env = Environment()
+        shared = SharedResponseCache(os.path.join(self.directory, 'cache'),
+                                     slots=16, slot_size=1024)
+        env.add_managed_object('shared', shared)
+        env.add_handler('/', RequestHandler, cache=CacheConfig(
+            timedelta(minutes=1), server_side=True, response_cache='shared'))
+        env.set_purge_channel(PurgeChannel(self.directory))
+        env.get_application()
+        response = CachedResponse(200, (), b'a', time.time() + 60)
+        shared.put('a', response, tags=('user:1',))
+        shared.put('b', response, tags=('user:2',))
+
+        other = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        try:
+            other.bind(os.path.join(self.directory, '1.sock'))
+            env.purge_cache_tags('user:1')
+            self.assertNotIn('a', shared)
+
+            other.sendto(packb(['user:2']), env.purge_channel.path)
+            yield gen.sleep(0.01)
+            self.assertIn('b', shared)
+        finally:
+            other.close()
+            env.purge_channel.stop()
+            shared.close()
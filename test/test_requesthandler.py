@@ -20,7 +20,9 @@ from __future__ import (absolute_import, division, print_function,
 
 import pytest
 
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 import json
+import multiprocessing
 import os.path as op
 
 import schematics
@@ -30,9 +32,11 @@ from schematics.types import IntType
 from schematics.types.compound import ListType
 from schematics.types.compound import ModelType
 
+from tornado.httpclient import HTTPClientError
 from tornado.testing import AsyncHTTPTestCase
 
 import supercell.api as s
+from supercell import msgpack, stats
 from supercell.api import (RequestHandler, provides, consumes)
 from supercell.environment import Environment
 
@@ -355,6 +359,48 @@ class TestHandlerProvidingPartialModels(AsyncHTTPTestCase):
                                     sort_keys=True))
 
 
+class TestHandlerValidationPolicy(AsyncHTTPTestCase):
+
+    def get_app(self):
+
+        @provides(s.MediaType.ApplicationJson, validate='never')
+        class MyHandlerWithoutValidation(RequestHandler):
+
+            @s.coroutine
+            def get(self, *args, **kwargs):
+                raise s.Return(StricterMessage({"doc_id": 'test123'}))
+
+        @provides(s.MediaType.ApplicationJson, validate='sampled',
+                  validate_every=1)
+        class MyHandlerWithSampledValidation(RequestHandler):
+
+            @s.coroutine
+            def get(self, *args, **kwargs):
+                raise s.Return(StricterMessage({"doc_id": 'test123'}))
+
+        env = Environment()
+        env.add_handler('/test_never', MyHandlerWithoutValidation)
+        env.add_handler('/test_sampled', MyHandlerWithSampledValidation)
+        return env.get_application()
+
+    def test_invalid_model_without_validation(self):
+        response = self.fetch(
+            '/test_never',
+            headers={'Accept': s.MediaType.ApplicationJson})
+        self.assertEqual(response.code, 200)
+        self.assertEqual('{"doc_id": "test123"}',
+                         json.dumps(json.loads(response.body.decode('utf8')),
+                                    sort_keys=True))
+
+    def test_invalid_model_with_sampled_validation(self):
+        stats.reset()
+        response = self.fetch(
+            '/test_sampled',
+            headers={'Accept': s.MediaType.ApplicationJson})
+        self.assertEqual(response.code, 200)
+        self.assertEqual(stats.get('provider.validation_errors'), 1)
+
+
 class SimpleModel(Model):
     name = StringType()
     numbers = ListType(IntType())
@@ -411,3 +457,363 @@ class TestLoadModelFromArguments(AsyncHTTPTestCase):
         self.assertEqual(response.code, 200)
         body = json.loads(response.body.decode('utf8'))
         self.assertEqual(body, {"name": "Peter", "numbers": [1, 2, 3]})
+
+
+class StreamedCollection(Model):
+    name = StringType()
+    messages = ListType(ModelType(SimpleMessage))
+    numbers = ListType(IntType(), serialized_name='nums')
+    empty = ListType(IntType())
+
+
+class FailingIntType(IntType):
+
+    def to_primitive(self, value, context=None):
+        if value == 13:
+            raise ValueError('unlucky number')
+        return super().to_primitive(value, context)
+
+
+class FailingCollection(Model):
+    numbers = ListType(FailingIntType())
+
+
+class TestStreamingJsonProvider(AsyncHTTPTestCase):
+
+    def get_app(self):
+
+        @provides(s.MediaType.ApplicationJson, default=True, streaming=True,
+                  flush_every=10)
+        class MyStreamingHandler(RequestHandler):
+
+            @s.coroutine
+            def get(self, *args, **kwargs):
+                raise s.Return(StreamedCollection({
+                    'name': 'streamed',
+                    'messages': [{'doc_id': str(i)} for i in range(25)],
+                    'numbers': list(range(5)),
+                    'empty': []}))
+
+        @provides(s.MediaType.ApplicationJson, default=True, streaming=True)
+        class MyStreamingHandlerWithoutLists(RequestHandler):
+
+            @s.coroutine
+            def get(self, *args, **kwargs):
+                raise s.Return(StreamedCollection())
+
+        @provides(s.MediaType.ApplicationJson, default=True, streaming=True,
+                  flush_every=10)
+        class MyFailingStreamingHandler(RequestHandler):
+
+            @s.coroutine
+            def get(self, *args, **kwargs):
+                raise s.Return(FailingCollection({
+                    'numbers': list(range(20))}))
+
+        env = Environment()
+        env.add_handler('/stream', MyStreamingHandler)
+        env.add_handler('/stream_empty', MyStreamingHandlerWithoutLists)
+        env.add_handler('/stream_failing', MyFailingStreamingHandler)
+        return env.get_application()
+
+    def test_list_fields_are_streamed(self):
+        response = self.fetch('/stream')
+        self.assertEqual(response.code, 200)
+        self.assertEqual(response.headers.get('Transfer-Encoding'), 'chunked')
+        self.assertEqual(json.loads(response.body.decode('utf8')), {
+            'name': 'streamed',
+            'messages': [{'doc_id': str(i)} for i in range(25)],
+            'nums': [0, 1, 2, 3, 4],
+            'empty': []})
+
+    def test_streaming_without_list_values(self):
+        response = self.fetch('/stream_empty')
+        self.assertEqual(response.code, 200)
+        self.assertEqual(json.loads(response.body.decode('utf8')),
+                         {'name': None, 'messages': None, 'nums': None,
+                          'empty': None})
+
+    def test_errors_after_the_first_flush_abort_the_stream(self):
+        with self.assertRaises(HTTPClientError):
+            self.fetch('/stream_failing', raise_error=True)
+
+
+class TestStreamingModels(AsyncHTTPTestCase):
+
+    def get_app(self):
+
+        @provides(s.MediaType.ApplicationNdjson, default=True)
+        @provides(s.MediaType.ApplicationJsonSeq)
+        @provides(s.MediaType.ApplicationJson)
+        @provides(s.MediaType.TextHtml)
+        class MyGeneratorHandler(RequestHandler):
+
+            async def get(self, *args, **kwargs):
+                for i in range(25):
+                    yield SimpleMessage({'doc_id': str(i), 'number': i})
+
+        @provides(s.MediaType.ApplicationNdjson, default=True)
+        class MyReturningGeneratorHandler(RequestHandler):
+
+            @s.coroutine
+            def get(self, *args, **kwargs):
+                raise s.Return(self.messages())
+
+            async def messages(self):
+                yield SimpleMessage({'doc_id': 'a'})
+                yield 'not a model'
+
+        env = Environment()
+        env.add_handler('/generator', MyGeneratorHandler)
+        env.add_handler('/returning', MyReturningGeneratorHandler)
+        return env.get_application()
+
+    def expected(self):
+        return [{'doc_id': str(i), 'number': i} for i in range(25)]
+
+    def test_ndjson(self):
+        response = self.fetch('/generator')
+        self.assertEqual(response.code, 200)
+        self.assertEqual(response.headers['Content-Type'],
+                         s.MediaType.ApplicationNdjson)
+        self.assertEqual(response.headers.get('Transfer-Encoding'), 'chunked')
+        lines = response.body.decode('utf8').split('\n')
+        self.assertEqual(lines[-1], '')
+        self.assertEqual([json.loads(l) for l in lines[:-1]],
+                         self.expected())
+
+    def test_json_seq(self):
+        response = self.fetch('/generator', headers={
+            'Accept': s.MediaType.ApplicationJsonSeq})
+        self.assertEqual(response.code, 200)
+        records = response.body.decode('utf8').split('\x1e')
+        self.assertEqual(records[0], '')
+        self.assertTrue(all(r.endswith('\n') for r in records[1:]))
+        self.assertEqual([json.loads(r) for r in records[1:]],
+                         self.expected())
+
+    def test_json_array(self):
+        response = self.fetch('/generator', headers={
+            'Accept': s.MediaType.ApplicationJson})
+        self.assertEqual(response.code, 200)
+        self.assertEqual(json.loads(response.body.decode('utf8')),
+                         self.expected())
+
+    def test_unsupported_content_type(self):
+        response = self.fetch('/generator', headers={
+            'Accept': s.MediaType.TextHtml})
+        self.assertEqual(response.code, 406)
+
+    def test_non_models_abort_the_stream(self):
+        with self.assertRaises(HTTPClientError):
+            self.fetch('/returning', raise_error=True)
+
+
+class RecordingExecutor(ThreadPoolExecutor):
+
+    def __init__(self):
+        super().__init__(1)
+        self.submitted = []
+
+    def submit(self, fn, *args, **kwargs):
+        self.submitted.append(fn)
+        return super().submit(fn, *args, **kwargs)
+
+
+@provides(s.MediaType.ApplicationJson, default=True)
+@consumes(s.MediaType.ApplicationJson, SimpleMessage, offload_size=64)
+@consumes(s.MediaType.ApplicationMsgpack, SimpleMessage)
+class MyOffloadingHandler(RequestHandler):
+
+    @s.coroutine
+    def post(self, *args, **kwargs):
+        raise s.Return(kwargs['model'])
+
+
+class MyPreparingHandler(MyOffloadingHandler):
+
+    def prepare(self):
+        super().prepare()
+        self.set_header('X-Model', self.path_kwargs['model'].doc_id)
+
+
+class MyAwaitingPrepareHandler(MyOffloadingHandler):
+
+    async def prepare(self):
+        await super().prepare()
+        self.set_header('X-Model', self.path_kwargs['model'].doc_id)
+
+
+class TestOffloadedConsumers(AsyncHTTPTestCase):
+
+    def get_app(self):
+        self.executor = RecordingExecutor()
+        env = Environment()
+        env.set_executor(self.executor)
+        env.add_handler('/offload', MyOffloadingHandler)
+        env.add_handler('/preparing', MyPreparingHandler)
+        env.add_handler('/awaiting', MyAwaitingPrepareHandler)
+        env._finalize()
+        return env.get_application()
+
+    def tearDown(self):
+        super().tearDown()
+        self.executor.shutdown()
+
+    def post(self, body, content_type=s.MediaType.ApplicationJson,
+             path='/offload'):
+        return self.fetch(path, method='POST', body=body,
+                          headers={'Content-Type': content_type})
+
+    def test_small_bodies_are_consumed_on_the_ioloop(self):
+        response = self.post('{"doc_id": "small"}')
+        self.assertEqual(response.code, 200)
+        self.assertEqual(self.executor.submitted, [])
+
+    def test_large_bodies_are_offloaded(self):
+        message = {'doc_id': 'large', 'message': 'x' * 100}
+        response = self.post(json.dumps(message))
+        self.assertEqual(response.code, 200)
+        self.assertEqual(json.loads(response.body.decode('utf8')), message)
+        self.assertEqual(len(self.executor.submitted), 1)
+
+        response = self.post(msgpack.packb(message),
+                             s.MediaType.ApplicationMsgpack)
+        self.assertEqual(response.code, 200)
+        self.assertEqual(len(self.executor.submitted), 1)
+
+    def test_overridden_prepare_without_waiting(self):
+        response = self.post('{"doc_id": "small"}', path='/preparing')
+        self.assertEqual(response.code, 200)
+        self.assertEqual(response.headers['X-Model'], 'small')
+        response = self.post('{"doc_id": "small"', path='/preparing')
+        self.assertEqual(response.code, 400)
+
+    def test_overridden_prepare_waiting_for_the_executor(self):
+        message = {'doc_id': 'large', 'message': 'x' * 100}
+        response = self.post(json.dumps(message), path='/awaiting')
+        self.assertEqual(response.code, 200)
+        self.assertEqual(response.headers['X-Model'], 'large')
+        self.assertEqual(len(self.executor.submitted), 1)
+        response = self.post('{"doc_id": "%s"' % ('x' * 100),
+                             path='/awaiting')
+        self.assertEqual(response.code, 400)
+
+    def test_errors_in_the_executor(self):
+        response = self.post('{"doc_id": "invalid", "number": "%s"}' % (
+            'x' * 100))
+        self.assertEqual(response.code, 400)
+        response = self.post('{"doc_id": "%s"' % ('x' * 100))
+        self.assertEqual(response.code, 400)
+        self.assertEqual(len(self.executor.submitted), 2)
+
+
+class TestConsumersOffloadedToProcesses(AsyncHTTPTestCase):
+
+    def get_app(self):
+        self.executor = ProcessPoolExecutor(
+            1, mp_context=multiprocessing.get_context('fork'))
+        env = Environment()
+        env.set_executor(self.executor)
+        env.add_handler('/offload', MyOffloadingHandler)
+        env._finalize()
+        return env.get_application()
+
+    def tearDown(self):
+        super().tearDown()
+        self.executor.shutdown()
+
+    def test_models_are_passed_between_processes(self):
+        message = {'doc_id': 'large', 'message': 'x' * 100}
+        response = self.fetch('/offload', method='POST',
+                              body=json.dumps(message),
+                              headers={'Content-Type':
+                                       s.MediaType.ApplicationJson})
+        self.assertEqual(response.code, 200)
+        self.assertEqual(json.loads(response.body.decode('utf8')), message)
+
+
+class TestOffloadedProviders(AsyncHTTPTestCase):
+
+    def get_app(self):
+
+        @provides(s.MediaType.ApplicationJson, default=True, offload_items=20)
+        @provides(s.MediaType.ApplicationMsgpack, offload_items=20)
+        class MyLargeResponseHandler(RequestHandler):
+
+            @s.coroutine
+            def get(self, *args, **kwargs):
+                count = int(self.get_argument('count'))
+                if self.get_argument('hint', None):
+                    self.set_size_hint(int(self.get_argument('hint')))
+                raise s.Return(StricterMessageCollection({'messages': [
+                    {'doc_id': str(i), 'message': 'm'}
+                    for i in range(count)]}))
+
+        @s.coroutine
+        def get_invalid(self, *args, **kwargs):
+            raise s.Return(StricterMessageCollection({'messages': [
+                {'doc_id': 'invalid'}]}))
+
+        @provides(s.MediaType.ApplicationJson, default=True, offload_items=1)
+        class MyInvalidResponseHandler(RequestHandler):
+            get = get_invalid
+
+        @provides(s.MediaType.ApplicationJson, default=True, offload_items=1,
+                  validate='sampled', validate_every=1)
+        class MySampledResponseHandler(RequestHandler):
+            get = get_invalid
+
+        self.executor = RecordingExecutor()
+        env = Environment()
+        env.set_executor(self.executor)
+        env.add_handler('/large', MyLargeResponseHandler)
+        env.add_handler('/invalid', MyInvalidResponseHandler)
+        env.add_handler('/sampled', MySampledResponseHandler)
+        env._finalize()
+        return env.get_application()
+
+    def tearDown(self):
+        super().tearDown()
+        self.executor.shutdown()
+
+    def test_small_models_are_serialized_on_the_ioloop(self):
+        response = self.fetch('/large?count=5')
+        self.assertEqual(response.code, 200)
+        self.assertEqual(len(json.loads(
+            response.body.decode('utf8'))['messages']), 5)
+        self.assertEqual(self.executor.submitted, [])
+
+    def test_large_models_are_offloaded(self):
+        response = self.fetch('/large?count=25')
+        self.assertEqual(response.code, 200)
+        self.assertEqual(json.loads(response.body.decode('utf8')), {
+            'messages': [{'doc_id': str(i), 'message': 'm'}
+                         for i in range(25)]})
+        self.assertEqual(len(self.executor.submitted), 1)
+
+        response = self.fetch('/large?count=25', headers={
+            'Accept': s.MediaType.ApplicationMsgpack})
+        self.assertEqual(response.code, 200)
+        self.assertEqual(len(msgpack.unpackb(response.body)['messages']), 25)
+        self.assertEqual(len(self.executor.submitted), 2)
+
+    def test_size_hint(self):
+        response = self.fetch('/large?count=5&hint=1000')
+        self.assertEqual(response.code, 200)
+        self.assertEqual(len(self.executor.submitted), 1)
+
+        response = self.fetch('/large?count=25&hint=0')
+        self.assertEqual(response.code, 200)
+        self.assertEqual(len(self.executor.submitted), 1)
+
+    def test_validation_in_the_executor(self):
+        response = self.fetch('/invalid')
+        self.assertEqual(response.code, 500)
+        self.assertIn('result_model', response.body.decode('utf8'))
+
+        stats.reset()
+        response = self.fetch('/sampled')
+        self.assertEqual(response.code, 200)
+        self.assertEqual(stats.get('provider.validation_errors'), 1)
+        self.assertEqual(len(self.executor.submitted), 2)
@@ -0,0 +1,460 @@
+# vim: set fileencoding=utf-8 :
+#
+# Copyright (c) 2013 Daniel Truemper <truemped at googlemail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+from datetime import timedelta
+import json
+import time
+
+from schematics.models import Model
+from schematics.types import StringType
+from tornado import gen
+from tornado.httputil import HTTPServerRequest
+from tornado.testing import AsyncHTTPTestCase
+from tornado.web import HTTPError
+
+import supercell.api as s
+from supercell.api import CacheConfig
+from supercell.cache import RETRY_ERRORS
+from supercell.compression import CompressionConfig
+from supercell.environment import Environment
+from supercell.responsecache import (CachedResponse, ResponseCache,
+                                     cache_key)
+
+
+def response(body, expires=None):
+    return CachedResponse(200, (('Content-Type', 'text/plain'),), body,
+                          expires or time.time() + 60)
+
+
+def test_lru_eviction_by_bytes():
+    cache = ResponseCache(max_bytes=100)
+    cache.put('a', response(b'a' * 20))
+    cache.put('b', response(b'b' * 20))
+    assert cache.size == 2 * (1 + 20 + len('Content-Type') + len('text/plain'))
+    assert cache.get('a') is not None
+
+    cache.put('c', response(b'c' * 20))
+    assert 'a' in cache
+    assert 'b' not in cache
+    assert 'c' in cache
+    assert cache.size <= 100
+    assert cache.evictions == 1
+
+
+def test_too_large_responses_are_not_cached():
+    cache = ResponseCache(max_bytes=100)
+    cache.put('a', response(b'a' * 200))
+    assert len(cache) == 0
+    assert cache.size == 0
+
+
+def test_outdated_responses():
+    cache = ResponseCache()
+    cache.put('a', response(b'a', expires=time.time() - 1))
+    assert cache.get('a') is None
+    assert 'a' not in cache
+    assert cache.size == 0
+
+
+def test_stale_responses():
+    cache = ResponseCache()
+    cache.put('a', response(b'a', expires=time.time() - 10))
+    assert cache.get('a', stale=60) is not None
+    assert (cache.hits, cache.stale_hits, cache.misses) == (0, 1, 0)
+    assert cache.get('a', stale=5) is None
+    assert 'a' not in cache
+    assert cache.metrics()['stale_hits'] == 1
+    assert cache.hit_rate == 0.0
+
+
+def test_purge_by_tags():
+    cache = ResponseCache()
+    cache.put('a', response(b'a'), tags=('user:1', 'users'))
+    cache.put('b', response(b'b'), tags=('user:2', 'users'))
+    cache.put('c', response(b'c'))
+    assert cache.purge('user:1') == 1
+    assert 'a' not in cache
+    assert 'b' in cache
+
+    cache.put('b', response(b'b'), tags=('user:2',))
+    assert cache.purge('users') == 0
+    assert cache.purge('user:2', 'unknown') == 1
+    assert len(cache) == 1
+    assert cache._tags == {}
+
+
+def test_metrics():
+    cache = ResponseCache(max_bytes=1000)
+    cache.put('a', response(b'a'))
+    cache.get('a')
+    cache.get('a')
+    cache.get('b')
+    metrics = cache.metrics()
+    assert metrics['hits'] == 2
+    assert metrics['misses'] == 1
+    assert metrics['hit_rate'] == 2 / 3
+    assert metrics['entries'] == 1
+    assert metrics['max_bytes'] == 1000
+
+    cache.clear()
+    assert cache.metrics()['hits'] == 0
+    assert cache.size == 0
+
+
+class SimpleMessage(Model):
+    message = StringType()
+
+
+@s.consumes(s.MediaType.ApplicationJson, SimpleMessage)
+@s.provides(s.MediaType.ApplicationMsgpack)
+@s.provides(s.MediaType.ApplicationJson, default=True)
+class MyHandler(s.RequestHandler):
+
+    calls = 0
+
+    @s.coroutine
+    def get(self, *args, **kwargs):
+        MyHandler.calls += 1
+        if self.get_argument('fail', None):
+            raise s.Error(code=404)
+        self.set_header('X-Calls', str(MyHandler.calls))
+        raise s.Return(SimpleMessage({
+            'message': self.get_argument('message', 'a')}))
+
+    @s.coroutine
+    def post(self, *args, **kwargs):
+        MyHandler.calls += 1
+        raise s.Return(SimpleMessage({'message': 'posted'}))
+
+
+class PersonalizedHandler(MyHandler):
+    pass
+
+
+class CompressedHandler(MyHandler):
+    pass
+
+
+class TestResponseCache(AsyncHTTPTestCase):
+
+    def get_app(self):
+        MyHandler.calls = 0
+        env = Environment()
+        env.add_handler('/cached', MyHandler,
+                        cache=CacheConfig(timedelta(minutes=1),
+                                          server_side=True))
+        env.add_handler('/personalized', PersonalizedHandler,
+                        cache=CacheConfig(timedelta(minutes=1),
+                                          server_side=True,
+                                          key_headers=('Authorization',)))
+        env.add_handler('/compressed', CompressedHandler,
+                        cache=CacheConfig(timedelta(minutes=1),
+                                          server_side=True),
+                        compression=CompressionConfig(min_size=1))
+        self.cache = env.response_cache
+        return env.get_application()
+
+    def test_hits_skip_the_handler(self):
+        first = self.fetch('/cached?b=2&a=1')
+        second = self.fetch('/cached?a=1&b=2')
+        self.assertEqual(first.code, 200)
+        self.assertEqual(second.code, 200)
+        self.assertEqual(MyHandler.calls, 1)
+        self.assertEqual(second.body, first.body)
+        self.assertEqual(second.headers['Content-Type'],
+                         first.headers['Content-Type'])
+        self.assertEqual(second.headers['X-Calls'], '1')
+        self.assertEqual(second.headers['Vary'], 'Accept')
+        self.assertEqual(second.headers['Cache-Control'],
+                         'max-age=60, must-revalidate')
+        self.assertEqual(second.headers['Etag'], first.headers['Etag'])
+        self.assertEqual(self.cache.hits, 1)
+        self.assertEqual(self.cache.misses, 1)
+
+        response = self.fetch('/cached?a=1&b=2', headers={
+            'If-None-Match': first.headers['Etag']})
+        self.assertEqual(response.code, 304)
+        self.assertEqual(MyHandler.calls, 1)
+
+    def test_key_includes_the_representation(self):
+        self.fetch('/cached')
+        response = self.fetch('/cached', headers={
+            'Accept': s.MediaType.ApplicationMsgpack})
+        self.assertEqual(response.headers['Content-Type'],
+                         s.MediaType.ApplicationMsgpack)
+        self.assertEqual(MyHandler.calls, 2)
+
+    def test_key_headers(self):
+        self.fetch('/personalized', headers={'Authorization': 'a'})
+        self.fetch('/personalized', headers={'Authorization': 'a'})
+        self.fetch('/personalized', headers={'Authorization': 'b'})
+        self.assertEqual(MyHandler.calls, 2)
+
+    def test_requests_with_credentials_are_not_cached(self):
+        self.fetch('/cached', headers={'Authorization': 'a'})
+        self.fetch('/cached', headers={'Authorization': 'b'})
+        self.fetch('/cached', headers={'Cookie': 'session=a'})
+        self.fetch('/personalized', headers={'Authorization': 'a',
+                                             'Cookie': 'session=a'})
+        self.assertEqual(MyHandler.calls, 4)
+        self.assertEqual(len(self.cache), 0)
+
+    def test_compressed_responses(self):
+        first = self.fetch('/compressed', decompress_response=False,
+                           headers={'Accept-Encoding': 'gzip'})
+        second = self.fetch('/compressed', decompress_response=False,
+                            headers={'Accept-Encoding': 'gzip'})
+        plain = self.fetch('/compressed', decompress_response=False)
+        self.assertEqual(second.headers['Content-Encoding'], 'gzip')
+        self.assertEqual(second.body, first.body)
+        self.assertNotIn('Content-Encoding', plain.headers)
+        self.assertEqual(json.loads(plain.body.decode('utf8')),
+                         {'message': 'a'})
+        self.assertEqual(MyHandler.calls, 2)
+
+    def test_errors_and_other_methods_are_not_cached(self):
+        self.fetch('/cached?fail=1')
+        self.fetch('/cached?fail=1')
+        for _ in range(2):
+            response = self.fetch('/cached', method='POST', body='{}',
+                                  headers={'Content-Type':
+                                           s.MediaType.ApplicationJson})
+            self.assertEqual(response.code, 200)
+        self.assertEqual(MyHandler.calls, 4)
+        self.assertEqual(len(self.cache), 0)
+
+
+def test_key_includes_the_module_of_the_handler():
+    request = HTTPServerRequest(uri='/cached', host='localhost')
+    keys = []
+    for module in ('first.module', 'second.module'):
+        handler = type('MyHandler', (), {'request': request,
+                                         '__module__': module})
+        keys.append(cache_key(handler(), 'JsonProvider', None, ()))
+    assert keys[0] != keys[1]
+    assert keys[0].startswith('first.module.MyHandler\x00')
+
+
+class SlowHandler(MyHandler):
+
+    @s.coroutine
+    def get(self, *args, **kwargs):
+        yield gen.sleep(0.05)
+        if self.get_argument('raise', None):
+            MyHandler.calls += 1
+            raise HTTPError(503)
+        result = yield super().get(*args, **kwargs)
+        raise s.Return(result)
+
+
+class RetryingHandler(SlowHandler):
+    pass
+
+
+class PersonalizedSlowHandler(SlowHandler):
+    pass
+
+
+def fetch_concurrently(test, path, n, **kwargs):
+    @gen.coroutine
+    def fetch_all():
+        responses = yield [test.http_client.fetch(test.get_url(path),
+                                                  raise_error=False, **kwargs)
+                           for _ in range(n)]
+        raise gen.Return(responses)
+    return test.io_loop.run_sync(fetch_all)
+
+
+class TestCoalescing(AsyncHTTPTestCase):
+
+    def get_app(self):
+        MyHandler.calls = 0
+        env = Environment()
+        env.add_handler('/coalesced', SlowHandler,
+                        cache=CacheConfig(timedelta(minutes=1),
+                                          coalesce=True))
+        env.add_handler('/retried', RetryingHandler,
+                        cache=CacheConfig(timedelta(minutes=1),
+                                          coalesce=True,
+                                          coalesce_errors=RETRY_ERRORS))
+        env.add_handler('/personalized', PersonalizedSlowHandler,
+                        cache=CacheConfig(timedelta(minutes=1),
+                                          coalesce=True,
+                                          key_headers=('Authorization',)))
+        self.cache = env.response_cache
+        return env.get_application()
+
+    def fetch_concurrently(self, path, n=3, **kwargs):
+        return fetch_concurrently(self, path, n, **kwargs)
+
+    def test_concurrent_requests_call_the_handler_once(self):
+        responses = self.fetch_concurrently('/coalesced?message=b')
+        self.assertEqual(MyHandler.calls, 1)
+        for response in responses:
+            self.assertEqual(response.code, 200)
+            self.assertEqual(json.loads(response.body.decode('utf8')),
+                             {'message': 'b'})
+            self.assertEqual(response.headers['X-Calls'], '1')
+        self.assertEqual(len(self.cache), 0)
+
+        self.fetch_concurrently('/coalesced?message=c', n=1)
+        self.assertEqual(MyHandler.calls, 2)
+
+    def test_requests_with_credentials_are_not_coalesced(self):
+        self.fetch_concurrently('/coalesced', headers={'Authorization': 'a'})
+        self.assertEqual(MyHandler.calls, 3)
+        self.fetch_concurrently('/coalesced', headers={'Cookie': 'session=a'})
+        self.assertEqual(MyHandler.calls, 6)
+
+        self.fetch_concurrently('/personalized',
+                                headers={'Authorization': 'a'})
+        self.assertEqual(MyHandler.calls, 7)
+
+    def test_error_responses_are_shared(self):
+        responses = self.fetch_concurrently('/retried?fail=1')
+        self.assertEqual([r.code for r in responses], [404] * 3)
+        self.assertEqual(MyHandler.calls, 1)
+
+    def test_errors_are_shared(self):
+        responses = self.fetch_concurrently('/coalesced?raise=1')
+        self.assertEqual([r.code for r in responses], [503] * 3)
+        self.assertEqual(MyHandler.calls, 1)
+
+    def test_errors_are_retried(self):
+        responses = self.fetch_concurrently('/retried?raise=1')
+        self.assertEqual([r.code for r in responses], [503] * 3)
+        self.assertEqual(MyHandler.calls, 3)
+
+        responses = self.fetch_concurrently('/retried')
+        self.assertEqual([r.code for r in responses], [200] * 3)
+        self.assertEqual(MyHandler.calls, 4)
+
+
+class FailingHandler(SlowHandler):
+
+    fail = False
+
+    @s.coroutine
+    def get(self, *args, **kwargs):
+        if FailingHandler.fail:
+            MyHandler.calls += 1
+            raise FailingHandler.fail
+        result = yield super().get(*args, **kwargs)
+        raise s.Return(result)
+
+
+class TestStaleResponses(AsyncHTTPTestCase):
+
+    def get_app(self):
+        MyHandler.calls = 0
+        FailingHandler.fail = False
+        env = Environment()
+        env.add_handler('/stale', SlowHandler,
+                        cache=CacheConfig(
+                            timedelta(0), server_side=True,
+                            must_revalidate=False,
+                            stale_while_revalidate=timedelta(minutes=1)))
+        env.add_handler('/failing', FailingHandler,
+                        cache=CacheConfig(
+                            timedelta(0), server_side=True,
+                            stale_if_error=timedelta(minutes=1)))
+        self.cache = env.response_cache
+        return env.get_application()
+
+    def wait_for_refresh(self):
+        self.io_loop.run_sync(lambda: gen.sleep(0.1))
+
+    def test_stale_responses_are_refreshed_in_the_background(self):
+        first = self.fetch('/stale')
+        self.assertEqual(first.headers['Cache-Control'],
+                         'max-age=0, stale-while-revalidate=60')
+
+        responses = fetch_concurrently(self, '/stale', 3)
+        for response in responses:
+            self.assertEqual(response.code, 200)
+            self.assertEqual(response.headers['X-Calls'], '1')
+            self.assertEqual(response.headers['Cache-Control'],
+                             first.headers['Cache-Control'])
+        self.wait_for_refresh()
+        self.assertEqual(MyHandler.calls, 2)
+
+        response = self.fetch('/stale')
+        self.assertEqual(response.headers['X-Calls'], '2')
+        self.wait_for_refresh()
+        self.assertEqual(MyHandler.calls, 3)
+
+    def test_stale_responses_are_returned_on_errors(self):
+        first = self.fetch('/failing')
+        self.assertEqual(first.code, 200)
+
+        FailingHandler.fail = ValueError('broken backend')
+        response = self.fetch('/failing')
+        self.assertEqual(response.code, 200)
+        self.assertEqual(response.body, first.body)
+        self.assertEqual(response.headers['X-Calls'], '1')
+        self.assertEqual(response.headers['Cache-Control'],
+                         'max-age=0, must-revalidate, stale-if-error=60')
+        self.assertEqual(MyHandler.calls, 2)
+
+        FailingHandler.fail = HTTPError(404)
+        self.assertEqual(self.fetch('/failing').code, 404)
+
+        FailingHandler.fail = False
+        response = self.fetch('/failing')
+        self.assertEqual(response.headers['X-Calls'], '4')
+
+
+class TaggedHandler(MyHandler):
+
+    @s.coroutine
+    def get(self, *args, **kwargs):
+        self.add_cache_tags('message', 'message:%s' %
+                            self.get_argument('message', 'a'))
+        result = yield super().get(*args, **kwargs)
+        raise s.Return(result)
+
+    @s.coroutine
+    def post(self, *args, **kwargs):
+        self.purge_cache_tags('message:%s' % kwargs['model'].message)
+        raise s.Ok()
+
+
+class TestTags(AsyncHTTPTestCase):
+
+    def get_app(self):
+        MyHandler.calls = 0
+        env = Environment()
+        env.add_handler('/tagged', TaggedHandler,
+                        cache=CacheConfig(timedelta(minutes=1),
+                                          server_side=True))
+        self.cache = env.response_cache
+        return env.get_application()
+
+    def test_writes_purge_tagged_responses(self):
+        self.fetch('/tagged?message=a')
+        self.fetch('/tagged?message=b')
+        self.assertEqual(len(self.cache), 2)
+
+        response = self.fetch('/tagged', method='POST',
+                              body='{"message": "a"}',
+                              headers={'Content-Type':
+                                       s.MediaType.ApplicationJson})
+        self.assertEqual(response.code, 200)
+        self.assertEqual(len(self.cache), 1)
+
+        self.fetch('/tagged?message=a')
+        self.fetch('/tagged?message=b')
+        self.assertEqual(MyHandler.calls, 3)
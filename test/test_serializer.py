@@ -0,0 +1,98 @@
+# vim: set fileencoding=utf-8 :
+#
+# Copyright (c) 2013 Daniel Truemper <truemped at googlemail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+from datetime import datetime
+
+import pytest
+
+from schematics.models import Model
+from schematics.types import DateTimeType, IntType, StringType
+from schematics.types.compound import DictType, ListType, ModelType
+from schematics.types.serializable import serializable
+
+from supercell.serializer import compile_serializer, to_primitive
+
+
+class Item(Model):
+    item_id = IntType()
+    created = DateTimeType()
+
+    class Options:
+        serialize_when_none = False
+
+
+class SpecialItem(Item):
+    special = StringType()
+
+
+class Collection(Model):
+    name = StringType(serialized_name='title')
+    item = ModelType(Item)
+    items = ListType(ModelType(Item))
+    numbers = ListType(IntType(), serialize_when_none=False)
+    nested = ListType(ListType(IntType()))
+    by_name = DictType(ModelType(Item))
+    dates = DictType(DateTimeType())
+
+
+class WithSerializable(Model):
+    name = StringType()
+
+    @serializable
+    def upper(self):
+        return self.name.upper()
+
+
+class WithDefaultRole(Model):
+    name = StringType()
+    secret = StringType()
+
+    class Options:
+        roles = {'default': lambda name, value: name == 'secret'}
+
+
+NOW = datetime(2020, 1, 2, 3, 4, 5)
+
+
+@pytest.mark.parametrize('model', [
+    Collection(),
+    Collection({'name': 'test', 'item': {'item_id': 1},
+                'items': [{'item_id': 1, 'created': NOW}, {}, None],
+                'numbers': [], 'nested': [[1], [], [None]],
+                'by_name': {'a': {'item_id': 2}, 'b': {}},
+                'dates': {'a': NOW}}),
+    Collection({'item': SpecialItem({'special': 'yes'}),
+                'items': [SpecialItem({'item_id': 1, 'special': 'no'})]}),
+])
+def test_compiled_serializer_equals_schematics(model):
+    assert compile_serializer(Collection) is not None
+    assert to_primitive(model) == model.to_primitive()
+
+
+def test_serializer_is_cached_on_the_class():
+    serializer = compile_serializer(Item)
+    assert Item.__dict__['_supercell_serializer'] is serializer
+    assert compile_serializer(Item) is serializer
+    assert compile_serializer(SpecialItem) is not serializer
+
+
+@pytest.mark.parametrize('model', [
+    WithSerializable({'name': 'test'}),
+    WithDefaultRole({'name': 'test', 'secret': 'hidden'}),
+])
+def test_unsupported_models_fall_back_to_schematics(model):
+    assert compile_serializer(type(model)) is None
+    assert to_primitive(model) == model.to_primitive()
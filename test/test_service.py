@@ -18,7 +18,10 @@
 from __future__ import (absolute_import, division, print_function,
                         with_statement)
 
+import os
+import shutil
 import sys
+import tempfile
 from unittest import TestCase
 
 import socket
@@ -33,6 +36,7 @@ from tornado.testing import AsyncHTTPTestCase
 
 import supercell.api as s
 from supercell.environment import Environment
+from supercell.purge import PurgeChannel
 
 
 class SimpleModel(Model):
@@ -120,6 +124,8 @@ class ServiceTest(TestCase):
 
         expected = [mock.call(), mock.call().add_handler(mock.ANY, mock.ANY,
                                                          mock.ANY),
+                    mock.call(), mock.call().spawn_callback(mock.ANY,
+                                                            mock.ANY),
                     mock.call(), mock.call().start()]
         assert expected == ioloop_instance_mock.mock_calls
 
@@ -135,6 +141,8 @@ class ServiceTest(TestCase):
 
         expected = [mock.call(), mock.call().add_handler(mock.ANY, mock.ANY,
                                                          mock.ANY),
+                    mock.call(), mock.call().spawn_callback(mock.ANY,
+                                                            mock.ANY),
                     mock.call(), mock.call().start()]
         assert expected == ioloop_instance_mock.mock_calls
 
@@ -161,6 +169,8 @@ class ServiceTest(TestCase):
 
         expected = [mock.call(), mock.call().add_handler(mock.ANY, mock.ANY,
                                                          mock.ANY),
+                    mock.call(), mock.call().spawn_callback(mock.ANY,
+                                                            mock.ANY),
                     mock.call(), mock.call().start()]
         assert expected == ioloop_instance_mock.mock_calls
 
@@ -173,6 +183,23 @@ class ServiceTest(TestCase):
         service.config.max_grace_seconds = 3
         service.shutdown()
 
+    @mock.patch('tornado.ioloop.IOLoop.current')
+    def test_shutdown_stops_the_purge_channel(self, ioloop_instance_mock):
+        directory = tempfile.mkdtemp()
+        service = MyService()
+        service.environment.set_purge_channel(PurgeChannel(directory))
+        try:
+            service.main()
+            path = service.environment.purge_channel.path
+            assert os.path.exists(path)
+
+            service.config.max_grace_seconds = -10
+            service.shutdown()
+            assert not os.path.exists(path)
+        finally:
+            service.config.max_grace_seconds = 3
+            shutil.rmtree(directory)
+
 
 class ApplicationIntegrationTest(AsyncHTTPTestCase):
 
@@ -0,0 +1,231 @@
+# vim: set fileencoding=utf-8 :
+#
+# Copyright (c) 2013 Daniel Truemper <truemped at googlemail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+from datetime import timedelta
+import os
+import shutil
+import tempfile
+import time
+
+import pytest
+from schematics.models import Model
+from schematics.types import StringType
+from tornado.testing import AsyncHTTPTestCase
+
+import supercell.api as s
+from supercell.api import CacheConfig
+from supercell.environment import Environment
+from supercell.responsecache import CachedResponse
+from supercell import sharedcache
+from supercell.sharedcache import SharedResponseCache
+
+
+def response(body, expires=None):
+    return CachedResponse(200, (('Content-Type', 'text/plain'),
+                                ('Vary', 'Accept')),
+                          body, expires or time.time() + 60)
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / 'responses.cache')
+
+
+def test_put_and_get(path):
+    cache = SharedResponseCache(path, slots=16, slot_size=1024)
+    cache.put('a', response(b'a' * 100))
+    assert cache.get('a') == response(b'a' * 100,
+                                      expires=cache.get('a').expires)
+    assert cache.get('b') is None
+    assert 'a' in cache
+    assert len(cache) == 1
+    assert cache.hits == 2
+    assert cache.misses == 1
+    cache.close()
+
+
+def test_responses_are_shared(path):
+    first = SharedResponseCache(path, slots=16, slot_size=1024)
+    second = SharedResponseCache(path, slots=16, slot_size=1024)
+    first.put('a', response(b'a'))
+    assert second.get('a').body == b'a'
+
+    second.invalidate('a')
+    assert first.get('a') is None
+    first.close()
+    second.close()
+
+
+def test_responses_are_shared_with_forked_processes(path):
+    cache = SharedResponseCache(path, slots=16, slot_size=1024)
+    pid = os.fork()
+    if pid == 0:
+        cache.put('a', response(b'from the child'))
+        os._exit(0)
+    os.waitpid(pid, 0)
+    assert cache.get('a').body == b'from the child'
+    cache.close()
+
+
+def test_different_layouts_use_different_files(path):
+    cache = SharedResponseCache(path, slots=16, slot_size=1024)
+    cache.put('a', response(b'a'))
+
+    other = SharedResponseCache(path, slots=32, slot_size=1024)
+    assert other.get('a') is None
+    assert os.path.getsize(path + '.32x1024') == 64 + 32 * 1024
+    assert os.path.getsize(path + '.16x1024') == 64 + 16 * 1024
+    assert cache.get('a').body == b'a'
+    cache.close()
+    other.close()
+
+
+def test_files_with_unexpected_contents_are_not_changed(path):
+    with open(path + '.16x1024', 'wb') as f:
+        f.write(b'not a cache')
+    with pytest.raises(ValueError):
+        SharedResponseCache(path, slots=16, slot_size=1024)
+    with open(path + '.16x1024', 'rb') as f:
+        assert f.read() == b'not a cache'
+
+
+def test_slots_left_changing_by_a_dead_process_are_rewritten(path):
+    cache = SharedResponseCache(path, slots=16, slot_size=1024)
+    cache.put('a', response(b'a'))
+    offset = cache._offset(sharedcache._digest('a'))
+    seq = sharedcache._SEQ.unpack_from(cache._map, offset)[0]
+    sharedcache._SEQ.pack_into(cache._map, offset, seq + 1)
+    assert cache.get('a') is None
+
+    cache.put('a', response(b'b'))
+    assert cache.get('a').body == b'b'
+    assert sharedcache._SEQ.unpack_from(cache._map, offset)[0] % 2 == 0
+    cache.close()
+
+
+def test_slots_are_replaced(path):
+    cache = SharedResponseCache(path, slots=1, slot_size=1024)
+    cache.put('a', response(b'a'))
+    cache.put('b', response(b'b'))
+    assert cache.get('a') is None
+    assert cache.get('b').body == b'b'
+    assert cache.evictions == 1
+    cache.close()
+
+
+def test_too_large_responses_are_not_cached(path):
+    cache = SharedResponseCache(path, slots=4, slot_size=128)
+    cache.put('a', response(b'a' * 200))
+    assert cache.get('a') is None
+    cache.close()
+
+
+def test_outdated_responses(path):
+    cache = SharedResponseCache(path, slots=4, slot_size=1024)
+    cache.put('a', response(b'a', expires=time.time() - 10))
+    assert len(cache) == 0
+    assert cache.get('a', stale=60).body == b'a'
+    assert (cache.hits, cache.stale_hits, cache.misses) == (0, 1, 0)
+    assert cache.get('a', stale=5) is None
+    assert cache.metrics()['stale_hits'] == 1
+    assert 'a' not in cache
+    cache.close()
+
+
+def test_purge_by_tags(path):
+    cache = SharedResponseCache(path, slots=16, slot_size=1024)
+    other = SharedResponseCache(path, slots=16, slot_size=1024)
+    cache.put('a', response(b'a'), tags=('user:1',))
+    cache.put('b', response(b'b'), tags=('user:2',))
+    assert other.purge('user:1', 'user:3') == 1
+    assert cache.get('a') is None
+    assert cache.get('b').body == b'b'
+    cache.close()
+    other.close()
+
+
+def test_clear_and_metrics(path):
+    cache = SharedResponseCache(path, slots=4, slot_size=1024)
+    cache.put('a', response(b'a'))
+    cache.get('a')
+    cache.get('b')
+    metrics = cache.metrics()
+    assert metrics['entries'] == 1
+    assert metrics['hit_rate'] == 0.5
+    assert metrics['max_bytes'] == 4 * 1024
+
+    cache.clear()
+    assert len(cache) == 0
+    assert cache.metrics()['hits'] == 0
+    cache.close()
+
+
+class SimpleMessage(Model):
+    message = StringType()
+
+
+@s.provides(s.MediaType.ApplicationJson, default=True)
+class MyHandler(s.RequestHandler):
+
+    calls = 0
+
+    @s.coroutine
+    def get(self, *args, **kwargs):
+        MyHandler.calls += 1
+        raise s.Return(SimpleMessage({'message': 'a'}))
+
+
+class TestSharedResponseCache(AsyncHTTPTestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        super().setUp()
+
+    def tearDown(self):
+        super().tearDown()
+        self.cache.close()
+        shutil.rmtree(self.directory)
+
+    def get_app(self):
+        MyHandler.calls = 0
+        self.cache = SharedResponseCache(
+            os.path.join(self.directory, 'responses.cache'), slots=16)
+        self.env = env = Environment()
+        env.add_managed_object('shared_cache', self.cache)
+        env.add_handler('/shared', MyHandler,
+                        cache=CacheConfig(timedelta(minutes=1),
+                                          server_side=True,
+                                          response_cache='shared_cache'))
+        env._finalize()
+        return env.get_application()
+
+    def test_handler_uses_the_shared_cache(self):
+        first = self.fetch('/shared')
+        second = self.fetch('/shared')
+        self.assertEqual(second.body, first.body)
+        self.assertEqual(MyHandler.calls, 1)
+        self.assertEqual(len(self.cache), 1)
+        self.assertEqual(len(self.env.response_cache), 0)
+
+
+def test_unknown_response_cache():
+    env = Environment()
+    env.add_handler('/shared', MyHandler,
+                    cache=CacheConfig(timedelta(minutes=1),
+                                      server_side=True,
+                                      response_cache='shared_cache'))
+    with pytest.raises(AssertionError):
+        env._finalize()
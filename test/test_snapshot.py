@@ -0,0 +1,154 @@
+# vim: set fileencoding=utf-8 :
+#
+# Copyright (c) 2013 Daniel Truemper <truemped at googlemail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import sys
+import time
+
+import pytest
+
+import supercell.api as s
+
+from supercell.environment import Environment
+from supercell.msgpack import packb
+from supercell.responsecache import CachedResponse, ResponseCache
+from supercell import snapshot
+from supercell.snapshot import read_snapshot, write_snapshot
+
+
+def response(body, ttl=60):
+    return CachedResponse(200, (('Content-Type', 'text/plain'),), body,
+                          time.time() + ttl)
+
+
+class Memo:
+
+    def __init__(self):
+        self.entries = {}
+
+    def dump(self):
+        return [(key, value, 30) for (key, value) in self.entries.items()]
+
+    def load(self, key, value, ttl):
+        self.entries[key] = value
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / 'caches.snapshot')
+
+
+def test_roundtrip(path):
+    cache = ResponseCache()
+    cache.put('a', response(b'a'), tags=('user:1',))
+    cache.put('b', response(b'b', ttl=-1))
+    memo = Memo()
+    memo.entries['answer'] = 42
+    write_snapshot(path, {'responses': cache, 'memo': memo})
+
+    restored_cache = ResponseCache()
+    restored_memo = Memo()
+    assert read_snapshot(path, {'responses': restored_cache,
+                                'memo': restored_memo}) == 2
+    restored = restored_cache.get('a')
+    assert restored.body == b'a'
+    assert restored.headers == (('Content-Type', 'text/plain'),)
+    assert 59 < restored.expires - time.time() <= 60
+    assert 'b' not in restored_cache
+    assert restored_cache.purge('user:1') == 1
+    assert restored_memo.entries == {'answer': 42}
+
+
+def test_ttls_are_reduced_by_the_elapsed_time(path):
+    cache = ResponseCache()
+    cache.put('a', response(b'a', ttl=60))
+    cache.put('b', response(b'b', ttl=5))
+    write_snapshot(path, {'responses': cache})
+    with open(path, 'rb') as f:
+        data = f.read()
+    with open(path, 'wb') as f:
+        f.write(snapshot._HEADER.pack(snapshot._MAGIC, snapshot.VERSION,
+                                      time.time() - 10))
+        f.write(data[snapshot._HEADER.size:])
+
+    restored = ResponseCache()
+    assert read_snapshot(path, {'responses': restored}) == 1
+    assert 49 < restored.get('a').expires - time.time() <= 50
+    assert 'b' not in restored
+
+
+def test_missing_and_unknown_caches(path):
+    assert read_snapshot(path, {'responses': ResponseCache()}) == 0
+    cache = ResponseCache()
+    cache.put('a', response(b'a'))
+    write_snapshot(path, {'responses': cache})
+    assert read_snapshot(path, {'other': ResponseCache()}) == 0
+
+
+@pytest.mark.parametrize('data', [
+    b'',
+    b'SCSN',
+    snapshot._HEADER.pack(b'SCSN', snapshot.VERSION + 1, time.time()) +
+    packb({}),
+    snapshot._HEADER.pack(b'XXXX', snapshot.VERSION, time.time()) +
+    packb({}),
+    snapshot._HEADER.pack(b'SCSN', snapshot.VERSION, time.time()) + b'\xc1',
+    snapshot._HEADER.pack(b'SCSN', snapshot.VERSION, time.time()) +
+    packb({'responses': [['a', [200], 60]]}),
+])
+def test_unknown_formats_and_corrupt_snapshots_are_ignored(path, data):
+    with open(path, 'wb') as f:
+        f.write(data)
+    cache = ResponseCache()
+    assert read_snapshot(path, {'responses': cache}) == 0
+    assert len(cache) == 0
+
+
+def test_entries_with_invalid_ttls_are_ignored(path):
+    with open(path, 'wb') as f:
+        f.write(snapshot._HEADER.pack(snapshot._MAGIC, snapshot.VERSION,
+                                      time.time()))
+        f.write(packb({'memo': [['a', 1, 'soon'], ['b', 2, None],
+                                ['c', 3, 30]]}))
+    memo = Memo()
+    assert read_snapshot(path, {'memo': memo}) == 1
+    assert memo.entries == {'c': 3}
+
+
+def test_persistent_caches_of_the_environment():
+    env = Environment()
+    env.add_persistent_cache('responses', env.response_cache)
+    assert env.persistent_caches == {'responses': env.response_cache}
+    with pytest.raises(AssertionError):
+        env.add_persistent_cache('other', object())
+
+
+def test_service_writes_and_reads_the_snapshot(path, monkeypatch):
+    monkeypatch.setattr(sys, 'argv', ['pytest'])
+    service = s.Service()
+    service.environment.add_persistent_cache(
+        'responses', service.environment.response_cache)
+    service.environment.response_cache.put('a', response(b'a'))
+    service.config.cache_snapshot = path
+    try:
+        service.write_cache_snapshot()
+
+        restarted = s.Service()
+        restarted.environment.add_persistent_cache(
+            'responses', restarted.environment.response_cache)
+        restarted.read_cache_snapshot()
+        assert restarted.environment.response_cache.get('a').body == b'a'
+    finally:
+        service.config.cache_snapshot = None
@@ -0,0 +1,31 @@
+# vim: set fileencoding=utf-8 :
+#
+# Copyright (c) 2013 Daniel Truemper <truemped at googlemail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+from supercell import stats
+
+
+def test_counters():
+    stats.reset()
+    stats.increment('a')
+    stats.increment('a', 2)
+    stats.increment('b')
+
+    assert stats.get('a') == 3
+    assert stats.get('c') == 0
+    assert stats.snapshot() == {'a': 3, 'b': 1}
+
+    stats.reset()
+    assert stats.snapshot() == {}
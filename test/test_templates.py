@@ -0,0 +1,122 @@
+# vim: set fileencoding=utf-8 :
+#
+# Copyright (c) 2013 Daniel Truemper <truemped at googlemail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import os.path as op
+
+import pytest
+from schematics.models import Model
+from schematics.types import StringType
+from tornado.template import ParseError
+from tornado.testing import AsyncHTTPTestCase
+from tornado.web import RequestHandler as TornadoRequestHandler
+
+import supercell.api as s
+from supercell.environment import Environment
+from supercell.templates import FragmentCache, precompile_templates
+
+
+TEMPLATE_PATH = op.join(op.dirname(__file__), 'html_fragment_template')
+
+
+class Page(Model):
+    section = StringType()
+    message = StringType()
+
+
+@s.provides(s.MediaType.TextHtml, default=True)
+class PageHandler(s.RequestHandler):
+
+    sidebars = 0
+
+    def get_template(self, model):
+        return 'page.html'
+
+    def get_template_namespace(self):
+        namespace = super().get_template_namespace()
+        namespace['items'] = self.items
+        return namespace
+
+    def items(self):
+        PageHandler.sidebars += 1
+        return ['a', 'b']
+
+    @s.coroutine
+    def get(self, section):
+        raise s.Return(Page({'section': section,
+                             'message': self.get_argument('message')}))
+
+
+def test_fragment_cache():
+    cache = FragmentCache(maxsize=2)
+    cache.put('a', b'a', 60)
+    cache.put('b', b'b', -1)
+    assert cache.get('a') == b'a'
+    assert cache.get('b') is None
+    assert 'b' not in cache
+
+    cache.put('b', b'b', 60)
+    cache.put('c', b'c', 60)
+    assert 'a' not in cache
+    assert len(cache) == 2
+    assert cache.hits == 1
+    assert cache.misses == 1
+
+    [(key, value, ttl)] = cache.dump()[:1]
+    assert (key, value) == ('b', b'b')
+    assert 59 < ttl <= 60
+
+
+def test_precompile_templates():
+    TornadoRequestHandler._template_loaders.pop(TEMPLATE_PATH, None)
+    env = Environment()
+    env.tornado_settings['template_path'] = TEMPLATE_PATH
+    app = env.get_application()
+    loader = TornadoRequestHandler._template_loaders[TEMPLATE_PATH]
+    assert sorted(loader.templates) == ['page.html', 'partials/sidebar.html']
+    assert precompile_templates(app) == 2
+
+
+def test_template_errors_fail_at_startup(tmp_path):
+    (tmp_path / 'broken.html').write_text('{% if %}')
+    (tmp_path / 'image.png').write_bytes(b'\x89PNG')
+    env = Environment()
+    env.tornado_settings['template_path'] = str(tmp_path)
+    with pytest.raises(ParseError):
+        env.get_application()
+
+
+class TestFragmentCache(AsyncHTTPTestCase):
+
+    def get_app(self):
+        PageHandler.sidebars = 0
+        env = Environment()
+        env.add_handler('/page/(.*)', PageHandler)
+        env.tornado_settings['template_path'] = TEMPLATE_PATH
+        self.cache = env.fragment_cache
+        return env.get_application()
+
+    def test_fragments_are_rendered_once(self):
+        first = self.fetch('/page/news?message=first')
+        second = self.fetch('/page/news?message=second')
+        self.assertEqual(first.code, 200)
+        self.assertIn(b'<li>news: a</li><li>news: b</li>', first.body)
+        self.assertIn(b'<li>news: a</li><li>news: b</li>', second.body)
+        self.assertIn(b'<p>second</p>', second.body)
+        self.assertEqual(PageHandler.sidebars, 1)
+
+        self.fetch('/page/sports?message=first')
+        self.assertEqual(PageHandler.sidebars, 2)
+        self.assertIn('sidebar:sports', self.cache)
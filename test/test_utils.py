@@ -17,7 +17,7 @@
 #
 import pytest
 
-from supercell.utils import escape_contents
+from supercell.utils import escape_contents, LRUCache
 
 
 PLAIN_STRING = 'string'
@@ -58,3 +58,26 @@ def test_escaping(source, expected):
     Tests that escaped input matches expected output
     """
     assert escape_contents(source) == expected
+
+
+def test_lru_cache_evicts_least_recently_used():
+    cache = LRUCache(maxsize=2)
+    cache.put('a', 1)
+    cache.put('b', 2)
+    assert cache.get('a') == 1
+    cache.put('c', 3)
+
+    assert 'a' in cache
+    assert 'b' not in cache
+    assert len(cache) == 2
+
+
+def test_lru_cache_statistics():
+    cache = LRUCache()
+    cache.put('a', 1)
+    cache.get('a')
+    cache.get('b')
+    assert (cache.hits, cache.misses) == (1, 1)
+
+    cache.clear()
+    assert (cache.hits, cache.misses, len(cache)) == (0, 0, 0)
@@ -0,0 +1,118 @@
+# vim: set fileencoding=utf-8 :
+#
+# Copyright (c) 2013 Daniel Truemper <truemped at googlemail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import pytest
+
+from schematics.exceptions import DataError
+from schematics.models import Model
+from schematics.types import (BooleanType, DateTimeType, FloatType, IntType,
+                              StringType)
+from schematics.types.compound import DictType, ListType, ModelType
+from schematics.types.serializable import serializable
+
+from supercell.validation import compile_validator, validate
+
+
+class Item(Model):
+    name = StringType(required=True, max_length=5)
+    count = IntType(min_value=1)
+    tags = ListType(StringType(choices=['a', 'b']), min_size=1)
+
+
+class SpecialItem(Item):
+    special = StringType(required=True)
+
+
+class Collection(Model):
+    title = StringType(required=True, serialized_name='Title')
+    ratio = FloatType()
+    flag = BooleanType(required=True)
+    items = ListType(ModelType(Item), required=True)
+    counts = DictType(IntType(max_value=3))
+    item = ModelType(Item)
+    created = DateTimeType()
+    numbers = ListType(IntType(required=True))
+
+
+class WithModelValidator(Model):
+    name = StringType()
+
+    def validate_name(self, data, value):
+        if value == 'invalid':
+            raise DataError({'name': ['invalid name']})
+        return value
+
+
+class WithSerializable(Model):
+    name = StringType()
+
+    @serializable
+    def upper(self):
+        return self.name.upper()
+
+
+class Nested(Model):
+    checked = ModelType(WithModelValidator)
+
+
+def _validate(validator, model):
+    try:
+        validator(model)
+    except DataError as e:
+        return e.to_primitive()
+
+
+@pytest.mark.parametrize('model_class,raw', [
+    (Collection, {}),
+    (Collection, {'Title': 'x', 'flag': True, 'items': []}),
+    (Collection, {'Title': 'x', 'flag': 1,
+                  'items': [{'name': 'abcdefg', 'count': 0, 'tags': []},
+                            {'tags': ['c', 'a']}, None]}),
+    (Collection, {'Title': 'x', 'flag': True, 'items': [{'name': 'a'}],
+                  'counts': {'a': 1, 'b': 5}, 'item': {'count': -1}}),
+    (Collection, {'Title': 'x', 'flag': True, 'ratio': 3,
+                  'items': [{'name': 'a', 'tags': ['a']}],
+                  'counts': {'1': 1}, 'created': '2020-01-01T00:00:00',
+                  'item': {'name': 'abc', 'count': 2, 'tags': ['b']},
+                  'numbers': [1, 2, 3]}),
+    (Collection, {'Title': 'x', 'flag': True,
+                  'items': [SpecialItem({'name': 'a'})]}),
+    (Nested, {'checked': {'name': 'invalid'}}),
+    (WithModelValidator, {'name': 'invalid'}),
+    (WithSerializable, {'name': 'valid'}),
+])
+def test_compiled_validator_equals_schematics(model_class, raw):
+    expected = model_class(raw)
+    model = model_class(raw)
+
+    assert _validate(validate, model) == \
+        _validate(model_class.validate, expected)
+    assert model.to_primitive() == expected.to_primitive()
+    assert dict(model._data.valid) == dict(expected._data.valid)
+    assert model._data.converted == {}
+
+
+def test_validator_is_cached_on_the_class():
+    validator = compile_validator(Item)
+    assert Item.__dict__['_supercell_validator'] is validator
+    assert compile_validator(Item) is validator
+    assert compile_validator(SpecialItem) is not validator
+
+
+@pytest.mark.parametrize('model_class', [WithModelValidator,
+                                         WithSerializable, dict])
+def test_unsupported_models_are_not_compiled(model_class):
+    assert compile_validator(model_class) is None
@@ -0,0 +1,158 @@
+# vim: set fileencoding=utf-8 :
+#
+# Copyright (c) 2013 Daniel Truemper <truemped at googlemail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+from datetime import timedelta
+import json
+import sys
+
+import pytest
+from schematics.models import Model
+from schematics.types import StringType
+from tornado import gen
+from tornado.testing import AsyncHTTPTestCase, gen_test
+
+import supercell.api as s
+from supercell.api import CacheConfig
+from supercell.warmup import warmup_request
+
+
+class SimpleMessage(Model):
+    message = StringType()
+
+
+@s.provides(s.MediaType.ApplicationJson, default=True)
+class MyHandler(s.RequestHandler):
+
+    calls = 0
+
+    @s.coroutine
+    def get(self, *args, **kwargs):
+        MyHandler.calls += 1
+        raise s.Return(SimpleMessage({
+            'message': self.get_argument('message', 'a')}))
+
+
+class HangingHandler(s.RequestHandler):
+
+    @s.coroutine
+    def get(self, *args, **kwargs):
+        yield gen.Future()
+
+
+class Store:
+
+    def __init__(self):
+        self.loaded = False
+
+    @gen.coroutine
+    def load(self):
+        yield gen.moment
+        self.loaded = True
+
+    def fail(self):
+        raise ValueError('not available')
+
+
+class MyService(s.Service):
+
+    def run(self):
+        self.environment.add_handler('/cached', MyHandler,
+                                     cache=CacheConfig(timedelta(minutes=1),
+                                                       server_side=True))
+        self.environment.add_managed_object('store', Store())
+        self.environment.add_warmup(self.environment.store.fail)
+        self.environment.add_warmup(self.environment.store.load)
+        self.environment.add_warmup_request('/cached?message=b',
+                                            headers={'Host': self.host})
+        self.environment.add_warmup_request('/unknown')
+        self.environment.add_handler('/hanging', HangingHandler)
+
+
+class TestWarmup(AsyncHTTPTestCase):
+
+    @pytest.fixture(autouse=True)
+    def set_commandline(self, monkeypatch):
+        monkeypatch.setattr(sys, 'argv', ['pytest'])
+
+    def get_app(self):
+        MyHandler.calls = 0
+        self.service = MyService()
+        self.service.host = '127.0.0.1:%d' % self.get_http_port()
+        self.service.run()
+        self.service.environment._finalize()
+        return self.service.environment.get_application()
+
+    def test_readiness_before_and_after_the_warmup(self):
+        response = self.fetch('/_system/ready')
+        self.assertEqual(response.code, 503)
+        self.assertEqual(json.loads(response.body.decode('utf8'))['code'],
+                         'NOT_READY')
+
+        self.io_loop.run_sync(lambda: self.service.warmup(self._app))
+
+        response = self.fetch('/_system/ready')
+        self.assertEqual(response.code, 200)
+        self.assertEqual(json.loads(response.body.decode('utf8')),
+                         {'code': 'READY', 'message': 'API ready',
+                          'ok': True})
+
+    def test_warmup_fills_the_caches(self):
+        environment = self.service.environment
+        self.io_loop.run_sync(lambda: self.service.warmup(self._app))
+        self.assertTrue(environment.store.loaded)
+        self.assertEqual(MyHandler.calls, 1)
+        self.assertEqual(len(environment.response_cache), 1)
+
+        response = self.fetch('/cached?message=b')
+        self.assertEqual(json.loads(response.body.decode('utf8')),
+                         {'message': 'b'})
+        self.assertEqual(MyHandler.calls, 1)
+
+    @gen_test
+    def test_warmup_request(self):
+        code = yield warmup_request(self._app, '/cached', headers={
+            'Accept': s.MediaType.ApplicationJson})
+        self.assertEqual(code, 200)
+        code = yield warmup_request(self._app, '/unknown')
+        self.assertEqual(code, 404)
+
+    @gen_test
+    def test_warmup_request_timeout(self):
+        with self.assertRaises(gen.TimeoutError):
+            yield warmup_request(self._app, '/hanging', timeout=0.05)
+
+    def test_hanging_requests_do_not_block_the_warmup(self):
+        self.service.environment._warmup_requests.insert(0, ('/hanging',
+                                                             None))
+        timeout = self.service.config.warmup_timeout
+        self.service.config.warmup_timeout = 1
+        try:
+            self.io_loop.run_sync(lambda: self.service.warmup(self._app))
+        finally:
+            self.service.config.warmup_timeout = timeout
+        self.assertTrue(self.service.environment.ready)
+        self.assertEqual(MyHandler.calls, 1)
+
+    def test_warmup_host(self):
+        self.service.environment._warmup_requests[:] = [('/cached', None)]
+        self.service.config.warmup_host = 'api.example.com'
+        try:
+            self.io_loop.run_sync(lambda: self.service.warmup(self._app))
+        finally:
+            self.service.config.warmup_host = None
+        response = self.fetch('/cached', headers={'Host': 'api.example.com'})
+        self.assertEqual(response.code, 200)
+        self.assertEqual(MyHandler.calls, 1)